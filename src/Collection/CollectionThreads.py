@@ -1,7 +1,6 @@
 import logging
 import json
 import calendar
-import chardet
 import pandas as pd
 from datetime import datetime, timezone, timedelta
 from dateutil.relativedelta import relativedelta
@@ -14,6 +13,7 @@ import copy
 import wx
 
 from Common.GUIText import Datasets as GUIText
+import Common.Constants as Constants
 import Common.CustomEvents as CustomEvents
 import Common.Objects.Utilities.Datasets as DatasetsUtilities
 import Collection.RedditDataRetriever as rdr
@@ -598,6 +598,8 @@ class RetrieveCSVDatasetThread(Thread):
         self.combined_fields_list = combined_fields_list
 
         self.filename = filename
+        #utc timestamps of datetime strings already parsed during this import
+        self.datetime_cache = {}
         self.start()
     
     def run(self):
@@ -624,49 +626,36 @@ class RetrieveCSVDatasetThread(Thread):
         dataset_source = "CSV"
         if self.dataset_field == "":
             row_num = 0
-            for row in file_data:
-                row_num = row_num + 1
-                if self.id_field in row:
-                    document_id = row[self.id_field]
-                else:
-                    document_id = row_num
-                key = ("CSV", "document", document_id)
-                if key not in data:
-                    data[key] = {}
-                    data[key]['data_source'] = 'CSV'
-                    data[key]['data_type'] = 'document'
-                    data[key]['id'] = document_id
-                    if self.url_field == "":
-                        data[key]['url'] = ""
-                    else:
-                        data[key]['url'] = row[self.url_field]
-                    if self.datetime_field == "":
-                        data[key]['created_utc'] = 0
+            for chunk in file_data:
+                id_flag = self.id_field in chunk.columns
+                datetime_values = self.ParseDatetimeColumn(chunk)
+                for row, datetime_utc in zip(chunk.to_dict('records'), datetime_values):
+                    row_num = row_num + 1
+                    if id_flag:
+                        document_id = row[self.id_field]
                     else:
-                        datetime_value = row[self.datetime_field]
-                        if datetime_value != '':
-                            tmp_obj = dateparser.parse(datetime_value, settings={'TIMEZONE': 'US/Eastern', 'RETURN_AS_TIMEZONE_AWARE': False})
-                            datetime_obj = datetime(tmp_obj.year, tmp_obj.month, tmp_obj.day,
-                                                    tmp_obj.hour, tmp_obj.minute, tmp_obj.second,
-                                                    tmp_obj.microsecond, pytz.timezone(self.datetime_tz))
-                            if datetime_obj != None:
-                                datetime_obj = datetime_obj.astimezone(timezone.utc)
-                                datetime_utc = datetime_obj.replace(tzinfo=timezone.utc).timestamp()
-                                data[key]['created_utc'] = datetime_utc
-                            else:
-                                data[key]['created_utc'] = 0
+                        document_id = row_num
+                    key = ("CSV", "document", document_id)
+                    if key not in data:
+                        data[key] = {}
+                        data[key]['data_source'] = 'CSV'
+                        data[key]['data_type'] = 'document'
+                        data[key]['id'] = document_id
+                        if self.url_field == "":
+                            data[key]['url'] = ""
                         else:
-                            data[key]['created_utc'] = 0
-                for field in row:
-                    field_name = "csv."+field
-                    if field_name in data[key]:
-                        if field_name in self.combined_fields_list:
-                            data[key][field_name].append(row[field])
-                    else:
-                        if field_name in self.combined_fields_list:
-                            data[key][field_name] = [row[field]]
+                            data[key]['url'] = row[self.url_field]
+                        data[key]['created_utc'] = datetime_utc
+                    for field in row:
+                        field_name = "csv."+field
+                        if field_name in data[key]:
+                            if field_name in self.combined_fields_list:
+                                data[key][field_name].append(row[field])
                         else:
-                            data[key][field_name] = row[field]
+                            if field_name in self.combined_fields_list:
+                                data[key][field_name] = [row[field]]
+                            else:
+                                data[key][field_name] = row[field]
             #save as a document dataset
             if len(data) > 0:
                 wx.PostEvent(self.main_frame, CustomEvents.ProgressEvent({'step':GUIText.RETRIEVING_BUSY_CONSTRUCTING_STEP}))
@@ -689,54 +678,41 @@ class RetrieveCSVDatasetThread(Thread):
         else:
             row_num = 0
             dataset_row_num = {}
-            for row in file_data:
-                row_num = row_num + 1
-                new_dataset_type = row[self.dataset_field]
-                if new_dataset_type not in data:
-                    data[new_dataset_type] = {}
-                    dataset_row_num[new_dataset_type] = 1
-                else:
-                    dataset_row_num[new_dataset_type] = dataset_row_num[new_dataset_type] + 1
-
-                if self.id_field in row:
-                    document_id = row[self.id_field]
-                else:
-                    document_id = row_num
-                key = ("CSV", row[self.dataset_field], document_id)
-                if key not in data[new_dataset_type]:
-                    data[new_dataset_type][key] = {}
-                    data[new_dataset_type][key]['data_source'] = 'CSV'
-                    data[new_dataset_type][key]['data_type'] = row[self.dataset_field]
-                    data[new_dataset_type][key]['id'] = document_id
-                    if self.url_field == "":
-                        data[new_dataset_type][key]['url'] = ""
+            for chunk in file_data:
+                id_flag = self.id_field in chunk.columns
+                datetime_values = self.ParseDatetimeColumn(chunk)
+                for row, datetime_utc in zip(chunk.to_dict('records'), datetime_values):
+                    row_num = row_num + 1
+                    new_dataset_type = row[self.dataset_field]
+                    if new_dataset_type not in data:
+                        data[new_dataset_type] = {}
+                        dataset_row_num[new_dataset_type] = 1
                     else:
-                        data[new_dataset_type][key]['url'] = row[self.url_field]
-                    if self.datetime_field == "":
-                        data[new_dataset_type][key]['created_utc'] = 0
+                        dataset_row_num[new_dataset_type] = dataset_row_num[new_dataset_type] + 1
+
+                    if id_flag:
+                        document_id = row[self.id_field]
                     else:
-                        datetime_value = row[self.datetime_field]
-                        if datetime_value != '':
-                            tmp_obj = dateparser.parse(datetime_value, settings={'TIMEZONE': 'US/Eastern', 'RETURN_AS_TIMEZONE_AWARE': False})
-                            datetime_obj = datetime(tmp_obj.year, tmp_obj.month, tmp_obj.day,
-                                                    tmp_obj.hour, tmp_obj.minute, tmp_obj.second,
-                                                    tmp_obj.microsecond, pytz.timezone(self.datetime_tz))
-                            if datetime_obj != None:
-                                datetime_obj = datetime_obj.astimezone(timezone.utc)
-                                datetime_utc = datetime_obj.replace(tzinfo=timezone.utc).timestamp()
-                                data[new_dataset_type][key]['created_utc'] = datetime_utc
-                            else:
-                                data[new_dataset_type][key]['created_utc'] = 0
-                        else:
-                            data[new_dataset_type][key]['created_utc'] = 0
-                    for field in row:
-                        data[new_dataset_type][key]["csv."+field] = [row[field]]
-                else:
-                    for field in row:
-                        if "csv."+field in data[new_dataset_type][key]:
-                            data[new_dataset_type][key]["csv."+field].append(row[field])
+                        document_id = row_num
+                    key = ("CSV", row[self.dataset_field], document_id)
+                    if key not in data[new_dataset_type]:
+                        data[new_dataset_type][key] = {}
+                        data[new_dataset_type][key]['data_source'] = 'CSV'
+                        data[new_dataset_type][key]['data_type'] = row[self.dataset_field]
+                        data[new_dataset_type][key]['id'] = document_id
+                        if self.url_field == "":
+                            data[new_dataset_type][key]['url'] = ""
                         else:
+                            data[new_dataset_type][key]['url'] = row[self.url_field]
+                        data[new_dataset_type][key]['created_utc'] = datetime_utc
+                        for field in row:
                             data[new_dataset_type][key]["csv."+field] = [row[field]]
+                    else:
+                        for field in row:
+                            if "csv."+field in data[new_dataset_type][key]:
+                                data[new_dataset_type][key]["csv."+field].append(row[field])
+                            else:
+                                data[new_dataset_type][key]["csv."+field] = [row[field]]
             #save as a document dataset
             if len(data) > 0:
                 wx.PostEvent(self.main_frame, CustomEvents.ProgressEvent({'step':GUIText.RETRIEVING_BUSY_CONSTRUCTING_STEP}))
@@ -776,12 +752,54 @@ class RetrieveCSVDatasetThread(Thread):
         logger = logging.getLogger(__name__+".RetrieveCSVDatasetThread.ImportDataFiles["+filename+"]")
         logger.info("Starting")
 
-        with open(filename, 'rb') as infile:
-            encoding_result = chardet.detect(infile.read(100000))
+        #read the file in chunks so memory use while importing is bounded by the chunk size rather than the file size
+        filedata_reader = pd.read_csv(filename, encoding='utf-8', keep_default_na=False, dtype=str, chunksize=Constants.CSV_IMPORT_CHUNK_SIZE)
+        for filedata_df in filedata_reader:
+            yield filedata_df
 
-        filedata_df = pd.read_csv(filename, encoding='utf-8', keep_default_na=False, dtype='unicode')
+        logger.info("Finished")
 
-        filedata = filedata_df.to_dict('records')
+    def ParseDatetimeColumn(self, filedata_df):
+        '''converts the datetime field of a chunk into utc timestamps, in the same order as the chunk's rows'''
+        if self.datetime_field == "":
+            return [0]*len(filedata_df)
+        values = filedata_df[self.datetime_field]
+        #only parse distinct strings that were not already parsed in earlier chunks
+        datetime_utcs_map = {'': 0}
+        new_values = []
+        for value in pd.unique(values):
+            if value in datetime_utcs_map:
+                continue
+            if value in self.datetime_cache:
+                datetime_utcs_map[value] = self.datetime_cache[value]
+            else:
+                new_values.append(value)
+        new_values = pd.Series(new_values, dtype=object)
+        if len(new_values) > 0:
+            #try the common explicit formats vectorized before falling back to dateparser
+            datetime_objs = pd.Series(pd.NaT, index=new_values.index, dtype='datetime64[ns]')
+            for datetime_format in Constants.CSV_DATETIME_FORMATS:
+                unparsed = datetime_objs.isna()
+                if not unparsed.any():
+                    break
+                datetime_objs[unparsed] = pd.to_datetime(new_values[unparsed], format=datetime_format, errors='coerce')
+            datetime_objs = datetime_objs.dt.tz_localize(self.datetime_tz, ambiguous='NaT', nonexistent='NaT')
+            datetime_utcs = ((datetime_objs - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(microseconds=1)) / 10**6
+            for value, datetime_utc in zip(new_values, datetime_utcs):
+                if pd.isna(datetime_utc):
+                    datetime_utc = self.ParseDatetime(value)
+                datetime_utcs_map[value] = float(datetime_utc)
+            #trim the cache only once this chunk's values have been resolved
+            if len(self.datetime_cache) + len(new_values) > Constants.CSV_DATETIME_CACHE_SIZE:
+                self.datetime_cache.clear()
+            for value in new_values:
+                self.datetime_cache[value] = datetime_utcs_map[value]
+        return [datetime_utcs_map[value] for value in values]
 
-        logger.info("Finished")
-        return filedata
\ No newline at end of file
+    def ParseDatetime(self, datetime_value):
+        '''converts a single datetime string that is not in an explicit format into a utc timestamp'''
+        tmp_obj = dateparser.parse(datetime_value, settings={'TIMEZONE': 'US/Eastern', 'RETURN_AS_TIMEZONE_AWARE': False})
+        if tmp_obj is None:
+            return 0
+        datetime_obj = pytz.timezone(self.datetime_tz).localize(tmp_obj.replace(tzinfo=None))
+        return datetime_obj.astimezone(timezone.utc).timestamp()
\ No newline at end of file
@@ -3,14 +3,19 @@ import sys
 import os
 import shutil
 import platform
-import wx
-#import wx.lib.agw.flatnotebook as FNB
-import External.wxPython.flatnotebook_fix as FNB
+#the database and its tests only use constants that do not need the gui toolkit
+try:
+    import wx
+    #import wx.lib.agw.flatnotebook as FNB
+    import External.wxPython.flatnotebook_fix as FNB
+except ImportError:
+    wx = None
 
 CUR_VER = '0.8.11'
 
 #Variables to configure GUI
-FNB_STYLE = FNB.FNB_DEFAULT_STYLE|FNB.FNB_HIDE_ON_SINGLE_TAB|FNB.FNB_NO_X_BUTTON|FNB.FNB_FF2
+if wx is not None:
+    FNB_STYLE = FNB.FNB_DEFAULT_STYLE|FNB.FNB_HIDE_ON_SINGLE_TAB|FNB.FNB_NO_X_BUTTON|FNB.FNB_FF2
 
 DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
 DATE_FORMAT = '%Y-%m-%d'
@@ -74,6 +79,24 @@ if not os.path.exists(LOG_PATH):
 # removed to use built in id generator wx.ID_ANY
 
 #Module Specific Variables
+##Datasets
+#total size of the data files of datasets loaded in the background once a workspace is opened
+#data of any other datasets is loaded when first used
+DATASETS_PREFETCH_MAX_SIZE = 512*1024*1024
+#number of csv rows read and converted at a time when importing a csv dataset
+CSV_IMPORT_CHUNK_SIZE = 50000
+#datetime formats parsed vectorized when importing a csv dataset, any other values are parsed by dateparser
+CSV_DATETIME_FORMATS = ['%Y-%m-%d %H:%M:%S',
+                        '%Y-%m-%dT%H:%M:%S',
+                        '%Y-%m-%d %H:%M:%S.%f',
+                        '%Y-%m-%dT%H:%M:%S.%f',
+                        '%Y-%m-%d %H:%M',
+                        '%Y-%m-%d',
+                        '%m/%d/%Y %H:%M:%S',
+                        '%m/%d/%Y %H:%M',
+                        '%m/%d/%Y']
+#maximum number of distinct datetime strings kept parsed while importing a csv dataset
+CSV_DATETIME_CACHE_SIZE = 1000000
 ##Filtering
 TOKEN_TEXT_IDX = 0
 TOKEN_STEM_IDX = 1
@@ -102,6 +125,51 @@ FILTER_TFIDF_REMOVE = 'remove tokens where their tfidf is '
 FILTER_TFIDF_INCLUDE = 'include tokens where their tfidf is '
 FILTER_TFIDF_LOWER = ' in the lower '
 FILTER_TFIDF_UPPER = ' in the upper  '
+#number of rows read from the database at a time for the Filtering module's word lists and how many of these pages are kept
+FILTERS_LIST_PAGE_SIZE = 200
+FILTERS_LIST_CACHED_PAGES = 50
+#milliseconds after the last key typed in a word list's search before the list is searched
+FILTERS_SEARCH_DELAY = 300
+###Database
+#PRAGMA settings applied to every connection to the workspace database
+#the workspace database lives in a temporary directory and is only kept when the workspace is saved so durability can be traded for speed
+#the standard profile is the default as WAL, larger page caches and mmap were measured slower on workspaces whose database stays in the OS cache
+DATABASE_PROFILE_STANDARD = 'standard'
+DATABASE_PROFILE_PERFORMANCE = 'performance'
+DATABASE_PROFILE_SAFE = 'safe'
+DATABASE_PROFILES = {DATABASE_PROFILE_STANDARD: [('synchronous', 'OFF'),
+                                                 ('journal_mode', 'MEMORY')],
+                     DATABASE_PROFILE_PERFORMANCE: [('journal_mode', 'WAL'),
+                                                    ('synchronous', 'OFF'),
+                                                    ('temp_store', 'MEMORY'),
+                                                    ('cache_size', -262144), #256MB
+                                                    ('mmap_size', 1073741824)], #1GB
+                     DATABASE_PROFILE_SAFE: [('journal_mode', 'WAL'),
+                                             ('synchronous', 'NORMAL'),
+                                             ('temp_store', 'MEMORY'),
+                                             ('cache_size', -65536), #64MB
+                                             ('mmap_size', 268435456)]} #256MB
+DATABASE_PROFILES_LIST = [DATABASE_PROFILE_STANDARD, DATABASE_PROFILE_PERFORMANCE, DATABASE_PROFILE_SAFE]
+DATABASE_PROFILE_DEFAULT = DATABASE_PROFILE_STANDARD
+#fraction of a dataset's (term, document) pairs whose tf-idf needs updating above which all tokens' tf-idf is rewritten in one pass
+#instead of only the changed tokens', as visiting most tokens through the word indexes is slower than one pass over all of them
+TFIDF_INCREMENTAL_MAX_CHANGED = 0.5
+#maximum number of values bound to a single sql statement (SQLITE_MAX_VARIABLE_NUMBER on older sqlite versions is 999)
+DATABASE_MAX_PARAMETERS = 900
+###Tokenization
+#number of documents sent to a tokenization process at a time
+TOKENIZATION_BATCH_SIZE = 500
+#number of batches waiting on or being processed by each process of the pool
+TOKENIZATION_INFLIGHT_BATCHES_PER_PROCESS = 2
+#number of texts spacy processes together inside a tokenization process
+TOKENIZATION_PIPE_BATCH_SIZE = 256
+#spacy components whose output is not used by tokenization
+#text, stem and lemma are all stored so the tagger, attribute_ruler and lemmatizer are always needed
+TOKENIZATION_EXCLUDED_COMPONENTS = ['parser', 'ner']
+#maximum number of distinct words whose stem is remembered by each tokenization process
+TOKENIZATION_STEM_CACHE_SIZE = 200000
+#number of documents at or above which string_tokens' word indexes are dropped while tokenizing and rebuilt afterwards
+TOKENIZATION_INDEX_REBUILD_THRESHOLD = 50000
 ###Token Filters
 AVAILABLE_DATASET_LANGUAGES1 = ['eng-sm', 'fre-sm'] #removed eng-trf and fre-trf due to difficulties with preparing installations -- Sept 21, 2021
 AVAILABLE_DATASET_LANGUAGES2 = ['English', 'French']
@@ -112,8 +180,9 @@ USEFUL = "Useful"
 NOT_USEFUL = "Not Useful"
 
 # dialogs
-TWITTER_DIALOG_SIZE = wx.Size(350, -1)
-OPTIONS_DIALOG_SIZE = wx.Size(350, -1)
+if wx is not None:
+    TWITTER_DIALOG_SIZE = wx.Size(350, -1)
+    OPTIONS_DIALOG_SIZE = wx.Size(350, -1)
 
 #definition of fields available for use from the retrievers
 available_fields = {
@@ -3,25 +3,123 @@ import sqlite3
 import math
 import os.path
 import ast
+import random
+import threading
+from collections import Counter
 from datetime import datetime, timedelta
 
-import wx
-
 from Common.GUIText import Filtering as GUITextFiltering
 import Common.Constants as Constants
-import Common.CustomEvents as CustomEvents
+#progress of applying rules is only reported when running inside the toolkit's gui
+try:
+    import wx
+    import Common.CustomEvents as CustomEvents
+except ImportError:
+    wx = None
+
+#profile of PRAGMA settings from Constants.DATABASE_PROFILES applied to new connections
+connection_profile = Constants.DATABASE_PROFILE_DEFAULT
+
+def SetConnectionProfile(profile):
+    global connection_profile
+    if profile not in Constants.DATABASE_PROFILES:
+        profile = Constants.DATABASE_PROFILE_DEFAULT
+    if profile != connection_profile:
+        connection_profile = profile
+        #pooled connections are reopened with the new profile's settings the next time they are needed
+        ClosePooledConnections()
+
+#connections kept open per thread and workspace so that repeated queries from interactive code reuse
+#sqlite's warm page cache and python's cache of prepared statements instead of reopening the database
+#each connection is only used by the thread it was opened for, but every thread's connections are registered here
+#so that ClosePooledConnections can close all of them from the main thread
+pooled_connections = {}
+pooled_connections_lock = threading.Lock()
+
+def GetPooledConnection(current_workspace_path):
+    key = (threading.get_ident(), current_workspace_path)
+    with pooled_connections_lock:
+        if key not in pooled_connections:
+            pooled_connections[key] = DatabaseConnection(current_workspace_path, check_same_thread=False)
+        return pooled_connections[key]
+
+def ClosePooledConnections():
+    #needs to be called before a workspace's directory is removed so no connection holds the database file open
+    #threads using pooled connections have to be stopped first as their connections are closed as well
+    with pooled_connections_lock:
+        connections = list(pooled_connections.values())
+        pooled_connections.clear()
+    for db_conn in connections:
+        db_conn.Close()
+
+#tokenization and rule operations running in threads per workspace
+#the string tokens word indexes are only dropped by an operation that is running on its own and
+#operations that start while they are dropped wait until they are rebuilt so no operation ever runs without them
+dataset_operations = Counter()
+string_tokens_indexes_dropped = set()
+dataset_operations_condition = threading.Condition()
+
+def StartDatasetOperation(current_workspace_path):
+    with dataset_operations_condition:
+        dataset_operations_condition.wait_for(lambda: current_workspace_path not in string_tokens_indexes_dropped)
+        dataset_operations[current_workspace_path] += 1
+
+def FinishDatasetOperation(current_workspace_path):
+    with dataset_operations_condition:
+        dataset_operations[current_workspace_path] -= 1
+        if dataset_operations[current_workspace_path] <= 0:
+            del dataset_operations[current_workspace_path]
+        dataset_operations_condition.notify_all()
+
+def AcquireStringTokensIndexesDrop(current_workspace_path):
+    #returns True if the calling operation is the only one in flight and may drop the indexes
+    #the caller must rebuild the indexes and call ReleaseStringTokensIndexesDrop before finishing its operation
+    with dataset_operations_condition:
+        if dataset_operations[current_workspace_path] != 1 or current_workspace_path in string_tokens_indexes_dropped:
+            return False
+        string_tokens_indexes_dropped.add(current_workspace_path)
+        return True
+
+def ReleaseStringTokensIndexesDrop(current_workspace_path):
+    with dataset_operations_condition:
+        string_tokens_indexes_dropped.discard(current_workspace_path)
+        dataset_operations_condition.notify_all()
 
 class DatabaseConnection():
-    def __init__(self, current_workspace_path):
+    def __init__(self, current_workspace_path, check_same_thread=True):
         database_path = os.path.join(current_workspace_path, "workspace_sqlite3.db")
-        self.__conn = sqlite3.connect(database_path)
+        self.__conn = sqlite3.connect(database_path, check_same_thread=check_same_thread)
         self.__conn.execute("PRAGMA foreign_keys = ON")
-        self.__conn.execute("PRAGMA synchronous = OFF")
-        self.__conn.execute("PRAGMA journal_mode = MEMORY")
+        for pragma, value in Constants.DATABASE_PROFILES[connection_profile]:
+            try:
+                self.__conn.execute("PRAGMA "+pragma+" = "+str(value))
+            except sqlite3.Error:
+                #switching a workspace out of WAL mode, after a WAL profile was used, needs the database to be unlocked by other connections
+                #the connection still works with the workspace's current settings
+                logging.getLogger(__name__+".DatabaseConnection").warning("PRAGMA %s = %s failed", pragma, str(value), exc_info=True)
+        #vocabulary ids already looked up by this connection, safe to keep as vocabulary rows are never changed or removed
+        self.__term_ids = {}
+        #if the vocabulary's trigram search index exists, checked when first searching
+        self.__vocabulary_search_exists = None
+        #ids of each dataset's documents by document key, loaded when first needed and cleared when documents change
+        self.__document_ids = {}
     
     def __del__(self):
         self.__conn.close()
 
+    def Close(self):
+        self.__conn.close()
+
+    def Checkpoint(self):
+        #moves any changes held in the write-ahead log into the database file so that it can be safely copied
+        logger = logging.getLogger(__name__+".Checkpoint")
+        logger.info("Starting")
+        try:
+            self.__conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except sqlite3.Error:
+            logger.exception("sql failed with sql error")
+        logger.info("Finished")
+
     def Create(self):
         logger = logging.getLogger(__name__+".Create")
         logger.info("Starting")
@@ -47,53 +145,53 @@ class DatabaseConnection():
                                                 )"""
             c.execute(sql_createtable_datasets)
 
+            #document keys are (data_source, data_type, id) tuples stored in a column per part so they are
+            #read back without parsing, key_id has no declared type so that integer and text ids keep their type
             sql_createtable_datasets = """ CREATE TABLE IF NOT EXISTS documents (
                                                     id INTEGER PRIMARY KEY,
-                                                    dataset_id, INTEGER,
-                                                    document_key TEXT,
+                                                    dataset_id INTEGER,
+                                                    key_source TEXT,
+                                                    key_type TEXT,
+                                                    key_id,
                                                     FOREIGN KEY(dataset_id) REFERENCES datasets(id)
                                                         ON UPDATE CASCADE
                                                         ON DELETE CASCADE,
-                                                    UNIQUE(dataset_id, document_key)
+                                                    UNIQUE(dataset_id, key_source, key_type, key_id)
                                                 )"""
             c.execute(sql_createtable_datasets)
 
-            sql_createtable_stringtokens = """ CREATE TABLE IF NOT EXISTS string_tokens (
-                                                    id integer PRIMARY KEY,
-                                                    dataset_id INTEGER,
-                                                    field_id INTEGER,
-                                                    document_id INTEGER,
-                                                    position INT,
-                                                    text TEXT,
-                                                    stem TEXT,
-                                                    lemma TEXT,
-                                                    pos TEXT,
-                                                    spacy_stopword BOOLEAN,
-                                                    text_tfidf FLOAT,
-                                                    stem_tfidf FLOAT,
-                                                    lemma_tfidf FLOAT,
-                                                    included BOOLEAN DEFAULT 1,
-                                                    FOREIGN KEY(dataset_id) REFERENCES datasets(id)
-                                                        ON UPDATE CASCADE
-                                                        ON DELETE CASCADE,
-                                                    FOREIGN KEY(field_id) REFERENCES fields(id)
-                                                        ON UPDATE CASCADE
-                                                        ON DELETE CASCADE,
-                                                    FOREIGN KEY(document_id) REFERENCES documents(id)
-                                                        ON UPDATE CASCADE
-                                                        ON DELETE CASCADE
+            #distinct strings used by tokens so that string_tokens can store and compare integer ids
+            sql_createtable_vocabulary = """ CREATE TABLE IF NOT EXISTS vocabulary (
+                                                    id INTEGER PRIMARY KEY,
+                                                    term TEXT UNIQUE
                                                 )"""
-            c.execute(sql_createtable_stringtokens)
-
-            sql_create_text_index = """CREATE INDEX IF NOT EXISTS string_tokens_text_index ON string_tokens(dataset_id, text, document_id)"""
-            c.execute(sql_create_text_index)
-            sql_create_stem_index = """CREATE INDEX IF NOT EXISTS string_tokens_stem_index ON string_tokens(dataset_id, stem, document_id)"""
-            c.execute(sql_create_stem_index)
-            sql_create_lemma_index = """CREATE INDEX IF NOT EXISTS string_tokens_lemma_index ON string_tokens(dataset_id, lemma, document_id)"""
-            c.execute(sql_create_lemma_index)
-
-            sql_create_included_index = """CREATE INDEX IF NOT EXISTS string_tokens_included_index ON string_tokens(dataset_id, included)"""
-            c.execute(sql_create_included_index)
+            c.execute(sql_createtable_vocabulary)
+
+            #trigram index of the vocabulary used to search the Filtering module's word lists by substring, prefix or wildcard
+            #kept up to date by a trigger as terms are only ever added to the vocabulary
+            #sqlite builds without FTS5 or its trigram tokenizer fall back to searching the word lists directly
+            c.execute("SELECT 1 FROM sqlite_master WHERE name = 'vocabulary_search'")
+            if c.fetchone() == None:
+                try:
+                    sql_createtable_vocabularysearch = """CREATE VIRTUAL TABLE vocabulary_search USING fts5(
+                                                              term,
+                                                              content='vocabulary',
+                                                              content_rowid='id',
+                                                              tokenize='trigram'
+                                                          )"""
+                    c.execute(sql_createtable_vocabularysearch)
+                    c.execute("INSERT INTO vocabulary_search(vocabulary_search) VALUES('rebuild')")
+                    sql_create_vocabularysearch_trigger = """CREATE TRIGGER IF NOT EXISTS vocabulary_search_insert AFTER INSERT ON vocabulary
+                                                             BEGIN
+                                                                 INSERT INTO vocabulary_search(rowid, term) VALUES (new.id, new.term);
+                                                             END"""
+                    c.execute(sql_create_vocabularysearch_trigger)
+                except sqlite3.OperationalError:
+                    logger.warning("sqlite does not support fts5 trigram indexes, word searches will not be indexed")
+
+            self._CreateStringTokensTable(c)
+
+            self.CreateStringTokensIndexes()
 
             sql_create_text_index = """CREATE INDEX IF NOT EXISTS string_tokens_field_id_index ON string_tokens(field_id)"""
             c.execute(sql_create_text_index)
@@ -111,7 +209,6 @@ class DatabaseConnection():
                                                             spacy_stopword BOOLEAN,
                                                             tfidf_range_min FLOAT,
                                                             tfidf_range_max FLOAT,
-                                                            document_ids TEXT,
                                                             FOREIGN KEY(dataset_id) REFERENCES datasets(id)
                                                                 ON UPDATE CASCADE
                                                                 ON DELETE CASCADE
@@ -128,19 +225,157 @@ class DatabaseConnection():
                                                             spacy_stopword BOOLEAN,
                                                             tfidf_range_min FLOAT,
                                                             tfidf_range_max FLOAT,
-                                                            document_ids TEXT,
                                                             FOREIGN KEY(dataset_id) REFERENCES datasets(id)
                                                                 ON UPDATE CASCADE
                                                                 ON DELETE CASCADE
                                                        )"""
             c.execute(sql_createtable_stringtokensremoved)
 
+            #term counts persisted so that tf-idf can be updated for only the terms affected when fields are added or removed
+            sql_createtable_stringtokenstf = """CREATE TABLE IF NOT EXISTS string_tokens_tf (
+                                                    dataset_id INTEGER,
+                                                    token_type TEXT,
+                                                    term_id INTEGER,
+                                                    document_id INTEGER,
+                                                    tf INTEGER,
+                                                    PRIMARY KEY(dataset_id, token_type, term_id, document_id),
+                                                    FOREIGN KEY(dataset_id) REFERENCES datasets(id)
+                                                        ON UPDATE CASCADE
+                                                        ON DELETE CASCADE
+                                                ) WITHOUT ROWID"""
+            c.execute(sql_createtable_stringtokenstf)
+
+            sql_createtable_stringtokensdf = """CREATE TABLE IF NOT EXISTS string_tokens_df (
+                                                    dataset_id INTEGER,
+                                                    token_type TEXT,
+                                                    term_id INTEGER,
+                                                    df INTEGER,
+                                                    PRIMARY KEY(dataset_id, token_type, term_id),
+                                                    FOREIGN KEY(dataset_id) REFERENCES datasets(id)
+                                                        ON UPDATE CASCADE
+                                                        ON DELETE CASCADE
+                                                ) WITHOUT ROWID"""
+            c.execute(sql_createtable_stringtokensdf)
+
+            #distinct (field, word, pos, stopword) combinations of a dataset's tokens so that rules that only depend on these values
+            #are applied to a few thousand groups instead of every token, and the documents each group occurs in
+            #built when first needed after the dataset's tokens, tf-idf or token type changes
+            sql_createtable_stringtokensgroups = """CREATE TABLE IF NOT EXISTS string_tokens_groups (
+                                                        id INTEGER PRIMARY KEY,
+                                                        dataset_id INTEGER,
+                                                        field_id INTEGER,
+                                                        word_id INTEGER,
+                                                        pos_id INTEGER,
+                                                        spacy_stopword BOOLEAN,
+                                                        num_of_words INTEGER,
+                                                        num_of_docs INTEGER,
+                                                        tfidf_range_min FLOAT,
+                                                        tfidf_range_max FLOAT,
+                                                        included BOOLEAN,
+                                                        FOREIGN KEY(dataset_id) REFERENCES datasets(id)
+                                                            ON UPDATE CASCADE
+                                                            ON DELETE CASCADE,
+                                                        FOREIGN KEY(field_id) REFERENCES fields(id)
+                                                            ON UPDATE CASCADE
+                                                            ON DELETE CASCADE,
+                                                        FOREIGN KEY(word_id) REFERENCES vocabulary(id),
+                                                        FOREIGN KEY(pos_id) REFERENCES vocabulary(id)
+                                                    )"""
+            c.execute(sql_createtable_stringtokensgroups)
+
+            sql_create_groups_index = """CREATE INDEX IF NOT EXISTS string_tokens_groups_index ON string_tokens_groups(dataset_id, word_id, pos_id)"""
+            c.execute(sql_create_groups_index)
+
+            sql_createtable_stringtokenspostings = """CREATE TABLE IF NOT EXISTS string_tokens_postings (
+                                                            group_id INTEGER,
+                                                            document_id INTEGER,
+                                                            num_of_words INTEGER,
+                                                            PRIMARY KEY(group_id, document_id),
+                                                            FOREIGN KEY(group_id) REFERENCES string_tokens_groups(id)
+                                                                ON UPDATE CASCADE
+                                                                ON DELETE CASCADE
+                                                        ) WITHOUT ROWID"""
+            c.execute(sql_createtable_stringtokenspostings)
+
+            #number of a dataset's tokens with each distinct tf-idf value for each token type
+            #tf-idf rules calculate the percent rank of each value from these counts instead of ranking every token
+            #and only the counts of values that tokens moved from or to are changed when tokens or their tf-idf change
+            sql_createtable_stringtokenstfidfcounts = """CREATE TABLE IF NOT EXISTS string_tokens_tfidf_counts (
+                                                            dataset_id INTEGER,
+                                                            token_type TEXT,
+                                                            tfidf FLOAT,
+                                                            token_count INTEGER,
+                                                            FOREIGN KEY(dataset_id) REFERENCES datasets(id)
+                                                                ON UPDATE CASCADE
+                                                                ON DELETE CASCADE
+                                                        )"""
+            c.execute(sql_createtable_stringtokenstfidfcounts)
+
+            sql_create_tfidfcounts_index = """CREATE INDEX IF NOT EXISTS string_tokens_tfidf_counts_index ON string_tokens_tfidf_counts(dataset_id, token_type, tfidf)"""
+            c.execute(sql_create_tfidfcounts_index)
+            #replaced by string_tokens_tfidf_counts
+            c.execute("DROP TABLE IF EXISTS string_tokens_tfidf_ranks")
+
+            #indexes for each column the Filtering module's word lists can be sorted by so pages of the lists are read in order
+            for summary_table in ["string_tokens_included", "string_tokens_removed"]:
+                for sort_column in ["words", "pos", "num_of_words", "num_of_docs", "tfidf_range_min", "tfidf_range_max"]:
+                    sql_create_sort_index = """CREATE INDEX IF NOT EXISTS """+summary_table+"""_"""+sort_column+"""_index ON """+summary_table+"""(dataset_id, """+sort_column+""")"""
+                    c.execute(sql_create_sort_index)
+
+            #(word, pos) rows of string_tokens_included and string_tokens_removed that are out of date because rules moved their groups
+            #each summary table has its own rows which are removed once it has been refreshed
+            sql_createtable_stringtokenssummarychanges = """CREATE TABLE IF NOT EXISTS string_tokens_summary_changes (
+                                                                dataset_id INTEGER,
+                                                                summary_table TEXT,
+                                                                word_id INTEGER,
+                                                                pos_id INTEGER,
+                                                                FOREIGN KEY(dataset_id) REFERENCES datasets(id)
+                                                                    ON UPDATE CASCADE
+                                                                    ON DELETE CASCADE
+                                                            )"""
+            c.execute(sql_createtable_stringtokenssummarychanges)
+
+            sql_create_summarychanges_index = """CREATE INDEX IF NOT EXISTS string_tokens_summary_changes_index ON string_tokens_summary_changes(dataset_id, summary_table, word_id, pos_id)"""
+            c.execute(sql_create_summarychanges_index)
+
             self.__conn.commit()
             c.close()
         except sqlite3.Error:
             logger.exception("sql failed with sql error")
         logger.info("Finished")
 
+    def _CreateStringTokensTable(self, c):
+        sql_createtable_stringtokens = """ CREATE TABLE IF NOT EXISTS string_tokens (
+                                                id integer PRIMARY KEY,
+                                                dataset_id INTEGER,
+                                                field_id INTEGER,
+                                                document_id INTEGER,
+                                                position INT,
+                                                text_id INTEGER,
+                                                stem_id INTEGER,
+                                                lemma_id INTEGER,
+                                                pos_id INTEGER,
+                                                spacy_stopword BOOLEAN,
+                                                text_tfidf FLOAT,
+                                                stem_tfidf FLOAT,
+                                                lemma_tfidf FLOAT,
+                                                included BOOLEAN DEFAULT 1,
+                                                FOREIGN KEY(dataset_id) REFERENCES datasets(id)
+                                                    ON UPDATE CASCADE
+                                                    ON DELETE CASCADE,
+                                                FOREIGN KEY(field_id) REFERENCES fields(id)
+                                                    ON UPDATE CASCADE
+                                                    ON DELETE CASCADE,
+                                                FOREIGN KEY(document_id) REFERENCES documents(id)
+                                                    ON UPDATE CASCADE
+                                                    ON DELETE CASCADE,
+                                                FOREIGN KEY(text_id) REFERENCES vocabulary(id),
+                                                FOREIGN KEY(stem_id) REFERENCES vocabulary(id),
+                                                FOREIGN KEY(lemma_id) REFERENCES vocabulary(id),
+                                                FOREIGN KEY(pos_id) REFERENCES vocabulary(id)
+                                            )"""
+        c.execute(sql_createtable_stringtokens)
+
     def Upgrade0_8_5(self):
         logger = logging.getLogger(__name__+".Upgrade0_8_5")
         logger.info("Starting")
@@ -157,18 +392,177 @@ class DatabaseConnection():
             logger.exception("sql failed with sql error")
         logger.info("Finished")
     
-    def Upgrade0_8_7(self):
-        logger = logging.getLogger(__name__+".Upgrade0_8_7")
+    def UpgradeStringTokensVocabulary(self):
+        #converts string_tokens of workspaces saved before the vocabulary table existed from storing strings to storing vocabulary ids
+        logger = logging.getLogger(__name__+".UpgradeStringTokensVocabulary")
         logger.info("Starting")
         try:
             c = self.__conn.cursor()
+            c.execute("PRAGMA table_info(string_tokens)")
+            columns = [row[1] for row in c.fetchall()]
+            if 'text' in columns:
+                sql_createtable_vocabulary = """ CREATE TABLE IF NOT EXISTS vocabulary (
+                                                        id INTEGER PRIMARY KEY,
+                                                        term TEXT UNIQUE
+                                                    )"""
+                c.execute(sql_createtable_vocabulary)
+                sql_insert_vocabulary = """INSERT OR IGNORE INTO vocabulary (term)
+                                           SELECT text FROM string_tokens WHERE text IS NOT NULL
+                                           UNION
+                                           SELECT stem FROM string_tokens WHERE stem IS NOT NULL
+                                           UNION
+                                           SELECT lemma FROM string_tokens WHERE lemma IS NOT NULL
+                                           UNION
+                                           SELECT pos FROM string_tokens WHERE pos IS NOT NULL
+                                           """
+                c.execute(sql_insert_vocabulary)
+
+                for index in ['string_tokens_text_index', 'string_tokens_stem_index', 'string_tokens_lemma_index',
+                              'string_tokens_included_index', 'string_tokens_field_id_index', 'string_tokens_document_id_index']:
+                    c.execute("DROP INDEX IF EXISTS "+index)
+                c.execute("ALTER TABLE string_tokens RENAME TO string_tokens_strings")
+                self._CreateStringTokensTable(c)
+                sql_copy_stringtokens = """INSERT INTO string_tokens (
+                                                id,
+                                                dataset_id,
+                                                field_id,
+                                                document_id,
+                                                position,
+                                                text_id,
+                                                stem_id,
+                                                lemma_id,
+                                                pos_id,
+                                                spacy_stopword,
+                                                text_tfidf,
+                                                stem_tfidf,
+                                                lemma_tfidf,
+                                                included
+                                           )
+                                           SELECT string_tokens_strings.id,
+                                                  dataset_id,
+                                                  field_id,
+                                                  document_id,
+                                                  position,
+                                                  text_vocabulary.id,
+                                                  stem_vocabulary.id,
+                                                  lemma_vocabulary.id,
+                                                  pos_vocabulary.id,
+                                                  spacy_stopword,
+                                                  text_tfidf,
+                                                  stem_tfidf,
+                                                  lemma_tfidf,
+                                                  included
+                                           FROM string_tokens_strings
+                                           LEFT JOIN vocabulary AS text_vocabulary ON text_vocabulary.term = text
+                                           LEFT JOIN vocabulary AS stem_vocabulary ON stem_vocabulary.term = stem
+                                           LEFT JOIN vocabulary AS lemma_vocabulary ON lemma_vocabulary.term = lemma
+                                           LEFT JOIN vocabulary AS pos_vocabulary ON pos_vocabulary.term = pos
+                                           """
+                c.execute(sql_copy_stringtokens)
+                c.execute("DROP TABLE string_tokens_strings")
+                #persisted term counts are rebuilt by the next tf-idf update
+                c.execute("DROP TABLE IF EXISTS string_tokens_tf")
+                c.execute("DROP TABLE IF EXISTS string_tokens_df")
+                self.__conn.commit()
+                logger.info("Converted string_tokens to use vocabulary ids")
+            c.close()
+        except sqlite3.Error:
+            logger.exception("sql failed with sql error")
+        logger.info("Finished")
 
-            c.execute("""ALTER TABLE string_tokens_included
-                         ADD COLUMN document_ids text;
-                         """)
-            c.execute("""ALTER TABLE string_tokens_removed
-                         ADD COLUMN document_ids text;
-                         """)
+    def UpgradeDocumentKeys(self):
+        #converts documents of workspaces saved before document keys were stored by part from str() of the key tuple
+        logger = logging.getLogger(__name__+".UpgradeDocumentKeys")
+        logger.info("Starting")
+        try:
+            c = self.__conn.cursor()
+            c.execute("PRAGMA table_info(documents)")
+            columns = [row[1] for row in c.fetchall()]
+            if 'document_key' in columns and 'key_id' not in columns:
+                c.execute("ALTER TABLE documents ADD COLUMN key_source TEXT")
+                c.execute("ALTER TABLE documents ADD COLUMN key_type TEXT")
+                c.execute("ALTER TABLE documents ADD COLUMN key_id")
+                c.execute("SELECT id, document_key FROM documents")
+                parameters = []
+                for document_id, document_key in c.fetchall():
+                    parameters.append(self._DocumentKeyParameters(ast.literal_eval(document_key))+(document_id,))
+                sql_update_documents = """UPDATE documents
+                                          SET key_source = ?,
+                                              key_type = ?,
+                                              key_id = ?
+                                          WHERE id = ?
+                                          """
+                c.executemany(sql_update_documents, parameters)
+                c.execute("CREATE UNIQUE INDEX IF NOT EXISTS documents_key_index ON documents(dataset_id, key_source, key_type, key_id)")
+                self.__conn.commit()
+                logger.info("Converted %s document keys", str(len(parameters)))
+            c.close()
+        except sqlite3.Error:
+            logger.exception("sql failed with sql error")
+        logger.info("Finished")
+
+    def UpgradeTables(self):
+        #converts tables saved by earlier versions and adds any tables introduced since the workspace was saved
+        #called when a workspace is loaded before the version upgrades, which refresh summaries using the newer tables
+        self.UpgradeStringTokensVocabulary()
+        self.UpgradeDocumentKeys()
+        self.UpgradeSummaryDocumentIds()
+        self.Create()
+
+    def UpgradeSummaryDocumentIds(self):
+        #drops the document_ids text of the summaries of workspaces saved by versions from 0.8.7,
+        #documents of words are sampled from string_tokens_postings instead
+        logger = logging.getLogger(__name__+".UpgradeSummaryDocumentIds")
+        logger.info("Starting")
+        try:
+            c = self.__conn.cursor()
+            for summary_table in ["string_tokens_included", "string_tokens_removed"]:
+                c.execute("PRAGMA table_info("+summary_table+")")
+                columns = [row[1] for row in c.fetchall()]
+                if 'document_ids' in columns:
+                    try:
+                        c.execute("ALTER TABLE "+summary_table+" DROP COLUMN document_ids")
+                    except sqlite3.OperationalError:
+                        #sqlite versions before 3.35 can not drop columns so the text is cleared instead
+                        c.execute("UPDATE "+summary_table+" SET document_ids = NULL")
+            self.__conn.commit()
+            c.close()
+        except sqlite3.Error:
+            logger.exception("sql failed with sql error")
+        logger.info("Finished")
+
+    def CreateStringTokensIndexes(self):
+        logger = logging.getLogger(__name__+".CreateStringTokensIndexes")
+        logger.info("Starting")
+        try:
+            c = self.__conn.cursor()
+            sql_create_text_index = """CREATE INDEX IF NOT EXISTS string_tokens_text_index ON string_tokens(dataset_id, text_id, document_id)"""
+            c.execute(sql_create_text_index)
+            sql_create_stem_index = """CREATE INDEX IF NOT EXISTS string_tokens_stem_index ON string_tokens(dataset_id, stem_id, document_id)"""
+            c.execute(sql_create_stem_index)
+            sql_create_lemma_index = """CREATE INDEX IF NOT EXISTS string_tokens_lemma_index ON string_tokens(dataset_id, lemma_id, document_id)"""
+            c.execute(sql_create_lemma_index)
+
+            sql_create_included_index = """CREATE INDEX IF NOT EXISTS string_tokens_included_index ON string_tokens(dataset_id, included)"""
+            c.execute(sql_create_included_index)
+            self.__conn.commit()
+            c.close()
+        except sqlite3.Error:
+            logger.exception("sql failed with sql error")
+        logger.info("Finished")
+
+    def DropStringTokensIndexes(self):
+        #used to speed up very large loads of tokens as the indexes are cheaper to rebuild once than to maintain per row
+        #string_tokens_field_id_index and string_tokens_document_id_index are kept as they are needed by cascading deletes
+        #the indexes are shared by all datasets of the workspace so callers in the toolkit first need AcquireStringTokensIndexesDrop
+        logger = logging.getLogger(__name__+".DropStringTokensIndexes")
+        logger.info("Starting")
+        try:
+            c = self.__conn.cursor()
+            c.execute("""DROP INDEX IF EXISTS string_tokens_text_index""")
+            c.execute("""DROP INDEX IF EXISTS string_tokens_stem_index""")
+            c.execute("""DROP INDEX IF EXISTS string_tokens_lemma_index""")
+            c.execute("""DROP INDEX IF EXISTS string_tokens_included_index""")
             self.__conn.commit()
             c.close()
         except sqlite3.Error:
@@ -218,6 +612,8 @@ class DatabaseConnection():
                                       WHERE dataset_key = ?
                                       """
             c.execute(sql_update_tokentype, (token_type, str(dataset_key),))
+            c.execute("SELECT id FROM datasets WHERE dataset_key = ?", (str(dataset_key),))
+            self._DeleteStringTokensGroups(c, c.fetchone()[0])
             self.__conn.commit()
             c.close()
         except sqlite3.Error as e:
@@ -234,6 +630,7 @@ class DatabaseConnection():
                                     """
             c.execute(sql_delete_dataset, (str(dataset_key),))
             self.__conn.commit()
+            self.__document_ids.clear()
             c.close()
         except sqlite3.Error as e:
             logger.exception("sql failed with error")
@@ -299,18 +696,51 @@ class DatabaseConnection():
             logger.exception("sql failed with error")
         logger.info("Finished")
 
-    def DeleteField(self, dataset_key, field_key):
+    def DeleteField(self, dataset_key, field_key, update_tfidf=True):
+        #when update_tfidf is False the dataset's persisted term counts are discarded instead of maintained
+        #so that the next call to UpdateStringTokensTFIDF rebuilds them (used when all fields are being retokenized)
         logger = logging.getLogger(__name__+".DeleteField")
         logger.info("Starting")
         try:
             c = self.__conn.cursor()
-            sql_delete_field = """DELETE FROM fields
-                                  WHERE dataset_id = (SELECT id
-                                                      FROM datasets 
-                                                      WHERE dataset_key = ?)
-                                  AND field_key = ?
-                                  """
-            c.execute(sql_delete_field, (str(dataset_key), str(field_key),))
+            sql_select_ids = """SELECT datasets.id,
+                                       fields.id
+                                FROM datasets
+                                JOIN fields
+                                ON fields.dataset_id = datasets.id
+                                WHERE dataset_key = ?
+                                AND field_key = ?
+                                """
+            c.execute(sql_select_ids, (str(dataset_key), str(field_key),))
+            row = c.fetchone()
+            if row != None:
+                dataset_id, field_id = row
+                self._DeleteStringTokensGroups(c, dataset_id)
+                if self._TFIDFCountsExist(c, dataset_id):
+                    for token_type in ['text', 'stem', 'lemma']:
+                        sql_select_fieldcounts = """SELECT """+token_type+"""_tfidf,
+                                                           COUNT(*)
+                                                    FROM string_tokens
+                                                    WHERE field_id = ?
+                                                    GROUP BY """+token_type+"""_tfidf
+                                                    """
+                        c.execute(sql_select_fieldcounts, (field_id,))
+                        self._ChangeTFIDFCounts(c, dataset_id, token_type, c.fetchall(), -1)
+                update_tfidf = update_tfidf and self._TermCountsExist(c, dataset_id)
+                if update_tfidf:
+                    self.__conn.create_function('log', 1, math.log)
+                    self._ChangeTermCounts(c, dataset_id, field_id, -1)
+                else:
+                    c.execute("DELETE FROM string_tokens_tf WHERE dataset_id = ?", (dataset_id,))
+                    c.execute("DELETE FROM string_tokens_df WHERE dataset_id = ?", (dataset_id,))
+
+                sql_delete_field = """DELETE FROM fields
+                                      WHERE id = ?
+                                      """
+                c.execute(sql_delete_field, (field_id,))
+
+                if update_tfidf:
+                    self._UpdateChangedTFIDF(c, dataset_id)
             self.__conn.commit()
             c.close()
         except sqlite3.Error as e:
@@ -355,13 +785,16 @@ class DatabaseConnection():
             dataset_id = c.fetchone()[0]
             parameters = []
             for document_key in document_keys:
-                parameters.append((dataset_id, str(document_key),))
+                parameters.append((dataset_id,)+self._DocumentKeyParameters(document_key))
             sql_insert_tokens = """INSERT INTO documents (
                                           dataset_id,
-                                          document_key
-                                          ) values (?, ?)"""
+                                          key_source,
+                                          key_type,
+                                          key_id
+                                          ) values (?, ?, ?, ?)"""
             c.executemany(sql_insert_tokens, parameters)
             c.execute("COMMIT")
+            self.__document_ids.pop(dataset_id, None)
             c.close()
         except sqlite3.Error as e:
             logger.exception("sql failed with error")
@@ -369,19 +802,41 @@ class DatabaseConnection():
             self.__conn.isolation_level = old_isolation_level
         logger.info("Finished")
     
+    def _DocumentKeyParameters(self, document_key):
+        #the key_source, key_type and key_id column values of a (data_source, data_type, id) document key
+        data_source, data_type, id_value = document_key
+        return (data_source, data_type, id_value,)
+
+    def _GetDocumentIds(self, c, dataset_id):
+        #returns a dict of the id of each of the dataset's documents by document key
+        if dataset_id not in self.__document_ids:
+            sql_select_documentids = """SELECT key_source, key_type, key_id, id
+                                        FROM documents
+                                        WHERE dataset_id = ?
+                                        """
+            c.execute(sql_select_documentids, (dataset_id,))
+            self.__document_ids[dataset_id] = {(row[0], row[1], row[2]): row[3] for row in c}
+        return self.__document_ids[dataset_id]
+
     def GetDocumentKeys(self, document_ids):
-        logger = logging.getLogger(__name__+".InsertDataset")
+        logger = logging.getLogger(__name__+".GetDocumentKeys")
         logger.info("Starting")
         document_keys = []
         try:
             c = self.__conn.cursor()
-            sql_select_documentkeys = """SELECT document_key
-                                         FROM documents
-                                         WHERE id = ?
-                                         """
-            for document_id in document_ids:
-                c.execute(sql_select_documentkeys, (document_id,))
-                document_keys.append(ast.literal_eval(c.fetchone()[0]))
+            keys_by_id = {}
+            document_ids = list(document_ids)
+            for i in range(0, len(document_ids), Constants.DATABASE_MAX_PARAMETERS):
+                document_ids_chunk = document_ids[i:i+Constants.DATABASE_MAX_PARAMETERS]
+                sql_select_documentkeys = """SELECT id, key_source, key_type, key_id
+                                             FROM documents
+                                             WHERE id IN ("""+",".join("?"*len(document_ids_chunk))+""")
+                                             """
+                c.execute(sql_select_documentkeys, document_ids_chunk)
+                for row in c:
+                    keys_by_id[row[0]] = (row[1], row[2], row[3])
+            document_keys = [keys_by_id[document_id] for document_id in document_ids if document_id in keys_by_id]
+            c.close()
         except sqlite3.Error as e:
             logger.exception("sql failed with error")
         logger.info("Finished")
@@ -410,41 +865,88 @@ class DatabaseConnection():
             c.execute(sql_select_fieldid, (dataset_id, str(field_key),))
             field_id = c.fetchone()[0]
 
-            sql_select_documentid = """SELECT id
-                                       FROM documents 
-                                       WHERE dataset_id = ?
-                                       AND document_key = ?
-                                       """
+            document_ids = self._GetDocumentIds(c, dataset_id)
+            if any(tuple(doc_key) not in document_ids for doc_key in tokens):
+                #the documents may have been inserted by another connection after the ids were cached
+                self.__document_ids.pop(dataset_id, None)
+                document_ids = self._GetDocumentIds(c, dataset_id)
+
+            start_time = datetime.now()
+            c.execute("BEGIN")
+            self._DeleteStringTokensGroups(c, dataset_id)
+
+            terms = set()
+            for doc_key in tokens:
+                for t in tokens[doc_key]:
+                    terms.update(t[1:5])
+            term_ids = self._GetTermIds(c, terms)
+
+            def TokenParameters():
+                for doc_key in tokens:
+                    document_id = document_ids[tuple(doc_key)]
+                    for t in tokens[doc_key]:
+                        yield (dataset_id, field_id, document_id, t[0], term_ids.get(t[1]), term_ids.get(t[2]), term_ids.get(t[3]), term_ids.get(t[4]), t[5],)
+
             sql_insert_tokens = """INSERT INTO string_tokens (
                                         dataset_id,
                                         field_id,
                                         document_id,
                                         position,
-                                        text,
-                                        stem,
-                                        lemma,
-                                        pos,
+                                        text_id,
+                                        stem_id,
+                                        lemma_id,
+                                        pos_id,
                                         spacy_stopword
                                         ) values (?,?,?,?,?,?,?,?,?)"""
-            c.execute("BEGIN")
-            for doc_key in tokens:
-                c.execute(sql_select_documentid, (dataset_id, str(doc_key),))
-                document_id = c.fetchone()[0]
-                parameters = []
-                for t in tokens[doc_key]:
-                    parameters.append((dataset_id, field_id, document_id, t[0], t[1], t[2], t[3], t[4], t[5],))
-                c.executemany(sql_insert_tokens, parameters)
+            c.executemany(sql_insert_tokens, TokenParameters())
+            row_count = c.rowcount
+            #new tokens have no tf-idf until it is next updated
+            if self._TFIDFCountsExist(c, dataset_id):
+                for token_type in ['text', 'stem', 'lemma']:
+                    self._ChangeTFIDFCounts(c, dataset_id, token_type, [(None, row_count)], 1)
             c.execute("COMMIT")
             c.close()
+            elapsed_seconds = (datetime.now() - start_time).total_seconds()
+            if elapsed_seconds > 0:
+                logger.info("Inserted %s tokens in %s seconds (%s rows/second)", str(row_count), str(elapsed_seconds), str(int(row_count/elapsed_seconds)))
         except sqlite3.Error as e:
             logger.exception("sql failed with error")
+            self._RollbackInsertStringTokens()
+        except KeyError as e:
+            logger.exception("tokens are for a document that is not in the dataset")
+            self._RollbackInsertStringTokens()
         finally:
             self.__conn.isolation_level = old_isolation_level
         logger.info("Finished")
 
-    def UpdateStringTokensTFIDF(self, dataset_key):
+    def _RollbackInsertStringTokens(self):
+        #restoring the isolation level does not end the transaction so a failed insert is rolled back explicitly
+        if self.__conn.in_transaction:
+            self.__conn.execute("ROLLBACK")
+        #vocabulary ids cached during a failed insert may not have been kept
+        self.__term_ids.clear()
+
+    def _GetTermIds(self, c, terms):
+        #returns a dict of each term's vocabulary id, adding any terms not yet in the vocabulary
+        new_terms = [term for term in terms if term is not None and term not in self.__term_ids]
+        if len(new_terms) > 0:
+            c.executemany("INSERT OR IGNORE INTO vocabulary (term) VALUES (?)", ((term,) for term in new_terms))
+            for i in range(0, len(new_terms), Constants.DATABASE_MAX_PARAMETERS):
+                new_terms_chunk = new_terms[i:i+Constants.DATABASE_MAX_PARAMETERS]
+                sql_select_termids = """SELECT term, id
+                                        FROM vocabulary
+                                        WHERE term IN ("""+",".join("?"*len(new_terms_chunk))+""")
+                                        """
+                c.execute(sql_select_termids, new_terms_chunk)
+                self.__term_ids.update(c.fetchall())
+        return self.__term_ids
+
+    def UpdateStringTokensTFIDF(self, dataset_key, new_field_keys=None):
+        #when new_field_keys is given only the tf-idf of terms occuring in those newly tokenized fields are updated from the persisted term counts
+        #otherwise, or if the dataset has no persisted term counts yet, the term counts and tf-idf of all tokens are rebuilt
         logger = logging.getLogger(__name__+".UpdateStringTokensTFIDF")
         logger.info("Starting")
+        start_time = datetime.now()
         try:
             c = self.__conn.cursor()
 
@@ -456,117 +958,25 @@ class DatabaseConnection():
                                       """
             c.execute(sql_select_datasetid, (str(dataset_key),))
             dataset_id = c.fetchone()[0]
+            self._DeleteStringTokensGroups(c, dataset_id)
 
-            sql_select_documentscount = """SELECT COUNT(DISTINCT document_key)
-                                           FROM documents
-                                           WHERE dataset_id = ?"""
-            c.execute(sql_select_documentscount, (dataset_id,))
-            document_count = c.fetchone()[0]
-
-            #1) For Text
-            sql_texttf = """SELECT dataset_id,
-                                   text,
-                                   document_id,
-                                   COUNT(*) as tf
-                            FROM string_tokens
-                            WHERE dataset_id = :dataset_id
-                            GROUP BY dataset_id, text, document_id
-                            """
-
-            sql_textidf = """SELECT dataset_id,
-                                    text,
-                                    log(CAST(:document_count as REAL)/COUNT(DISTINCT document_id)) as idf
-                             FROM string_tokens
-                             WHERE dataset_id = :dataset_id
-                             GROUP BY dataset_id, text
-                             """
-
-            sql_update_texttfidf = """UPDATE string_tokens
-                                      SET text_tfidf = tmp_tfidf.tfidf
-                                      FROM (SELECT text_tf.dataset_id AS dataset_id,
-                                                   text_tf.text AS text ,
-                                                   text_tf.document_id AS document_id,
-                                                   text_tf.tf * text_idf.idf AS tfidf
-                                            FROM ("""+sql_texttf+""") AS text_tf
-                                            JOIN ("""+sql_textidf+""") AS text_idf
-                                            ON text_tf.text = text_idf.text
-                                            ) AS tmp_tfidf
-                                      WHERE string_tokens.dataset_id = tmp_tfidf.dataset_id
-                                      AND string_tokens.text = tmp_tfidf.text
-                                      AND string_tokens.document_id = tmp_tfidf.document_id
-                                      """
-            c.execute(sql_update_texttfidf, {'dataset_id':dataset_id, 'document_count': document_count})
-            logger.info("Updated Text tf-idf")
-
-            #2) for Stem
-            sql_stemtf = """SELECT dataset_id,
-                                   stem,
-                                   document_id,
-                                   COUNT(*) as tf
-                            FROM string_tokens
-                            WHERE dataset_id = :dataset_id
-                            GROUP BY dataset_id, stem, document_id
-                            """
-
-            sql_stemidf = """SELECT dataset_id,
-                                    stem,
-                                    log(CAST(:document_count as REAL)/COUNT(DISTINCT document_id)) as idf
-                             FROM string_tokens
-                             WHERE dataset_id = :dataset_id
-                             GROUP BY dataset_id, stem
-                             """
-
-            sql_update_stemtfidf = """UPDATE string_tokens
-                                      SET stem_tfidf = tmp_tfidf.tfidf
-                                      FROM (SELECT stem_tf.dataset_id AS dataset_id,
-                                                   stem_tf.stem AS stem ,
-                                                   stem_tf.document_id AS document_id,
-                                                   stem_tf.tf * stem_idf.idf AS tfidf
-                                            FROM ("""+sql_stemtf+""") AS stem_tf
-                                            JOIN ("""+sql_stemidf+""") AS stem_idf
-                                            ON stem_tf.stem = stem_idf.stem
-                                            ) AS tmp_tfidf
-                                      WHERE string_tokens.dataset_id = tmp_tfidf.dataset_id
-                                      AND string_tokens.stem = tmp_tfidf.stem
-                                      AND string_tokens.document_id = tmp_tfidf.document_id
-                                      """
-            c.execute(sql_update_stemtfidf, {'dataset_id':dataset_id, 'document_count': document_count})
-            logger.info("Updated Stem tf-idf")
-
-            #3) For Lemma
-            sql_lemmatf = """SELECT dataset_id,
-                                    lemma,
-                                    document_id,
-                                    COUNT(*) as tf
-                             FROM string_tokens
-                             WHERE dataset_id = :dataset_id
-                             GROUP BY dataset_id, lemma, document_id
-                            """
-            
-            sql_lemmaidf = """SELECT dataset_id,
-                                     lemma,
-                                     log(CAST(:document_count as REAL)/COUNT(DISTINCT document_id)) as idf
-                              FROM string_tokens
-                              WHERE dataset_id = :dataset_id
-                              GROUP BY dataset_id, lemma
-                              """
-
-            sql_update_lemmatfidf = """UPDATE string_tokens
-                                       SET lemma_tfidf = tmp_tfidf.tfidf
-                                       FROM (SELECT lemma_tf.dataset_id AS dataset_id,
-                                                    lemma_tf.lemma AS lemma ,
-                                                    lemma_tf.document_id AS document_id,
-                                                    lemma_tf.tf * lemma_idf.idf AS tfidf
-                                             FROM ("""+sql_lemmatf+""") AS lemma_tf
-                                             JOIN ("""+sql_lemmaidf+""") AS lemma_idf
-                                             ON lemma_tf.lemma = lemma_idf.lemma
-                                             ) AS tmp_tfidf
-                                       WHERE string_tokens.dataset_id = tmp_tfidf.dataset_id
-                                       AND string_tokens.lemma = tmp_tfidf.lemma
-                                       AND string_tokens.document_id = tmp_tfidf.document_id
-                                       """
-            c.execute(sql_update_lemmatfidf, {'dataset_id':dataset_id, 'document_count': document_count})
-            logger.info("Updated Lemma tf-idf")
+            if new_field_keys != None and self._TermCountsExist(c, dataset_id):
+                for field_key in new_field_keys:
+                    sql_select_fieldid = """SELECT id
+                                            FROM fields
+                                            WHERE dataset_id = ?
+                                            AND field_key = ?
+                                            """
+                    c.execute(sql_select_fieldid, (dataset_id, str(field_key),))
+                    field_id = c.fetchone()[0]
+                    self._ChangeTermCounts(c, dataset_id, field_id, 1)
+                #with no new fields (e.g. after DeleteField already updated the tf-idf) nothing has changed
+                if len(new_field_keys) > 0:
+                    self._UpdateChangedTFIDF(c, dataset_id)
+                logger.info("Updated tf-idf of %s new fields in %s using database profile[%s]", str(len(new_field_keys)), str(datetime.now() - start_time), connection_profile)
+            else:
+                self._RebuildTFIDF(c, dataset_id)
+                logger.info("Updated tf-idf in %s using database profile[%s]", str(datetime.now() - start_time), connection_profile)
 
             self.__conn.commit()
             c.close()
@@ -574,54 +984,721 @@ class DatabaseConnection():
             logger.exception("sql failed with error")
         logger.info("Finished")
 
-    def _RuleGroupSqlCreator(self, rule_action, rule_group, dataset_id, token_type):
+    def _TermCountsExist(self, c, dataset_id):
+        c.execute("SELECT 1 FROM string_tokens_df WHERE dataset_id = ? LIMIT 1", (dataset_id,))
+        return c.fetchone() != None
+
+    def _DocumentCount(self, c, dataset_id):
+        sql_select_documentscount = """SELECT COUNT(*)
+                                       FROM documents
+                                       WHERE dataset_id = ?"""
+        c.execute(sql_select_documentscount, (dataset_id,))
+        return c.fetchone()[0]
+
+    def _RebuildTFIDF(self, c, dataset_id):
+        logger = logging.getLogger(__name__+"._RebuildTFIDF")
+        start_time = datetime.now()
+        document_count = self._DocumentCount(c, dataset_id)
+
+        c.execute("DELETE FROM string_tokens_tf WHERE dataset_id = ?", (dataset_id,))
+        c.execute("DELETE FROM string_tokens_df WHERE dataset_id = ?", (dataset_id,))
+
+        #1) for each token type persist the term counts and materialize the tf-idf of every term in every document
+        #   tf is grouped from the dataset's covering index on that token type so the table itself is not scanned
+        for token_type in ['text', 'stem', 'lemma']:
+            sql_insert_tf = """INSERT INTO string_tokens_tf (dataset_id, token_type, term_id, document_id, tf)
+                               SELECT dataset_id,
+                                      :token_type,
+                                      """+token_type+"""_id,
+                                      document_id,
+                                      COUNT(*)
+                               FROM string_tokens
+                               WHERE dataset_id = :dataset_id
+                               AND """+token_type+"""_id IS NOT NULL
+                               GROUP BY """+token_type+"""_id, document_id
+                               """
+            c.execute(sql_insert_tf, {'dataset_id':dataset_id, 'token_type':token_type})
+
+            sql_insert_df = """INSERT INTO string_tokens_df (dataset_id, token_type, term_id, df)
+                               SELECT dataset_id,
+                                      token_type,
+                                      term_id,
+                                      COUNT(*)
+                               FROM string_tokens_tf
+                               WHERE dataset_id = :dataset_id
+                               AND token_type = :token_type
+                               GROUP BY term_id
+                               """
+            c.execute(sql_insert_df, {'dataset_id':dataset_id, 'token_type':token_type})
+
+            self._CreateTFIDFTable(c, dataset_id, token_type, document_count, False)
+            logger.info("Calculated %s tf-idf in %s", token_type, str(datetime.now() - start_time))
+
+        #2) write all three scores back with one pass over the dataset's tokens
+        self._WriteTFIDF(c, dataset_id, False)
+
+    def _ChangeTermCounts(self, c, dataset_id, field_id, direction):
+        #adds (direction 1) or subtracts (direction -1) a field's tokens from the persisted term counts
+        #and records in temp tables which terms and (term, document) pairs need their tf-idf updated
+        c.execute("""CREATE TEMP TABLE IF NOT EXISTS tfidf_changed_terms (
+                         token_type TEXT,
+                         term_id INTEGER,
+                         PRIMARY KEY(token_type, term_id)
+                     ) WITHOUT ROWID""")
+        c.execute("""CREATE TEMP TABLE IF NOT EXISTS tfidf_changed_pairs (
+                         token_type TEXT,
+                         term_id INTEGER,
+                         document_id INTEGER,
+                         PRIMARY KEY(token_type, term_id, document_id)
+                     ) WITHOUT ROWID""")
+        parameters = {'dataset_id':dataset_id, 'field_id':field_id, 'direction':direction}
+        for token_type in ['text', 'stem', 'lemma']:
+            parameters['token_type'] = token_type
+            c.execute("DROP TABLE IF EXISTS temp.field_tf")
+            c.execute("""CREATE TEMP TABLE field_tf (
+                             term_id INTEGER,
+                             document_id INTEGER,
+                             tf INTEGER,
+                             PRIMARY KEY(term_id, document_id)
+                         ) WITHOUT ROWID""")
+            sql_insert_fieldtf = """INSERT INTO field_tf (term_id, document_id, tf)
+                                    SELECT """+token_type+"""_id,
+                                           document_id,
+                                           COUNT(*)
+                                    FROM string_tokens
+                                    WHERE field_id = :field_id
+                                    AND """+token_type+"""_id IS NOT NULL
+                                    GROUP BY """+token_type+"""_id, document_id
+                                    """
+            c.execute(sql_insert_fieldtf, parameters)
+
+            sql_upsert_tf = """INSERT INTO string_tokens_tf (dataset_id, token_type, term_id, document_id, tf)
+                               SELECT :dataset_id,
+                                      :token_type,
+                                      term_id,
+                                      document_id,
+                                      :direction * tf
+                               FROM field_tf
+                               WHERE true
+                               ON CONFLICT(dataset_id, token_type, term_id, document_id) DO UPDATE SET tf = tf + excluded.tf
+                               """
+            c.execute(sql_upsert_tf, parameters)
+
+            #a document's frequency for a term changes when the field added its first or removed its last occurence of the term
+            c.execute("DROP TABLE IF EXISTS temp.field_df")
+            c.execute("""CREATE TEMP TABLE field_df (
+                             term_id INTEGER PRIMARY KEY,
+                             df INTEGER
+                         ) WITHOUT ROWID""")
+            #CROSS JOIN keeps the field's counts as the outer loop, sqlite would otherwise scan all of the dataset's counts
+            sql_insert_fielddf = """INSERT INTO field_df (term_id, df)
+                                    SELECT field_tf.term_id,
+                                           :direction * COUNT(*)
+                                    FROM field_tf
+                                    CROSS JOIN string_tokens_tf
+                                    ON string_tokens_tf.dataset_id = :dataset_id
+                                    AND string_tokens_tf.token_type = :token_type
+                                    AND string_tokens_tf.term_id = field_tf.term_id
+                                    AND string_tokens_tf.document_id = field_tf.document_id
+                                    WHERE string_tokens_tf.tf = CASE WHEN :direction > 0 THEN field_tf.tf ELSE 0 END
+                                    GROUP BY field_tf.term_id
+                                    """
+            c.execute(sql_insert_fielddf, parameters)
+
+            sql_upsert_df = """INSERT INTO string_tokens_df (dataset_id, token_type, term_id, df)
+                               SELECT :dataset_id,
+                                      :token_type,
+                                      term_id,
+                                      df
+                               FROM field_df
+                               WHERE true
+                               ON CONFLICT(dataset_id, token_type, term_id) DO UPDATE SET df = df + excluded.df
+                               """
+            c.execute(sql_upsert_df, parameters)
+
+            sql_delete_tf = """DELETE FROM string_tokens_tf
+                               WHERE dataset_id = :dataset_id
+                               AND token_type = :token_type
+                               AND (term_id, document_id) IN (SELECT term_id, document_id FROM field_tf)
+                               AND tf <= 0
+                               """
+            c.execute(sql_delete_tf, parameters)
+            sql_delete_df = """DELETE FROM string_tokens_df
+                               WHERE dataset_id = :dataset_id
+                               AND token_type = :token_type
+                               AND term_id IN (SELECT term_id FROM field_df)
+                               AND df <= 0
+                               """
+            c.execute(sql_delete_df, parameters)
+
+            c.execute("""INSERT OR IGNORE INTO tfidf_changed_terms (token_type, term_id)
+                         SELECT :token_type, term_id
+                         FROM field_df
+                         """, parameters)
+            c.execute("""INSERT OR IGNORE INTO tfidf_changed_pairs (token_type, term_id, document_id)
+                         SELECT :token_type, term_id, document_id
+                         FROM field_tf
+                         """, parameters)
+            c.execute("DROP TABLE temp.field_df")
+            c.execute("DROP TABLE temp.field_tf")
+
+    def _UpdateChangedTFIDF(self, c, dataset_id):
+        #recalculates tf-idf for the tokens recorded by _ChangeTermCounts
+        #terms whose df changed have all of their tokens updated, other terms only the tokens in documents whose tf changed
+        #when most (term, document) pairs change it is faster to rewrite every token in one pass from the persisted term counts
+        document_count = self._DocumentCount(c, dataset_id)
+        changed_only = self._ChangedTFIDFFraction(c, dataset_id) <= Constants.TFIDF_INCREMENTAL_MAX_CHANGED
+        for token_type in ['text', 'stem', 'lemma']:
+            self._CreateTFIDFTable(c, dataset_id, token_type, document_count, changed_only)
+        self._WriteTFIDF(c, dataset_id, changed_only)
+        c.execute("DROP TABLE IF EXISTS temp.tfidf_changed_terms")
+        c.execute("DROP TABLE IF EXISTS temp.tfidf_changed_pairs")
+
+    def _ChangedTFIDFFraction(self, c, dataset_id):
+        #estimate of the fraction of the dataset's (term, document) pairs recorded by _ChangeTermCounts as needing their tf-idf updated
+        #read from the document frequencies so it costs no more than a pass over the vocabulary
+        changed_pairs = 0
+        total_pairs = 0
+        for token_type in ['text', 'stem', 'lemma']:
+            parameters = {'dataset_id': dataset_id, 'token_type': token_type}
+            sql_select_changedpairs = """SELECT (SELECT COALESCE(SUM(df), 0)
+                                                 FROM string_tokens_df
+                                                 WHERE dataset_id = :dataset_id
+                                                 AND token_type = :token_type
+                                                 AND term_id IN (SELECT term_id
+                                                                 FROM tfidf_changed_terms
+                                                                 WHERE token_type = :token_type)),
+                                                (SELECT COUNT(*)
+                                                 FROM tfidf_changed_pairs
+                                                 WHERE token_type = :token_type),
+                                                (SELECT COALESCE(SUM(df), 0)
+                                                 FROM string_tokens_df
+                                                 WHERE dataset_id = :dataset_id
+                                                 AND token_type = :token_type)
+                                         """
+            c.execute(sql_select_changedpairs, parameters)
+            changed_terms_pairs, changed_pairs_count, type_pairs = c.fetchone()
+            changed_pairs = changed_pairs + changed_terms_pairs + changed_pairs_count
+            total_pairs = total_pairs + type_pairs
+        if total_pairs == 0:
+            return 0
+        return changed_pairs/total_pairs
+
+    def _CreateTFIDFTable(self, c, dataset_id, token_type, document_count, changed_only):
+        #materializes the tf-idf of a token type from the persisted term counts into a temp table for _WriteTFIDF
+        #rows are kept in document order to match the order string_tokens is stored in
+        c.execute("DROP TABLE IF EXISTS temp."+token_type+"_tfidf")
+        sql_create_tfidf = """CREATE TEMP TABLE """+token_type+"""_tfidf (
+                                  document_id INTEGER,
+                                  term_id INTEGER,
+                                  tfidf FLOAT,
+                                  PRIMARY KEY(document_id, term_id)
+                              ) WITHOUT ROWID"""
+        c.execute(sql_create_tfidf)
+        sql_insert_tfidf = """INSERT OR IGNORE INTO """+token_type+"""_tfidf (document_id, term_id, tfidf)
+                              SELECT string_tokens_tf.document_id,
+                                     string_tokens_tf.term_id,
+                                     string_tokens_tf.tf * log(CAST(:document_count as REAL)/string_tokens_df.df)
+                              FROM string_tokens_tf
+                              JOIN string_tokens_df
+                              ON string_tokens_df.dataset_id = string_tokens_tf.dataset_id
+                              AND string_tokens_df.token_type = string_tokens_tf.token_type
+                              AND string_tokens_df.term_id = string_tokens_tf.term_id
+                              WHERE string_tokens_tf.dataset_id = :dataset_id
+                              AND string_tokens_tf.token_type = :token_type
+                              """
+        sql_order = """ORDER BY string_tokens_tf.document_id, string_tokens_tf.term_id
+                    """
+        parameters = {'dataset_id':dataset_id, 'token_type':token_type, 'document_count': document_count}
+        if not changed_only:
+            c.execute(sql_insert_tfidf+sql_order, parameters)
+        else:
+            sql_changed_terms = """AND string_tokens_tf.term_id IN (SELECT term_id
+                                                                 FROM tfidf_changed_terms
+                                                                 WHERE token_type = :token_type)
+                                   """
+            c.execute(sql_insert_tfidf+sql_changed_terms+sql_order, parameters)
+            sql_changed_pairs = """AND (string_tokens_tf.term_id, string_tokens_tf.document_id) IN (SELECT term_id, document_id
+                                                                                                FROM tfidf_changed_pairs
+                                                                                                WHERE token_type = :token_type)
+                                   """
+            c.execute(sql_insert_tfidf+sql_changed_pairs+sql_order, parameters)
+
+    def _WriteTFIDF(self, c, dataset_id, changed_only):
+        #writes the scores materialized by _CreateTFIDFTable back to string_tokens in one pass over the dataset's tokens
+        #when changed_only only tokens with a new score for one of the token types are rewritten
+        sql_update_tfidf = """UPDATE string_tokens
+                              SET text_tfidf = (SELECT tfidf
+                                                FROM text_tfidf
+                                                WHERE document_id = string_tokens.document_id
+                                                AND term_id = string_tokens.text_id),
+                                  stem_tfidf = (SELECT tfidf
+                                                FROM stem_tfidf
+                                                WHERE document_id = string_tokens.document_id
+                                                AND term_id = string_tokens.stem_id),
+                                  lemma_tfidf = (SELECT tfidf
+                                                 FROM lemma_tfidf
+                                                 WHERE document_id = string_tokens.document_id
+                                                 AND term_id = string_tokens.lemma_id)
+                              WHERE dataset_id = ?
+                              """
+        if not changed_only:
+            c.execute(sql_update_tfidf, (dataset_id,))
+        else:
+            #the ids of the tokens with a new score are read from the word indexes so only these tokens are visited
+            #CROSS JOIN keeps the new scores as the outer loop, sqlite would otherwise scan all of the dataset's tokens
+            c.execute("DROP TABLE IF EXISTS temp.tfidf_changed_tokens")
+            c.execute("CREATE TEMP TABLE tfidf_changed_tokens (id INTEGER PRIMARY KEY)")
+            for token_type in ['text', 'stem', 'lemma']:
+                sql_insert_changedtokens = """INSERT OR IGNORE INTO tfidf_changed_tokens (id)
+                                              SELECT string_tokens.id
+                                              FROM temp."""+token_type+"""_tfidf AS changed_tfidf
+                                              CROSS JOIN string_tokens
+                                              ON string_tokens.dataset_id = ?
+                                              AND string_tokens."""+token_type+"""_id = changed_tfidf.term_id
+                                              AND string_tokens.document_id = changed_tfidf.document_id
+                                              """
+                c.execute(sql_insert_changedtokens, (dataset_id,))
+
+            #the tf-idf counts are moved from each rewritten token's old scores to its new scores
+            counts_exist = self._TFIDFCountsExist(c, dataset_id)
+            if counts_exist:
+                old_counts = self._ChangedTokensTFIDFCounts(c)
+            sql_update_tfidf = """UPDATE string_tokens
+                                  SET text_tfidf = COALESCE((SELECT tfidf
+                                                             FROM text_tfidf
+                                                             WHERE document_id = string_tokens.document_id
+                                                             AND term_id = string_tokens.text_id), text_tfidf),
+                                      stem_tfidf = COALESCE((SELECT tfidf
+                                                             FROM stem_tfidf
+                                                             WHERE document_id = string_tokens.document_id
+                                                             AND term_id = string_tokens.stem_id), stem_tfidf),
+                                      lemma_tfidf = COALESCE((SELECT tfidf
+                                                              FROM lemma_tfidf
+                                                              WHERE document_id = string_tokens.document_id
+                                                              AND term_id = string_tokens.lemma_id), lemma_tfidf)
+                                  WHERE id IN (SELECT id
+                                               FROM tfidf_changed_tokens)
+                                  """
+            c.execute(sql_update_tfidf)
+            if counts_exist:
+                new_counts = self._ChangedTokensTFIDFCounts(c)
+                for token_type in ['text', 'stem', 'lemma']:
+                    new_counts[token_type].subtract(old_counts[token_type])
+                    self._ChangeTFIDFCounts(c, dataset_id, token_type, [count for count in new_counts[token_type].items() if count[1] != 0], 1)
+            c.execute("DROP TABLE temp.tfidf_changed_tokens")
+        for token_type in ['text', 'stem', 'lemma']:
+            c.execute("DROP TABLE temp."+token_type+"_tfidf")
+        if not changed_only:
+            self._BuildTFIDFCounts(c, dataset_id)
+
+    def _ChangedTokensTFIDFCounts(self, c):
+        #number of tokens with each tf-idf value for each token type among the tokens in tfidf_changed_tokens
+        #returns a dict of a Counter of token counts by tf-idf for each token type
+        counts = {'text': Counter(), 'stem': Counter(), 'lemma': Counter()}
+        sql_select_counts = """SELECT text_tfidf,
+                                      stem_tfidf,
+                                      lemma_tfidf,
+                                      COUNT(*)
+                               FROM string_tokens
+                               WHERE id IN (SELECT id
+                                            FROM tfidf_changed_tokens)
+                               GROUP BY text_tfidf,
+                                        stem_tfidf,
+                                        lemma_tfidf
+                               """
+        c.execute(sql_select_counts)
+        for text_tfidf, stem_tfidf, lemma_tfidf, token_count in c.fetchall():
+            counts['text'][text_tfidf] += token_count
+            counts['stem'][stem_tfidf] += token_count
+            counts['lemma'][lemma_tfidf] += token_count
+        return counts
 
-        #filter sql
-        word_sql = """CASE ?
-                      WHEN 'stem' THEN stem
-                      WHEN 'lemma' THEN lemma
-                      ELSE text
-                      END = ?
-                      """
-        pos_sql = """pos = ?
+    def _TFIDFCountsExist(self, c, dataset_id):
+        c.execute("SELECT 1 FROM string_tokens_tfidf_counts WHERE dataset_id = ? LIMIT 1", (dataset_id,))
+        return c.fetchone() != None
+
+    def _BuildTFIDFCounts(self, c, dataset_id):
+        c.execute("DELETE FROM string_tokens_tfidf_counts WHERE dataset_id = ?", (dataset_id,))
+        for token_type in ['text', 'stem', 'lemma']:
+            sql_insert_counts = """INSERT INTO string_tokens_tfidf_counts (dataset_id, token_type, tfidf, token_count)
+                                   SELECT :dataset_id,
+                                          :token_type,
+                                          """+token_type+"""_tfidf,
+                                          COUNT(*)
+                                   FROM string_tokens
+                                   WHERE dataset_id = :dataset_id
+                                   GROUP BY """+token_type+"""_tfidf
+                                   """
+            c.execute(sql_insert_counts, {'dataset_id': dataset_id, 'token_type': token_type})
+
+    def _ChangeTFIDFCounts(self, c, dataset_id, token_type, counts, direction):
+        #adds (direction 1) or subtracts (direction -1) (tfidf, token_count) pairs from the dataset's tf-idf counts
+        #values no token has anymore are removed so the counts stay the same as if they were rebuilt
+        parameters = [(direction*token_count, dataset_id, token_type, tfidf) for tfidf, token_count in counts]
+        sql_update_counts = """UPDATE string_tokens_tfidf_counts
+                               SET token_count = token_count + ?
+                               WHERE dataset_id = ?
+                               AND token_type = ?
+                               AND tfidf IS ?
+                               """
+        sql_insert_counts = """INSERT INTO string_tokens_tfidf_counts (token_count, dataset_id, token_type, tfidf)
+                               VALUES (?, ?, ?, ?)
+                               """
+        for parameter in parameters:
+            c.execute(sql_update_counts, parameter)
+            if c.rowcount == 0:
+                c.execute(sql_insert_counts, parameter)
+        sql_delete_counts = """DELETE FROM string_tokens_tfidf_counts
+                               WHERE dataset_id = ?
+                               AND token_type = ?
+                               AND tfidf IS ?
+                               AND token_count <= 0
+                               """
+        c.executemany(sql_delete_counts, [parameter[1:] for parameter in parameters])
+
+    def _TFIDFPercentRanks(self, dataset_id, word_column):
+        #same values as PERCENT_RANK() over the dataset's tokens ordered by tf-idf ascending (lower) and descending (upper)
+        #calculated from the counts of each distinct tf-idf value, sqlite orders NULL first when ascending and last when descending
+        #returns a list of (tfidf, lower_rank, upper_rank) in ascending tf-idf order
+        sql_select_counts = """SELECT tfidf,
+                                      token_count
+                               FROM string_tokens_tfidf_counts
+                               WHERE dataset_id = ?
+                               AND token_type = ?
+                               ORDER BY tfidf ASC
+                               """
+        counts = self.__conn.execute(sql_select_counts, (dataset_id, word_column,)).fetchall()
+        total_count = sum(token_count for tfidf, token_count in counts)
+        ranks = []
+        below_count = 0
+        for tfidf, token_count in counts:
+            if total_count > 1:
+                ranks.append((tfidf, below_count/(total_count-1), (total_count-below_count-token_count)/(total_count-1)))
+            else:
+                ranks.append((tfidf, 0, 0))
+            below_count = below_count + token_count
+        return ranks
+
+    def _DeleteStringTokensGroups(self, c, dataset_id):
+        #groups are rebuilt from string_tokens the next time they are needed
+        sql_delete_postings = """DELETE FROM string_tokens_postings
+                                 WHERE group_id IN (SELECT id
+                                                    FROM string_tokens_groups
+                                                    WHERE dataset_id = ?)
+                                 """
+        c.execute(sql_delete_postings, (dataset_id,))
+        c.execute("DELETE FROM string_tokens_groups WHERE dataset_id = ?", (dataset_id,))
+        self._DeleteStringTokensSummaries(c, dataset_id)
+
+    def _DeleteStringTokensSummaries(self, c, dataset_id):
+        #empty summaries are fully rebuilt the next time they are refreshed
+        c.execute("DELETE FROM string_tokens_included WHERE dataset_id = ?", (dataset_id,))
+        c.execute("DELETE FROM string_tokens_removed WHERE dataset_id = ?", (dataset_id,))
+        c.execute("DELETE FROM string_tokens_summary_changes WHERE dataset_id = ?", (dataset_id,))
+
+    def _StringTokensGroupsExist(self, c, dataset_id):
+        c.execute("SELECT 1 FROM string_tokens_groups WHERE dataset_id = ? LIMIT 1", (dataset_id,))
+        return c.fetchone() != None
+
+    def _BuildStringTokensGroups(self, c, dataset_id, token_type):
+        #a group's included is NULL when only some of its tokens are included (after tf-idf rules, which apply to individual tokens)
+        logger = logging.getLogger(__name__+"._BuildStringTokensGroups")
+        start_time = datetime.now()
+        word_column = token_type if token_type in ('stem', 'lemma') else 'text'
+        parameters = {'dataset_id': dataset_id}
+
+        #1) one pass over the dataset's tokens counting each group's words in each document
+        c.execute("DROP TABLE IF EXISTS temp.string_tokens_groups_documents")
+        sql_create_groupsdocuments = """CREATE TEMP TABLE string_tokens_groups_documents AS
+                                        SELECT field_id,
+                                               """+word_column+"""_id AS word_id,
+                                               pos_id,
+                                               spacy_stopword,
+                                               document_id,
+                                               COUNT(*) AS num_of_words,
+                                               MIN("""+word_column+"""_tfidf) AS tfidf_range_min,
+                                               MAX("""+word_column+"""_tfidf) AS tfidf_range_max,
+                                               MIN(included) AS included_min,
+                                               MAX(included) AS included_max
+                                        FROM string_tokens
+                                        WHERE dataset_id = :dataset_id
+                                        GROUP BY field_id,
+                                                 word_id,
+                                                 pos_id,
+                                                 spacy_stopword,
+                                                 document_id
+                                        """
+        c.execute(sql_create_groupsdocuments, parameters)
+
+        #2) the groups and their postings
+        sql_insert_groups = """INSERT INTO string_tokens_groups (dataset_id, field_id, word_id, pos_id, spacy_stopword, num_of_words, num_of_docs, tfidf_range_min, tfidf_range_max, included)
+                               SELECT :dataset_id,
+                                      field_id,
+                                      word_id,
+                                      pos_id,
+                                      spacy_stopword,
+                                      SUM(num_of_words),
+                                      COUNT(*),
+                                      MIN(tfidf_range_min),
+                                      MAX(tfidf_range_max),
+                                      CASE WHEN MIN(included_min) = MAX(included_max) THEN MIN(included_min) END
+                               FROM string_tokens_groups_documents
+                               GROUP BY field_id,
+                                        word_id,
+                                        pos_id,
+                                        spacy_stopword
+                               """
+        c.execute(sql_insert_groups, parameters)
+        sql_insert_postings = """INSERT INTO string_tokens_postings (group_id, document_id, num_of_words)
+                                 SELECT string_tokens_groups.id,
+                                        string_tokens_groups_documents.document_id,
+                                        string_tokens_groups_documents.num_of_words
+                                 FROM string_tokens_groups_documents
+                                 JOIN string_tokens_groups
+                                 ON string_tokens_groups.dataset_id = :dataset_id
+                                 AND string_tokens_groups.word_id IS string_tokens_groups_documents.word_id
+                                 AND string_tokens_groups.pos_id IS string_tokens_groups_documents.pos_id
+                                 AND string_tokens_groups.field_id IS string_tokens_groups_documents.field_id
+                                 AND string_tokens_groups.spacy_stopword IS string_tokens_groups_documents.spacy_stopword
+                                 """
+        c.execute(sql_insert_postings, parameters)
+        c.execute("DROP TABLE temp.string_tokens_groups_documents")
+        #summaries that existed before the groups can not be updated from them
+        self._DeleteStringTokensSummaries(c, dataset_id)
+        logger.info("Built token groups in %s", str(datetime.now() - start_time))
+
+    def _UpdateStringTokensGroupsIncluded(self, c, dataset_id, token_type):
+        #brings the groups' included in line with their tokens after rules were applied to individual tokens
+        word_column = token_type if token_type in ('stem', 'lemma') else 'text'
+        sql_update_groups = """UPDATE string_tokens_groups
+                               SET included = tokens_included.included
+                               FROM (SELECT field_id,
+                                            """+word_column+"""_id AS word_id,
+                                            pos_id,
+                                            spacy_stopword,
+                                            CASE WHEN MIN(included) = MAX(included) THEN MIN(included) END AS included
+                                     FROM string_tokens
+                                     WHERE dataset_id = :dataset_id
+                                     GROUP BY field_id,
+                                              word_id,
+                                              pos_id,
+                                              spacy_stopword
+                                    ) AS tokens_included
+                               WHERE string_tokens_groups.dataset_id = :dataset_id
+                               AND string_tokens_groups.word_id IS tokens_included.word_id
+                               AND string_tokens_groups.pos_id IS tokens_included.pos_id
+                               AND string_tokens_groups.field_id IS tokens_included.field_id
+                               AND string_tokens_groups.spacy_stopword IS tokens_included.spacy_stopword
+                               AND string_tokens_groups.included IS NOT tokens_included.included
+                               """
+        c.execute(sql_update_groups, {'dataset_id': dataset_id})
+
+    def _MixedStringTokensGroupsExist(self, c, dataset_id):
+        c.execute("SELECT 1 FROM string_tokens_groups WHERE dataset_id = ? AND included IS NULL LIMIT 1", (dataset_id,))
+        return c.fetchone() != None
+
+    def _RuleFilterSqlCreator(self, rule, token_type, table="string_tokens"):
+        #sql condition matching the tokens, or groups of tokens, a rule's field, word, pos and stopword settings apply to
+        field, word, pos, action = rule
+
+        #columns are qualified as count rules also select word and pos ids from a subquery
+        if table == "string_tokens_groups":
+            word_sql = table+""".word_id = (SELECT id
+                                           FROM vocabulary
+                                           WHERE term = ?)
+                          """
+        else:
+            word_sql = """CASE ?
+                          WHEN 'stem' THEN """+table+""".stem_id
+                          WHEN 'lemma' THEN """+table+""".lemma_id
+                          ELSE """+table+""".text_id
+                          END = (SELECT id
+                                 FROM vocabulary
+                                 WHERE term = ?)
+                          """
+        pos_sql = table+""".pos_id = (SELECT id
+                                      FROM vocabulary
+                                      WHERE term = ?)
                      """
-        field_sql = """field_id = (SELECT id
-                                   FROM fields
-                                   WHERE fields.dataset_id = dataset_id
-                                   AND field_key = ?)
+        field_sql = table+""".field_id = (SELECT id
+                                          FROM fields
+                                          WHERE fields.dataset_id = """+table+""".dataset_id
+                                          AND field_key = ?)
                        """
-        stopword_sql = """spacy_stopword = 1
+        stopword_sql = table+""".spacy_stopword = 1
                           """
 
+        sql_filter_list = []
+        sql_filter_parameters = []
+        if word != Constants.FILTER_RULE_ANY:
+            sql_filter_list.append(word_sql)
+            if table != "string_tokens_groups":
+                sql_filter_parameters.append(token_type)
+            sql_filter_parameters.append(word)
+        if pos != Constants.FILTER_RULE_ANY:
+            sql_filter_list.append(pos_sql)
+            sql_filter_parameters.append(pos)
+        if field != Constants.FILTER_RULE_ANY:
+            sql_filter_list.append(field_sql)
+            sql_filter_parameters.append(str(field))
+        if action == Constants.FILTER_RULE_REMOVE_SPACY_AUTO_STOPWORDS or  action == Constants.FILTER_RULE_INCLUDE_SPACY_AUTO_STOPWORDS :
+            sql_filter_list.append(stopword_sql)
+        return sql_filter_list, sql_filter_parameters
+
+    def _TFIDFRankSqlCreator(self, dataset_id, token_type, rank_type, percent):
+        #sql condition matching the tokens whose tf-idf is in the lower or upper percent of the dataset's tokens
+        #the percent ranks only increase or decrease with tf-idf so the condition is a comparison with the first value outside the percent
+        #sqlite orders NULL before all other values so tokens without a tf-idf have their own rank
+        word_column = token_type if token_type in ('stem', 'lemma') else 'text'
+        ranks = self._TFIDFPercentRanks(dataset_id, word_column)
+        if rank_type == Constants.FILTER_TFIDF_LOWER:
+            rank_idx = 1
+            comparison_sql = " < ?"
+        else:
+            #the upper ranks decrease with tf-idf so the cutoff is the largest value outside the percent
+            ranks.reverse()
+            rank_idx = 2
+            comparison_sql = " > ?"
+        cutoff = None
+        null_included = False
+        for rank in ranks:
+            if rank[0] is None:
+                null_included = rank[rank_idx] < percent
+            elif cutoff is None and rank[rank_idx] >= percent:
+                cutoff = rank[0]
+
+        if cutoff == None:
+            rank_sql = "string_tokens."+word_column+"_tfidf IS NOT NULL"
+            rank_parameters = []
+        else:
+            rank_sql = "string_tokens."+word_column+"_tfidf"+comparison_sql
+            rank_parameters = [cutoff]
+        if null_included:
+            rank_sql = "("+rank_sql+" OR string_tokens."+word_column+"_tfidf IS NULL)"
+        return rank_sql, rank_parameters
+
+    def _RulesCaseSqlCreator(self, case_rules, dataset_id, token_type, default_sql, table="string_tokens"):
+        #sql expression of the included value a token, or group of tokens, has after the rules that only depend on its own values
+        #CASE uses the first matching WHEN so the rules are listed from last to first
+        #returns None for the expression when none of the rules can be folded into the CASE
+        sql_when_list = []
+        sql_when_parameters = []
+        for rule in reversed(case_rules):
+            action = rule[3]
+            sql_filter_list, sql_filter_parameters = self._RuleFilterSqlCreator(rule, token_type, table)
+            if action == Constants.FILTER_RULE_REMOVE or action == Constants.FILTER_RULE_REMOVE_SPACY_AUTO_STOPWORDS:
+                included = 0
+            elif action == Constants.FILTER_RULE_INCLUDE or action == Constants.FILTER_RULE_INCLUDE_SPACY_AUTO_STOPWORDS:
+                included = 1
+            elif isinstance(action, tuple) and action[0] in (Constants.FILTER_TFIDF_REMOVE, Constants.FILTER_TFIDF_INCLUDE):
+                if action[0] == Constants.FILTER_TFIDF_REMOVE:
+                    included = 0
+                else:
+                    included = 1
+                if action[1] not in (Constants.FILTER_TFIDF_LOWER, Constants.FILTER_TFIDF_UPPER):
+                    continue
+                rank_sql, rank_parameters = self._TFIDFRankSqlCreator(dataset_id, token_type, action[1], action[2]/100)
+                sql_filter_list.append(rank_sql)
+                sql_filter_parameters = sql_filter_parameters + rank_parameters
+            else:
+                continue
+            if len(sql_filter_list) > 0:
+                sql_when_list.append("WHEN "+" AND ".join(sql_filter_list)+" THEN "+str(included))
+            else:
+                sql_when_list.append("WHEN 1 THEN "+str(included))
+            sql_when_parameters = sql_when_parameters + sql_filter_parameters
+
+        if len(sql_when_list) > 0:
+            sql_included = "CASE "+" ".join(sql_when_list)+" ELSE "+default_sql+" END"
+        else:
+            sql_included = None
+        return sql_included, sql_when_parameters
+
+    def _RulesSqlCreator(self, rules, dataset_id, token_type, reset, table="string_tokens"):
+        #compiles an ordered list of rules into as few UPDATE statements as possible
+        #rules that only depend on a token's own values (word, pos, field, stopword and tf-idf rank) are folded into one CASE
+        #that is evaluated once per token, where the last rule matching a token decides if it is included
+        #count rules depend on which tokens are currently included so they are applied by themselves between the folded statements
+        #table is either string_tokens or string_tokens_groups when none of the rules are tf-idf rules
+        #returns a list of (sql, parameters, rules) steps to execute in order
+        steps = []
+        case_rules = []
+        count_action = None
+        count_rules = []
+
+        def AddCaseStep():
+            nonlocal case_rules
+            if reset and len(steps) == 0:
+                default_sql = "1"
+            else:
+                default_sql = table+".included"
+            sql_included, sql_when_parameters = self._RulesCaseSqlCreator(case_rules, dataset_id, token_type, default_sql, table)
+            if sql_included is None and default_sql == "1":
+                sql_included = default_sql
+
+            if sql_included is not None:
+                #only tokens whose included value changes are rewritten
+                sql = """UPDATE """+table+"""
+                         SET included = rule_results.included
+                         FROM (SELECT """+table+""".id,
+                                      """+sql_included+""" AS included
+                               FROM """+table+"""
+                               WHERE """+table+""".dataset_id = ?
+                              ) AS rule_results
+                         WHERE rule_results.id = """+table+""".id
+                         AND rule_results.included IS NOT """+table+""".included
+                         """
+                sql_parameters = sql_when_parameters + [dataset_id]
+                steps.append((sql, sql_parameters, case_rules))
+            case_rules = []
+
+        def AddCountStep():
+            nonlocal count_action, count_rules
+            if table == "string_tokens_groups":
+                sql, sql_parameters = self._StringTokensGroupsRuleGroupSqlCreator(count_action, count_rules, dataset_id)
+            else:
+                sql, sql_parameters = self._RuleGroupSqlCreator(count_action, count_rules, dataset_id, token_type)
+            steps.append((sql, sql_parameters, count_rules))
+            count_action = None
+            count_rules = []
+
+        for rule in rules:
+            action = rule[3]
+            if isinstance(action, tuple) and action[0] in (Constants.FILTER_RULE_REMOVE, Constants.FILTER_RULE_INCLUDE):
+                if len(case_rules) > 0 or (reset and len(steps) == 0):
+                    AddCaseStep()
+                if len(count_rules) > 0 and action != count_action:
+                    AddCountStep()
+                count_action = action
+                count_rules.append(rule)
+            else:
+                if len(count_rules) > 0:
+                    AddCountStep()
+                case_rules.append(rule)
+        if len(count_rules) > 0:
+            AddCountStep()
+        if len(case_rules) > 0 or (reset and len(steps) == 0):
+            AddCaseStep()
+        return steps
+
+    def _RuleGroupSqlCreator(self, rule_action, rule_group, dataset_id, token_type):
+        #creates the sql for a group of consecutive count rules with the same action
+
         sql_type_filters_list = []
         sql_type_filters_parameters = []
-        for field, word, pos, action in rule_group:
-            sql_filter_list = []
-            if word != Constants.FILTER_RULE_ANY:
-                sql_filter_list.append(word_sql)
-                sql_type_filters_parameters.append(token_type)
-                sql_type_filters_parameters.append(word)
-            if pos != Constants.FILTER_RULE_ANY:
-                sql_filter_list.append(pos_sql)
-                sql_type_filters_parameters.append(pos)
-            if field != Constants.FILTER_RULE_ANY:
-                sql_filter_list.append(field_sql)
-                sql_type_filters_parameters.append(str(field))
-            if action == Constants.FILTER_RULE_REMOVE_SPACY_AUTO_STOPWORDS or  action == Constants.FILTER_RULE_INCLUDE_SPACY_AUTO_STOPWORDS :
-                sql_filter_list.append(stopword_sql)
-            sql_filter = " AND ".join(sql_filter_list)
-            sql_type_filters_list.append(sql_filter)
+        for rule in rule_group:
+            sql_filter_list, sql_filter_parameters = self._RuleFilterSqlCreator(rule, token_type)
+            if len(sql_filter_list) == 0:
+                #rule applies to every token so the group needs no filter
+                sql_type_filters_list = []
+                sql_type_filters_parameters = []
+                break
+            sql_type_filters_list.append(" AND ".join(sql_filter_list))
+            sql_type_filters_parameters = sql_type_filters_parameters + sql_filter_parameters
         sql_filters = " OR ".join(sql_type_filters_list)
 
-
-        update_sql = """UPDATE string_tokens
-                        SET included = ?
-                        WHERE dataset_id = ?
-                        AND included = ?
-                        """
-            
-
-        query_totalwordcount_sql = """SELECT COUNT(*),
+        query_totalwordcount_sql = """SELECT COUNT(*)
                                     FROM string_tokens
                                     WHERE dataset_id = ?
                                     """
@@ -630,70 +1707,35 @@ class DatabaseConnection():
                                     WHERE dataset_id = ?
                                     """
 
-        #special sql code user to figure out tfidf positions
-        update_tfidflowerper_sql = """UPDATE string_tokens
-                                      SET included = ?
-                                      FROM (SELECT id, 
-                                            PERCENT_RANK() OVER(ORDER BY CASE ?
-                                                                         WHEN 'stem' THEN stem_tfidf
-                                                                         WHEN 'lemma' THEN lemma_tfidf
-                                                                         ELSE text_tfidf
-                                                                         END ASC
-                                                               ) AS per_rank
-                                            FROM string_tokens
-                                            WHERE dataset_id = ?
-                                           ) AS ranktable
-                                      WHERE ranktable.id = string_tokens.id
-                                      AND included = ?
-                                      AND per_rank < ?
-                                      """
-        
-        update_tfidfupperper_sql = """UPDATE string_tokens
-                                      SET included = ?
-                                      FROM (SELECT id, 
-                                            PERCENT_RANK() OVER(ORDER BY CASE ?
-                                                                         WHEN 'stem' THEN stem_tfidf
-                                                                         WHEN 'lemma' THEN lemma_tfidf
-                                                                         ELSE text_tfidf
-                                                                         END DESC
-                                                               ) AS per_rank
-                                            FROM string_tokens
-                                            WHERE dataset_id = ?
-                                           ) AS ranktable
-                                        WHERE ranktable.id = string_tokens.id
-                                        AND included = ?
-                                        AND per_rank < ?
-                                        """
-
         #special code needed for number filters
         update_count_sql1 = """UPDATE string_tokens
                             SET included = ?
                             FROM (
                             """
         subquery_count_sql2 = """GROUP BY CASE ?
-                                        WHEN 'stem' THEN stem
-                                        WHEN 'lemma' THEN lemma
-                                        ELSE text
+                                        WHEN 'stem' THEN stem_id
+                                        WHEN 'lemma' THEN lemma_id
+                                        ELSE text_id
                                         END,
-                                        pos
+                                        pos_id
                                 """
         subquery_wordcount_sql1 = """SELECT CASE ?
-                                            WHEN 'stem' THEN stem
-                                            WHEN 'lemma' THEN lemma
-                                            ELSE text
-                                            END word,
-                                            pos,
+                                            WHEN 'stem' THEN stem_id
+                                            WHEN 'lemma' THEN lemma_id
+                                            ELSE text_id
+                                            END word_id,
+                                            pos_id,
                                             COUNT(*) AS count
                                     FROM string_tokens
                                     WHERE dataset_id = ?
                                     AND included = ?
                                     """
         subquery_doccount_sql1 = """SELECT CASE ?
-                                        WHEN 'stem' THEN stem
-                                        WHEN 'lemma' THEN lemma
-                                        ELSE text
-                                        END word,
-                                        pos,
+                                        WHEN 'stem' THEN stem_id
+                                        WHEN 'lemma' THEN lemma_id
+                                        ELSE text_id
+                                        END word_id,
+                                        pos_id,
                                         COUNT(DISTINCT document_id) AS count
                                     FROM string_tokens
                                     WHERE dataset_id = ?
@@ -702,12 +1744,12 @@ class DatabaseConnection():
         update_count_sql2 = """) AS counttable
                             WHERE dataset_id = ?
                             AND included = ?
-                            AND counttable.word = CASE ?
-                                                    WHEN 'stem' THEN stem
-                                                    WHEN 'lemma' THEN lemma
-                                                    ELSE text
+                            AND counttable.word_id = CASE ?
+                                                    WHEN 'stem' THEN stem_id
+                                                    WHEN 'lemma' THEN lemma_id
+                                                    ELSE text_id
                                                     END
-                            AND counttable.pos = string_tokens.pos
+                            AND counttable.pos_id = string_tokens.pos_id
                             AND counttable.count"""
 
         #number filter symbol
@@ -725,82 +1767,54 @@ class DatabaseConnection():
         #Action sql
         sql_action = ""
         sql_action_parameters = []
-        if rule_action == Constants.FILTER_RULE_REMOVE:
-            sql_action = update_sql
+        if rule_action[0] == Constants.FILTER_RULE_REMOVE:
             sql_action_parameters.append(0)
-            sql_action_parameters.append(dataset_id)
-            sql_action_parameters.append(1)
-        elif rule_action == Constants.FILTER_RULE_INCLUDE:
-            sql_action = update_sql
+            apply_to_included = 1
+        else:
             sql_action_parameters.append(1)
-            sql_action_parameters.append(dataset_id)
-            sql_action_parameters.append(0)
-        elif isinstance(rule_action, tuple):
-            if rule_action[0] == Constants.FILTER_TFIDF_REMOVE:
-                sql_action_parameters.append(0)
-                sql_action_parameters.append(token_type)
-                sql_action_parameters.append(dataset_id)
-                sql_action_parameters.append(1)
-                sql_action_parameters.append(rule_action[2]/100)
-                if rule_action[1] == Constants.FILTER_TFIDF_LOWER:
-                    sql_action = update_tfidflowerper_sql
-                elif rule_action[1] == Constants.FILTER_TFIDF_UPPER:
-                    sql_action = update_tfidfupperper_sql
-            elif rule_action[0] == Constants.FILTER_TFIDF_INCLUDE:
-                sql_action_parameters.append(1)
-                sql_action_parameters.append(token_type)
-                sql_action_parameters.append(dataset_id)
-                sql_action_parameters.append(0)
-                sql_action_parameters.append(rule_action[2]/100)
-                if rule_action[1] == Constants.FILTER_TFIDF_LOWER:
-                    sql_action = update_tfidflowerper_sql
-                elif rule_action[1] == Constants.FILTER_TFIDF_UPPER:
-                    sql_action = update_tfidfupperper_sql
-            elif rule_action[0] == Constants.FILTER_RULE_REMOVE or rule_action[0] == Constants.FILTER_RULE_INCLUDE:
-                if rule_action[0] == Constants.FILTER_RULE_REMOVE:
-                    sql_action_parameters.append(0)
-                    apply_to_included = 1
-                else:
-                    sql_action_parameters.append(1)
-                    apply_to_included = 0
-                sql_action_parameters.append(token_type)
-                sql_action_parameters.append(dataset_id)
-                sql_action_parameters.append(apply_to_included)
-                sql_action_parameters = sql_action_parameters + sql_type_filters_parameters
-                sql_action_parameters.append(token_type)
-                sql_action_parameters.append(dataset_id)
-                sql_action_parameters.append(apply_to_included)
-                sql_action_parameters.append(token_type)
-
-                if rule_action[1] == Constants.TOKEN_NUM_WORDS:
-                    sql_action = update_count_sql1+subquery_wordcount_sql1+sql_filters+subquery_count_sql2+update_count_sql2
-                    sql_action_parameters.append(rule_action[3])
-                elif rule_action[1] == Constants.TOKEN_PER_WORDS:
-                    sql_action = update_count_sql1+subquery_wordcount_sql1+sql_filters+subquery_count_sql2+update_count_sql2
-                    #TODO rework to not need seperate sql call
-                    c = self.__conn.execute(query_totalwordcount_sql, (dataset_id,))
-                    total_words = c.fetchone()[0]
-                    sql_action_parameters.append(rule_action[3]/100*total_words)
-                elif rule_action[1] == Constants.TOKEN_NUM_DOCS:
-                    sql_action = update_count_sql1+subquery_doccount_sql1+sql_filters+subquery_count_sql2+update_count_sql2
-                    sql_action_parameters.append(rule_action[3])
-                elif rule_action[1] == Constants.TOKEN_PER_DOCS:
-                    sql_action = update_count_sql1+subquery_doccount_sql1+sql_filters+subquery_count_sql2+update_count_sql2
-                    #TODO rework to not need seperate sql call
-                    c = self.__conn.execute(query_totaldoccount_sql, (dataset_id,))
-                    total_docs = c.fetchone()[0]
-                    sql_action_parameters.append(rule_action[3]/100*total_docs)
-
-                if rule_action[2] == ">":
-                    sql_action = sql_action + gt_sql
-                elif rule_action[2] == ">=":
-                    sql_action = sql_action + gteq_sql
-                elif rule_action[2] == "=":
-                    sql_action = sql_action + eq_sql
-                elif rule_action[2] == "<=":
-                    sql_action = sql_action + lteq_sql
-                elif rule_action[2] == "<":
-                    sql_action = sql_action + lt_sql
+            apply_to_included = 0
+        sql_action_parameters.append(token_type)
+        sql_action_parameters.append(dataset_id)
+        sql_action_parameters.append(apply_to_included)
+        if sql_filters != "":
+            sql_action_parameters = sql_action_parameters + sql_type_filters_parameters
+            subquery_filters_sql = "AND ("+sql_filters+")\n"
+        else:
+            subquery_filters_sql = ""
+        sql_action_parameters.append(token_type)
+        sql_action_parameters.append(dataset_id)
+        sql_action_parameters.append(apply_to_included)
+        sql_action_parameters.append(token_type)
+
+        if rule_action[1] == Constants.TOKEN_NUM_WORDS:
+            sql_action = update_count_sql1+subquery_wordcount_sql1+subquery_filters_sql+subquery_count_sql2+update_count_sql2
+            sql_action_parameters.append(rule_action[3])
+        elif rule_action[1] == Constants.TOKEN_PER_WORDS:
+            sql_action = update_count_sql1+subquery_wordcount_sql1+subquery_filters_sql+subquery_count_sql2+update_count_sql2
+            #TODO rework to not need seperate sql call
+            c = self.__conn.execute(query_totalwordcount_sql, (dataset_id,))
+            total_words = c.fetchone()[0]
+            sql_action_parameters.append(rule_action[3]/100*total_words)
+        elif rule_action[1] == Constants.TOKEN_NUM_DOCS:
+            sql_action = update_count_sql1+subquery_doccount_sql1+subquery_filters_sql+subquery_count_sql2+update_count_sql2
+            sql_action_parameters.append(rule_action[3])
+        elif rule_action[1] == Constants.TOKEN_PER_DOCS:
+            sql_action = update_count_sql1+subquery_doccount_sql1+subquery_filters_sql+subquery_count_sql2+update_count_sql2
+            #TODO rework to not need seperate sql call
+            c = self.__conn.execute(query_totaldoccount_sql, (dataset_id,))
+            total_docs = c.fetchone()[0]
+            sql_action_parameters.append(rule_action[3]/100*total_docs)
+
+        if rule_action[2] == ">":
+            sql_action = sql_action + gt_sql
+        elif rule_action[2] == ">=":
+            sql_action = sql_action + gteq_sql
+        elif rule_action[2] == "=":
+            sql_action = sql_action + eq_sql
+        elif rule_action[2] == "<=":
+            sql_action = sql_action + lteq_sql
+        elif rule_action[2] == "<":
+            sql_action = sql_action + lt_sql
 
         if sql_filters != "":
             sql = sql_action+" AND ("+sql_filters+")"
@@ -810,14 +1824,101 @@ class DatabaseConnection():
             sql_parameters = sql_action_parameters
         return sql, sql_parameters
 
+    def _StringTokensGroupsRuleGroupSqlCreator(self, rule_action, rule_group, dataset_id):
+        #same as _RuleGroupSqlCreator but counts and updates string_tokens_groups
+        sql_count, sql_count_parameters, sql_where, sql_where_parameters, new_included = self._StringTokensGroupsRuleGroupFilterSqlCreator(rule_action, rule_group, dataset_id)
+        sql = """UPDATE string_tokens_groups
+                 SET included = ?
+                 FROM ("""+sql_count+""") AS counttable
+                 WHERE """+sql_where
+        sql_parameters = [new_included] + sql_count_parameters + sql_where_parameters
+        return sql, sql_parameters
+
+    def _StringTokensGroupsRuleGroupFilterSqlCreator(self, rule_action, rule_group, dataset_id):
+        #sql of the counttable subquery and the condition matching the string_tokens_groups a group of count rules changes
+        #words are counted from the groups and documents from the postings of the groups that are being counted
+        #returns the subquery, its parameters, the condition, its parameters and the included value the matching groups are set to
+        sql_type_filters_list = []
+        sql_type_filters_parameters = []
+        for rule in rule_group:
+            sql_filter_list, sql_filter_parameters = self._RuleFilterSqlCreator(rule, None, "string_tokens_groups")
+            if len(sql_filter_list) == 0:
+                #rule applies to every group so the group needs no filter
+                sql_type_filters_list = []
+                sql_type_filters_parameters = []
+                break
+            sql_type_filters_list.append(" AND ".join(sql_filter_list))
+            sql_type_filters_parameters = sql_type_filters_parameters + sql_filter_parameters
+        if len(sql_type_filters_list) > 0:
+            sql_filters = "AND ("+" OR ".join(sql_type_filters_list)+")\n"
+        else:
+            sql_filters = ""
+
+        if rule_action[0] == Constants.FILTER_RULE_REMOVE:
+            new_included = 0
+            apply_to_included = 1
+        else:
+            new_included = 1
+            apply_to_included = 0
+
+        if rule_action[1] == Constants.TOKEN_NUM_WORDS or rule_action[1] == Constants.TOKEN_PER_WORDS:
+            subquery_count_sql = """SELECT word_id,
+                                           pos_id,
+                                           SUM(num_of_words) AS count
+                                    FROM string_tokens_groups
+                                    WHERE dataset_id = ?
+                                    AND included = ?
+                                    """+sql_filters+"""
+                                    GROUP BY word_id,
+                                             pos_id
+                                    """
+        else:
+            subquery_count_sql = """SELECT word_id,
+                                           pos_id,
+                                           COUNT(DISTINCT document_id) AS count
+                                    FROM string_tokens_groups
+                                    JOIN string_tokens_postings
+                                    ON string_tokens_postings.group_id = string_tokens_groups.id
+                                    WHERE dataset_id = ?
+                                    AND included = ?
+                                    """+sql_filters+"""
+                                    GROUP BY word_id,
+                                             pos_id
+                                    """
+
+        if rule_action[1] == Constants.TOKEN_PER_WORDS:
+            c = self.__conn.execute("SELECT SUM(num_of_words) FROM string_tokens_groups WHERE dataset_id = ?", (dataset_id,))
+            total_words = c.fetchone()[0] or 0
+            count_threshold = rule_action[3]/100*total_words
+        elif rule_action[1] == Constants.TOKEN_PER_DOCS:
+            sql_totaldoccount = """SELECT COUNT(DISTINCT document_id)
+                                   FROM string_tokens_groups
+                                   JOIN string_tokens_postings
+                                   ON string_tokens_postings.group_id = string_tokens_groups.id
+                                   WHERE dataset_id = ?
+                                   """
+            c = self.__conn.execute(sql_totaldoccount, (dataset_id,))
+            total_docs = c.fetchone()[0]
+            count_threshold = rule_action[3]/100*total_docs
+        else:
+            count_threshold = rule_action[3]
+
+        comparison_sql = {">": " > ?", ">=": " >= ?", "=": " = ?", "<=": " <= ?", "<": " < ?"}.get(rule_action[2], "")
+
+        sql_where = """string_tokens_groups.dataset_id = ?
+                       AND string_tokens_groups.included = ?
+                       AND counttable.word_id = string_tokens_groups.word_id
+                       AND counttable.pos_id = string_tokens_groups.pos_id
+                       AND counttable.count"""+comparison_sql+"""
+                       """+sql_filters
+        sql_count_parameters = [dataset_id, apply_to_included] + sql_type_filters_parameters
+        sql_where_parameters = [dataset_id, apply_to_included, count_threshold] + sql_type_filters_parameters
+        return subquery_count_sql, sql_count_parameters, sql_where, sql_where_parameters, new_included
+
     def ApplyAllDatasetRules(self, dataset_key, rules):
         logger = logging.getLogger(__name__+".ApplyAllDatasetRules")
         logger.info("Starting")
         try:
-            main_frame = wx.GetApp().GetTopWindow()
-            start_time = datetime.now()
-            remaining_loops = len(rules)
-            estimated_loop_time = timedelta()
             c = self.__conn.cursor()
             sql_select_dataset = """SELECT id, token_type
                                     FROM datasets 
@@ -827,67 +1928,9 @@ class DatabaseConnection():
             result = c.fetchone()
             dataset_id = result[0]
             token_type = result[1]
-            
-            update_sql = """UPDATE string_tokens
-                            SET included = ?
-                            WHERE dataset_id = ?
-                            """
-            #reset included to default for all strings
-            c.execute(update_sql, (1, dataset_id,))
-            self.__conn.commit()
-            logger.info("Completed Reseting all tokens to included.")
-
-            #apply rules in order
-            ##TODO explore if further concatination is possible (i.e. TFIDF removal with pos removal)
-            cur_rule_action = None
-            cur_rule_group = []
-            #field, word, pos, action
-            for rule in rules:
-                remaining_loops -= 1
-                if cur_rule_action == None:
-                    start_loop_time = datetime.now()
-                    cur_rule_action = rule[3]
-                next_rule_action = rule[3]
-                if next_rule_action == Constants.FILTER_RULE_REMOVE_SPACY_AUTO_STOPWORDS:
-                    next_rule_action = Constants.FILTER_RULE_REMOVE
-                elif next_rule_action == Constants.FILTER_RULE_INCLUDE_SPACY_AUTO_STOPWORDS:
-                    next_rule_action = Constants.FILTER_RULE_INCLUDE
-
-                if next_rule_action == cur_rule_action:
-                    cur_rule_group.append(rule)
-                else:
-                    sql, sql_parameters = self._RuleGroupSqlCreator(cur_rule_action, cur_rule_group, dataset_id, token_type)
-                    #execute the rule group
-                    c.execute(sql, sql_parameters)
-                    #commit after every rule to make sure operations are applied in correct order
-                    #TODO Assess if this is needed
-                    self.__conn.commit()
-                    new_estimated_loop_time = datetime.now() - start_loop_time
-                    if new_estimated_loop_time > estimated_loop_time:
-                        estimated_loop_time = new_estimated_loop_time
-                    elapsed_time = datetime.now() - start_time
-                    new_msg = GUITextFiltering.FILTERS_APPLYING_RULES_GROUP_MSG
-                    for cur_rule in cur_rule_group:
-                        new_msg += "\n-- "+str(cur_rule)
-                    wx.PostEvent(main_frame, CustomEvents.ProgressEvent({'estimated_time':elapsed_time + (estimated_loop_time * remaining_loops),
-                                                                         'msg':new_msg}))
-                    logger.info("Completed Applying Rule Group containing [%s] rules", str(len(cur_rule_group)))
-
-                    start_loop_time = datetime.now()
-                    cur_rule_action = next_rule_action
-                    cur_rule_group = [rule]
-            
-            if cur_rule_action != None:
-                sql, sql_parameters = self._RuleGroupSqlCreator(cur_rule_action, cur_rule_group, dataset_id, token_type)
-                #execute the rule group
-                c.execute(sql, sql_parameters)
-                self.__conn.commit()
-                new_msg = GUITextFiltering.FILTERS_APPLYING_RULES_GROUP_MSG
-                for cur_rule in cur_rule_group:
-                    new_msg += "\n-- "+str(cur_rule)
-                wx.PostEvent(main_frame, CustomEvents.ProgressEvent({'msg':new_msg}))
-                logger.info("Completed Applying Rule Group containing [%s] rules", str(len(cur_rule_group)))
 
+            #tokens are reset to included as part of the first step
+            self._ApplyRules(c, rules, dataset_id, token_type, True, logger)
             c.close()
         except sqlite3.Error as e:
             logger.exception("sql failed with error")
@@ -897,10 +1940,6 @@ class DatabaseConnection():
         logger = logging.getLogger(__name__+".ApplyNewDatasetRules")
         logger.info("Starting")
         try:
-            main_frame = wx.GetApp().GetTopWindow()
-            start_time = datetime.now()
-            remaining_loops = len(new_rules)
-            estimated_loop_time = timedelta()
             c = self.__conn.cursor()
             sql_select_dataset = """SELECT id, token_type
                                       FROM datasets 
@@ -911,60 +1950,221 @@ class DatabaseConnection():
             dataset_id = result[0]
             token_type = result[1]
 
-            #apply rules in order
-            ##TODO explore if further concatination is possible (i.e. TFIDF removal with pos removal)
-            cur_rule_action = None
-            cur_rule_group = []
-            #field, word, pos, action
-            for rule in new_rules:
-                if cur_rule_action == None:
-                    start_loop_time = datetime.now()
-                    cur_rule_action = rule[3]
-                next_rule_action = rule[3]
-                if next_rule_action == Constants.FILTER_RULE_REMOVE_SPACY_AUTO_STOPWORDS:
-                    next_rule_action = Constants.FILTER_RULE_REMOVE
-                if next_rule_action == Constants.FILTER_RULE_INCLUDE_SPACY_AUTO_STOPWORDS:
-                    next_rule_action = Constants.FILTER_RULE_INCLUDE
-
-                if next_rule_action == cur_rule_action:
-                    cur_rule_group.append(rule)
-                else:
-                    sql, sql_parameters = self._RuleGroupSqlCreator(cur_rule_action, cur_rule_group, dataset_id, token_type)
-                    #execute the rule group
-                    c.execute(sql, sql_parameters)
-                    #commit after every rule to make sure operations are applied in correct order
-                    #TODO Assess if this is needed
-                    self.__conn.commit()
-                    new_estimated_loop_time = datetime.now() - start_loop_time
-                    if new_estimated_loop_time > estimated_loop_time:
-                        estimated_loop_time = new_estimated_loop_time
-                    elapsed_time = datetime.now() - start_time
-                    new_msg = GUITextFiltering.FILTERS_APPLYING_RULES_GROUP_MSG
-                    for cur_rule in cur_rule_group:
-                        new_msg += "\n-- "+str(cur_rule)
-                    wx.PostEvent(main_frame, CustomEvents.ProgressEvent({'estimated_time':elapsed_time + (estimated_loop_time * remaining_loops),
-                                                                         'msg':new_msg}))
-                    logger.info("Completed Applying Rule Group containing [%s] rules", str(len(cur_rule_group)))
-
-                    start_loop_time = datetime.now()
-                    cur_rule_action = next_rule_action
-                    cur_rule_group = [rule]
-            
-            if cur_rule_action != None:
-                sql, sql_parameters = self._RuleGroupSqlCreator(cur_rule_action, cur_rule_group, dataset_id, token_type)
-                #execute the rule group
-                c.execute(sql, sql_parameters)
-                self.__conn.commit()
-                new_msg = GUITextFiltering.FILTERS_APPLYING_RULES_GROUP_MSG
-                for cur_rule in cur_rule_group:
-                    new_msg += "\n-- "+str(cur_rule)
-                wx.PostEvent(main_frame, CustomEvents.ProgressEvent({'msg':new_msg}))
-                logger.info("Completed Applying Rule Group containing [%s] rules", str(len(cur_rule_group)))
+            self._ApplyRules(c, new_rules, dataset_id, token_type, False, logger)
+            c.close()
+        except sqlite3.Error as e:
+            logger.exception("sql failed with error")
+        logger.info("Finished")
 
+    def EstimateNewDatasetRule(self, dataset_key, new_rule):
+        #counts the tokens, unique words (word and part-of-speech pairs) and documents a new rule would move between included and removed
+        #only reads from the database as it is called from the gui while worker threads may be writing
+        #returns a dict of the counts, or a dict with only 'unavailable' set to the reason when the rule can not be estimated
+        logger = logging.getLogger(__name__+".EstimateNewDatasetRule")
+        logger.info("Starting")
+        counts = {'unavailable': GUITextFiltering.FILTERS_CREATE_RULE_PREVIEW_FAILED}
+        try:
+            c = self.__conn.cursor()
+            sql_select_dataset = """SELECT id, token_type
+                                      FROM datasets
+                                      WHERE dataset_key = ?
+                                      """
+            c.execute(sql_select_dataset, (str(dataset_key),))
+            result = c.fetchone()
+            dataset_id = result[0]
+            token_type = result[1]
+            word_column = token_type if token_type in ('stem', 'lemma') else 'text'
+
+            action = rule_action = new_rule[3]
+            if isinstance(action, tuple):
+                rule_action = action[0]
+            if rule_action in (Constants.FILTER_RULE_REMOVE, Constants.FILTER_RULE_REMOVE_SPACY_AUTO_STOPWORDS, Constants.FILTER_TFIDF_REMOVE):
+                apply_to_included = 1
+            else:
+                apply_to_included = 0
+            is_tfidf_rule = rule_action in (Constants.FILTER_TFIDF_REMOVE, Constants.FILTER_TFIDF_INCLUDE)
+            is_count_rule = isinstance(action, tuple) and not is_tfidf_rule
+
+            #groups and tf-idf counts are built by the worker threads that apply rules, building them here would block the gui
+            sql_changed = None
+            if not self._StringTokensGroupsExist(c, dataset_id) or (is_tfidf_rule and not self._TFIDFCountsExist(c, dataset_id)):
+                counts = {'unavailable': GUITextFiltering.FILTERS_CREATE_RULE_PREVIEW_NOT_READY}
+            elif not is_tfidf_rule and not self._MixedStringTokensGroupsExist(c, dataset_id):
+                #the groups the rule would change are selected with the same conditions the rule is applied with
+                if is_count_rule:
+                    sql_count, sql_count_parameters, sql_where, sql_where_parameters, new_included = self._StringTokensGroupsRuleGroupFilterSqlCreator(action, [new_rule], dataset_id)
+                    sql_select_groups = """SELECT string_tokens_groups.id,
+                                                  string_tokens_groups.word_id,
+                                                  string_tokens_groups.pos_id
+                                           FROM string_tokens_groups
+                                           JOIN ("""+sql_count+""") AS counttable
+                                           WHERE """+sql_where
+                    sql_changed_parameters = sql_count_parameters + sql_where_parameters
+                else:
+                    sql_included, sql_changed_parameters = self._RulesCaseSqlCreator([new_rule], dataset_id, token_type, "string_tokens_groups.included", "string_tokens_groups")
+                    sql_select_groups = """SELECT string_tokens_groups.id,
+                                                  string_tokens_groups.word_id,
+                                                  string_tokens_groups.pos_id
+                                           FROM string_tokens_groups
+                                           WHERE string_tokens_groups.dataset_id = ?
+                                           AND """+sql_included+""" IS NOT string_tokens_groups.included
+                                           """
+                    sql_changed_parameters = [dataset_id] + sql_changed_parameters
+                sql_changed = """WITH changed_groups AS ("""+sql_select_groups+"""),
+                                      changed AS (SELECT changed_groups.word_id,
+                                                         changed_groups.pos_id,
+                                                         string_tokens_postings.document_id,
+                                                         string_tokens_postings.num_of_words
+                                                  FROM changed_groups
+                                                  JOIN string_tokens_postings
+                                                  ON string_tokens_postings.group_id = changed_groups.id)
+                                 """
+            elif not is_count_rule:
+                #tf-idf rules, or any rule while groups are only partly included, are counted from the tokens
+                sql_filter_list, sql_filter_parameters = self._RuleFilterSqlCreator(new_rule, token_type)
+                if is_tfidf_rule:
+                    rank_sql, rank_parameters = self._TFIDFRankSqlCreator(dataset_id, token_type, action[1], action[2]/100)
+                    sql_filter_list.append(rank_sql)
+                    sql_filter_parameters = sql_filter_parameters + rank_parameters
+                sql_changed = """WITH changed AS (SELECT """+word_column+"""_id AS word_id,
+                                                         pos_id,
+                                                         document_id,
+                                                         1 AS num_of_words
+                                                  FROM string_tokens
+                                                  WHERE dataset_id = ?
+                                                  AND included = ?
+                                                  """
+                for sql_filter in sql_filter_list:
+                    sql_changed = sql_changed+"AND "+sql_filter+"\n"
+                sql_changed = sql_changed+")\n"
+                sql_changed_parameters = [dataset_id, apply_to_included] + sql_filter_parameters
+            else:
+                counts = {'unavailable': GUITextFiltering.FILTERS_CREATE_RULE_PREVIEW_UNAVAILABLE}
+
+            if sql_changed != None:
+                #the filter list shows a row per word and part-of-speech so those pairs are what is counted as unique words
+                sql_count_changed = sql_changed+"""SELECT (SELECT COALESCE(SUM(num_of_words), 0)
+                                                           FROM changed),
+                                                          (SELECT COUNT(*)
+                                                           FROM (SELECT DISTINCT word_id, pos_id
+                                                                 FROM changed)),
+                                                          (SELECT COUNT(DISTINCT document_id)
+                                                           FROM changed)
+                                                   """
+                c.execute(sql_count_changed, sql_changed_parameters)
+                result = c.fetchone()
+                counts = {}
+                counts['tokens'] = result[0]
+                counts['unique_tokens'] = result[1]
+                counts['documents'] = result[2]
             c.close()
         except sqlite3.Error as e:
             logger.exception("sql failed with error")
         logger.info("Finished")
+        return counts
+
+    def _ApplyRules(self, c, rules, dataset_id, token_type, reset, logger):
+        #rules are applied to the dataset's token groups and then only the tokens of groups whose included changed are updated
+        #tf-idf rules apply to individual tokens so lists containing them, or lists applied after them while groups are still
+        #partly included, are applied to string_tokens directly and the groups' included is recalculated afterwards
+        #everything is done as a single transaction
+        start_time = datetime.now()
+        if not self._StringTokensGroupsExist(c, dataset_id):
+            self._BuildStringTokensGroups(c, dataset_id, token_type)
+        #tf-idf counts are also built for lists without tf-idf rules so EstimateNewDatasetRule can use them
+        if not self._TFIDFCountsExist(c, dataset_id):
+            self._BuildTFIDFCounts(c, dataset_id)
+
+        use_groups = True
+        for rule in rules:
+            action = rule[3]
+            if isinstance(action, tuple) and action[0] in (Constants.FILTER_TFIDF_REMOVE, Constants.FILTER_TFIDF_INCLUDE):
+                use_groups = False
+                break
+        if use_groups and not reset and self._MixedStringTokensGroupsExist(c, dataset_id):
+            use_groups = False
+
+        if use_groups:
+            c.execute("DROP TABLE IF EXISTS temp.string_tokens_groups_previous")
+            sql_create_previous = """CREATE TEMP TABLE string_tokens_groups_previous AS
+                                     SELECT id,
+                                            included
+                                     FROM string_tokens_groups
+                                     WHERE dataset_id = ?
+                                     """
+            c.execute(sql_create_previous, (dataset_id,))
+            steps = self._RulesSqlCreator(rules, dataset_id, token_type, reset, "string_tokens_groups")
+            self._ExecuteRuleSteps(c, steps, start_time, logger)
+
+            word_column = token_type if token_type in ('stem', 'lemma') else 'text'
+            sql_update_tokens = """UPDATE string_tokens
+                                   SET included = changed_groups.included
+                                   FROM (SELECT string_tokens_groups.field_id,
+                                                string_tokens_groups.word_id,
+                                                string_tokens_groups.pos_id,
+                                                string_tokens_groups.spacy_stopword,
+                                                string_tokens_groups.included
+                                         FROM string_tokens_groups
+                                         JOIN string_tokens_groups_previous
+                                         ON string_tokens_groups_previous.id = string_tokens_groups.id
+                                         WHERE string_tokens_groups.included IS NOT string_tokens_groups_previous.included
+                                        ) AS changed_groups
+                                   WHERE string_tokens.dataset_id = ?
+                                   AND string_tokens."""+word_column+"""_id = changed_groups.word_id
+                                   AND string_tokens.pos_id IS changed_groups.pos_id
+                                   AND string_tokens.field_id IS changed_groups.field_id
+                                   AND string_tokens.spacy_stopword IS changed_groups.spacy_stopword
+                                   AND string_tokens.included IS NOT changed_groups.included
+                                   """
+            c.execute(sql_update_tokens, (dataset_id,))
+            logger.info("Updated %s tokens of changed groups", str(c.rowcount))
+
+            #only the summary rows of the changed groups' words need to be refreshed
+            sql_insert_summarychanges = """INSERT INTO string_tokens_summary_changes (dataset_id, summary_table, word_id, pos_id)
+                                           SELECT DISTINCT :dataset_id,
+                                                  :summary_table,
+                                                  string_tokens_groups.word_id,
+                                                  string_tokens_groups.pos_id
+                                           FROM string_tokens_groups
+                                           JOIN string_tokens_groups_previous
+                                           ON string_tokens_groups_previous.id = string_tokens_groups.id
+                                           WHERE string_tokens_groups.included IS NOT string_tokens_groups_previous.included
+                                           """
+            for summary_table in ["string_tokens_included", "string_tokens_removed"]:
+                c.execute(sql_insert_summarychanges, {'dataset_id': dataset_id, 'summary_table': summary_table})
+            c.execute("DROP TABLE temp.string_tokens_groups_previous")
+        else:
+            steps = self._RulesSqlCreator(rules, dataset_id, token_type, reset)
+            self._ExecuteRuleSteps(c, steps, start_time, logger)
+            self._UpdateStringTokensGroupsIncluded(c, dataset_id, token_type)
+            #which words changed is not tracked for individual tokens so the summaries are rebuilt
+            self._DeleteStringTokensSummaries(c, dataset_id)
+
+        self.__conn.commit()
+        logger.info("Applied %s rules to %s in %s statements in %s using database profile[%s]", str(len(rules)), "token groups" if use_groups else "tokens", str(len(steps)), str(datetime.now() - start_time), connection_profile)
+
+    def _ExecuteRuleSteps(self, c, steps, start_time, logger):
+        #executes the steps created by _RulesSqlCreator in order
+        main_frame = None
+        if wx is not None and wx.GetApp() is not None:
+            main_frame = wx.GetApp().GetTopWindow()
+        remaining_loops = len(steps)
+        estimated_loop_time = timedelta()
+        for sql, sql_parameters, step_rules in steps:
+            remaining_loops -= 1
+            start_loop_time = datetime.now()
+            c.execute(sql, sql_parameters)
+            new_estimated_loop_time = datetime.now() - start_loop_time
+            if new_estimated_loop_time > estimated_loop_time:
+                estimated_loop_time = new_estimated_loop_time
+            elapsed_time = datetime.now() - start_time
+            new_msg = GUITextFiltering.FILTERS_APPLYING_RULES_GROUP_MSG
+            for cur_rule in step_rules:
+                new_msg += "\n-- "+str(cur_rule)
+            if main_frame is not None:
+                wx.PostEvent(main_frame, CustomEvents.ProgressEvent({'estimated_time':elapsed_time + (estimated_loop_time * remaining_loops),
+                                                                     'msg':new_msg}))
+            logger.info("Completed Applying Rule Group containing [%s] rules", str(len(step_rules)))
 
     def RefreshStringTokensIncluded(self, dataset_key):
         logger = logging.getLogger(__name__+".RefreshStringTokensIncluded")
@@ -979,8 +2179,8 @@ class DatabaseConnection():
             result = c.fetchone()
             dataset_id = result[0]
             token_type = result[1]
-            sql_truncate_stringtokensincluded = """DELETE FROM string_tokens_included WHERE dataset_id = ?"""
-            c.execute(sql_truncate_stringtokensincluded, (dataset_id,))
+            if not self._StringTokensGroupsExist(c, dataset_id):
+                self._BuildStringTokensGroups(c, dataset_id, token_type)
             sql_insert_stringtokensincluded = """INSERT INTO string_tokens_included (
                                                     dataset_id,
                                                     words,
@@ -988,41 +2188,58 @@ class DatabaseConnection():
                                                     num_of_words,
                                                     num_of_docs,
                                                     tfidf_range_min,
-                                                    tfidf_range_max,
-                                                    document_ids
+                                                    tfidf_range_max
                                                  )
                                                  SELECT
                                                     dataset_id,
-                                                    CASE :token_type
-                                                        WHEN 'stem' THEN stem
-                                                        WHEN 'lemma' THEN lemma
-                                                        ELSE text
-                                                        END AS words,
-                                                    pos,
-                                                    COUNT(CASE :token_type
-                                                            WHEN 'stem' THEN stem
-                                                            WHEN 'lemma' THEN lemma
-                                                            ELSE text
-                                                            END) AS num_of_words,
-                                                    COUNT(DISTINCT document_id) AS num_of_docs,
-                                                    CASE :token_type
-                                                        WHEN 'stem' THEN ROUND(MIN(stem_tfidf),4)
-                                                        WHEN 'lemma' THEN ROUND(MIN(lemma_tfidf),4)
-                                                        ELSE ROUND(MIN(text_tfidf),4)
-                                                        END AS tfidf_range_min,
-                                                    CASE :token_type
-                                                        WHEN 'stem' THEN ROUND(MAX(stem_tfidf),4)
-                                                        WHEN 'lemma' THEN ROUND(MAX(lemma_tfidf),4)
-                                                        ELSE ROUND(MAX(text_tfidf),4)
-                                                        END AS tfidf_range_max,
-                                                    GROUP_CONCAT(document_id) as document_ids
-                                                 FROM string_tokens
-                                                 WHERE dataset_id = :dataset_id
-                                                 AND included = 1
-                                                 GROUP BY dataset_id,
-                                                          words,
-                                                          pos"""
-            c.execute(sql_insert_stringtokensincluded, {'token_type': token_type, 'dataset_id': dataset_id})
+                                                    words_vocabulary.term AS words,
+                                                    pos_vocabulary.term AS pos,
+                                                    num_of_words,
+                                                    num_of_docs,
+                                                    tfidf_range_min,
+                                                    tfidf_range_max
+                                                 FROM (SELECT
+                                                        dataset_id,
+                                                        CASE :token_type
+                                                            WHEN 'stem' THEN stem_id
+                                                            WHEN 'lemma' THEN lemma_id
+                                                            ELSE text_id
+                                                            END AS words_id,
+                                                        pos_id,
+                                                        COUNT(CASE :token_type
+                                                                WHEN 'stem' THEN stem_id
+                                                                WHEN 'lemma' THEN lemma_id
+                                                                ELSE text_id
+                                                                END) AS num_of_words,
+                                                        COUNT(DISTINCT document_id) AS num_of_docs,
+                                                        CASE :token_type
+                                                            WHEN 'stem' THEN ROUND(MIN(stem_tfidf),4)
+                                                            WHEN 'lemma' THEN ROUND(MIN(lemma_tfidf),4)
+                                                            ELSE ROUND(MIN(text_tfidf),4)
+                                                            END AS tfidf_range_min,
+                                                        CASE :token_type
+                                                            WHEN 'stem' THEN ROUND(MAX(stem_tfidf),4)
+                                                            WHEN 'lemma' THEN ROUND(MAX(lemma_tfidf),4)
+                                                            ELSE ROUND(MAX(text_tfidf),4)
+                                                            END AS tfidf_range_max
+                                                       FROM string_tokens
+                                                       WHERE dataset_id = :dataset_id
+                                                       AND included = 1
+                                                       GROUP BY dataset_id,
+                                                                words_id,
+                                                                pos_id) AS string_tokens_grouped
+                                                 LEFT JOIN vocabulary AS words_vocabulary
+                                                 ON words_vocabulary.id = string_tokens_grouped.words_id
+                                                 LEFT JOIN vocabulary AS pos_vocabulary
+                                                 ON pos_vocabulary.id = string_tokens_grouped.pos_id"""
+            if self._MixedStringTokensGroupsExist(c, dataset_id):
+                #only some tokens of some groups are included so the groups' totals can not be used
+                sql_truncate_stringtokensincluded = """DELETE FROM string_tokens_included WHERE dataset_id = ?"""
+                c.execute(sql_truncate_stringtokensincluded, (dataset_id,))
+                c.execute(sql_insert_stringtokensincluded, {'token_type': token_type, 'dataset_id': dataset_id})
+            else:
+                self._RefreshStringTokensGroupsSummary(c, "string_tokens_included", dataset_id, 1)
+            c.execute("DELETE FROM string_tokens_summary_changes WHERE dataset_id = ? AND summary_table = ?", (dataset_id, "string_tokens_included",))
             self.__conn.commit()
             c.close()
         except sqlite3.Error as e:
@@ -1042,8 +2259,8 @@ class DatabaseConnection():
             result = c.fetchone()
             dataset_id = result[0]
             token_type = result[1]
-            sql_truncate_stringtokensremoved = """DELETE FROM string_tokens_removed WHERE dataset_id = ?"""
-            c.execute(sql_truncate_stringtokensremoved, (dataset_id,))
+            if not self._StringTokensGroupsExist(c, dataset_id):
+                self._BuildStringTokensGroups(c, dataset_id, token_type)
             sql_insert_stringtokensremoved = """INSERT INTO string_tokens_removed (
                                                     dataset_id,
                                                     words,
@@ -1051,47 +2268,146 @@ class DatabaseConnection():
                                                     num_of_words,
                                                     num_of_docs,
                                                     tfidf_range_min,
-                                                    tfidf_range_max,
-                                                    document_ids
+                                                    tfidf_range_max
                                                  )
                                                  SELECT
                                                     dataset_id,
-                                                    CASE :token_type
-                                                        WHEN 'stem' THEN stem
-                                                        WHEN 'lemma' THEN lemma
-                                                        ELSE text
-                                                        END AS words,
-                                                    pos,
-                                                    COUNT(CASE :token_type
-                                                            WHEN 'stem' THEN stem
-                                                            WHEN 'lemma' THEN lemma
-                                                            ELSE text
-                                                            END) AS num_of_words,
-                                                    COUNT(DISTINCT document_id) AS num_of_docs,
-                                                    CASE :token_type
-                                                        WHEN 'stem' THEN ROUND(MIN(stem_tfidf),4)
-                                                        WHEN 'lemma' THEN ROUND(MIN(lemma_tfidf),4)
-                                                        ELSE ROUND(MIN(text_tfidf),4)
-                                                        END AS tfidf_range_min,
-                                                    CASE :token_type
-                                                        WHEN 'stem' THEN ROUND(MAX(stem_tfidf),4)
-                                                        WHEN 'lemma' THEN ROUND(MAX(lemma_tfidf),4)
-                                                        ELSE ROUND(MAX(text_tfidf),4)
-                                                        END AS tfidf_range_max,
-                                                    GROUP_CONCAT(document_id) as document_ids
-                                                 FROM string_tokens
-                                                 WHERE dataset_id = :dataset_id
-                                                 AND included = 0
-                                                 GROUP BY dataset_id,
-                                                          words,
-                                                          pos"""
-            c.execute(sql_insert_stringtokensremoved, {'token_type': token_type, 'dataset_id': dataset_id})
+                                                    words_vocabulary.term AS words,
+                                                    pos_vocabulary.term AS pos,
+                                                    num_of_words,
+                                                    num_of_docs,
+                                                    tfidf_range_min,
+                                                    tfidf_range_max
+                                                 FROM (SELECT
+                                                        dataset_id,
+                                                        CASE :token_type
+                                                            WHEN 'stem' THEN stem_id
+                                                            WHEN 'lemma' THEN lemma_id
+                                                            ELSE text_id
+                                                            END AS words_id,
+                                                        pos_id,
+                                                        COUNT(CASE :token_type
+                                                                WHEN 'stem' THEN stem_id
+                                                                WHEN 'lemma' THEN lemma_id
+                                                                ELSE text_id
+                                                                END) AS num_of_words,
+                                                        COUNT(DISTINCT document_id) AS num_of_docs,
+                                                        CASE :token_type
+                                                            WHEN 'stem' THEN ROUND(MIN(stem_tfidf),4)
+                                                            WHEN 'lemma' THEN ROUND(MIN(lemma_tfidf),4)
+                                                            ELSE ROUND(MIN(text_tfidf),4)
+                                                            END AS tfidf_range_min,
+                                                        CASE :token_type
+                                                            WHEN 'stem' THEN ROUND(MAX(stem_tfidf),4)
+                                                            WHEN 'lemma' THEN ROUND(MAX(lemma_tfidf),4)
+                                                            ELSE ROUND(MAX(text_tfidf),4)
+                                                            END AS tfidf_range_max
+                                                       FROM string_tokens
+                                                       WHERE dataset_id = :dataset_id
+                                                       AND included = 0
+                                                       GROUP BY dataset_id,
+                                                                words_id,
+                                                                pos_id) AS string_tokens_grouped
+                                                 LEFT JOIN vocabulary AS words_vocabulary
+                                                 ON words_vocabulary.id = string_tokens_grouped.words_id
+                                                 LEFT JOIN vocabulary AS pos_vocabulary
+                                                 ON pos_vocabulary.id = string_tokens_grouped.pos_id"""
+            if self._MixedStringTokensGroupsExist(c, dataset_id):
+                #only some tokens of some groups are removed so the groups' totals can not be used
+                sql_truncate_stringtokensremoved = """DELETE FROM string_tokens_removed WHERE dataset_id = ?"""
+                c.execute(sql_truncate_stringtokensremoved, (dataset_id,))
+                c.execute(sql_insert_stringtokensremoved, {'token_type': token_type, 'dataset_id': dataset_id})
+            else:
+                self._RefreshStringTokensGroupsSummary(c, "string_tokens_removed", dataset_id, 0)
+            c.execute("DELETE FROM string_tokens_summary_changes WHERE dataset_id = ? AND summary_table = ?", (dataset_id, "string_tokens_removed",))
             self.__conn.commit()
             c.close()
         except sqlite3.Error as e:
             logger.exception("sql failed with error")
         logger.info("Finished")
 
+    def _RefreshStringTokensGroupsSummary(self, c, summary_table, dataset_id, included):
+        #an empty summary is built from all of the token groups, otherwise only the rows of words whose groups were moved by rules are replaced
+        c.execute("SELECT 1 FROM "+summary_table+" WHERE dataset_id = ? LIMIT 1", (dataset_id,))
+        if c.fetchone() == None:
+            self._InsertStringTokensGroupsSummary(c, summary_table, dataset_id, included, False)
+            return
+        #the rows are looked up from the changes through the summary's (dataset_id, words) index
+        #instead of checking every row of the dataset's summary against the changes
+        #the unary + keeps sqlite from using the (dataset_id, pos) index which only has a few distinct values
+        sql_delete_changed = """DELETE FROM """+summary_table+"""
+                                WHERE rowid IN (SELECT summary.rowid
+                                                FROM string_tokens_summary_changes
+                                                LEFT JOIN vocabulary AS words_vocabulary
+                                                ON words_vocabulary.id = string_tokens_summary_changes.word_id
+                                                LEFT JOIN vocabulary AS pos_vocabulary
+                                                ON pos_vocabulary.id = string_tokens_summary_changes.pos_id
+                                                CROSS JOIN """+summary_table+""" AS summary
+                                                ON summary.dataset_id = :dataset_id
+                                                AND summary.words IS words_vocabulary.term
+                                                AND +summary.pos IS pos_vocabulary.term
+                                                WHERE string_tokens_summary_changes.dataset_id = :dataset_id
+                                                AND string_tokens_summary_changes.summary_table = :summary_table)
+                                """
+        c.execute(sql_delete_changed, {'dataset_id': dataset_id, 'summary_table': summary_table})
+        deleted_count = c.rowcount
+        self._InsertStringTokensGroupsSummary(c, summary_table, dataset_id, included, True)
+        logging.getLogger(__name__+"._RefreshStringTokensGroupsSummary").info("Replaced %s rows of %s with %s rows", str(deleted_count), summary_table, str(c.rowcount))
+
+    def _InsertStringTokensGroupsSummary(self, c, summary_table, dataset_id, included, changed_only):
+        #fills string_tokens_included or string_tokens_removed from the token groups when every group is either included or removed
+        #changed_only limits the rows to the words listed in string_tokens_summary_changes
+        #the changed words' groups are looked up through the groups' index instead of checking every group against the changes
+        if changed_only:
+            sql_groups = """(SELECT DISTINCT word_id, pos_id
+                             FROM string_tokens_summary_changes
+                             WHERE dataset_id = :dataset_id
+                             AND summary_table = :summary_table) AS changed_words
+                            CROSS JOIN string_tokens_groups
+                            ON string_tokens_groups.dataset_id = :dataset_id
+                            AND string_tokens_groups.word_id IS changed_words.word_id
+                            AND string_tokens_groups.pos_id IS changed_words.pos_id
+                            """
+        else:
+            sql_groups = """string_tokens_groups
+                            """
+        sql_insert_summary = """INSERT INTO """+summary_table+""" (
+                                    dataset_id,
+                                    words,
+                                    pos,
+                                    num_of_words,
+                                    num_of_docs,
+                                    tfidf_range_min,
+                                    tfidf_range_max
+                                 )
+                                 SELECT
+                                    :dataset_id,
+                                    words_vocabulary.term AS words,
+                                    pos_vocabulary.term AS pos,
+                                    num_of_words,
+                                    num_of_docs,
+                                    tfidf_range_min,
+                                    tfidf_range_max
+                                 FROM (SELECT
+                                        string_tokens_groups.word_id,
+                                        string_tokens_groups.pos_id,
+                                        SUM(string_tokens_postings.num_of_words) AS num_of_words,
+                                        COUNT(DISTINCT document_id) AS num_of_docs,
+                                        ROUND(MIN(tfidf_range_min),4) AS tfidf_range_min,
+                                        ROUND(MAX(tfidf_range_max),4) AS tfidf_range_max
+                                       FROM """+sql_groups+"""
+                                       JOIN string_tokens_postings
+                                       ON string_tokens_postings.group_id = string_tokens_groups.id
+                                       WHERE string_tokens_groups.dataset_id = :dataset_id
+                                       AND included = :included
+                                       GROUP BY string_tokens_groups.word_id,
+                                                string_tokens_groups.pos_id) AS string_tokens_grouped
+                                 LEFT JOIN vocabulary AS words_vocabulary
+                                 ON words_vocabulary.id = string_tokens_grouped.word_id
+                                 LEFT JOIN vocabulary AS pos_vocabulary
+                                 ON pos_vocabulary.id = string_tokens_grouped.pos_id"""
+        c.execute(sql_insert_summary, {'dataset_id': dataset_id, 'included': included, 'summary_table': summary_table})
+
     def GetStringTokensCounts(self, dataset_key):
         logger = logging.getLogger(__name__+".GetStringTokensCounts")
         logger.info("Starting")
@@ -1109,9 +2425,9 @@ class DatabaseConnection():
 
             sql_tokencount_query = """SELECT COUNT(*),
                                              CASE :token_type
-                                                  WHEN 'stem' THEN COUNT(DISTINCT stem)
-                                                  WHEN 'lemma' THEN COUNT(DISTINCT lemma)
-                                                  ELSE COUNT(DISTINCT text)
+                                                  WHEN 'stem' THEN COUNT(DISTINCT stem_id)
+                                                  WHEN 'lemma' THEN COUNT(DISTINCT lemma_id)
+                                                  ELSE COUNT(DISTINCT text_id)
                                                   END,
                                              COUNT(DISTINCT document_id)   
                                       FROM string_tokens
@@ -1146,9 +2462,9 @@ class DatabaseConnection():
 
             sql_tokencount_query = """SELECT COUNT(*),
                                              CASE :token_type
-                                                  WHEN 'stem' THEN COUNT(DISTINCT stem)
-                                                  WHEN 'lemma' THEN COUNT(DISTINCT lemma)
-                                                  ELSE COUNT(DISTINCT text)
+                                                  WHEN 'stem' THEN COUNT(DISTINCT stem_id)
+                                                  WHEN 'lemma' THEN COUNT(DISTINCT lemma_id)
+                                                  ELSE COUNT(DISTINCT text_id)
                                                   END,
                                              COUNT(DISTINCT document_id)   
                                       FROM string_tokens
@@ -1167,67 +2483,85 @@ class DatabaseConnection():
         logger.info("Finished")
         return counts
 
-    def GetIncludedStringTokens(self, dataset_key, search_term, sort_col, sort_ascending):
+    def GetIncludedStringTokensRowCount(self, dataset_key, search_term):
+        logger = logging.getLogger(__name__+".GetIncludedStringTokensRowCount")
+        return self._GetStringTokensSummaryRowCount("string_tokens_included", dataset_key, search_term, logger)
+
+    def GetRemovedStringTokensRowCount(self, dataset_key, search_term):
+        logger = logging.getLogger(__name__+".GetRemovedStringTokensRowCount")
+        return self._GetStringTokensSummaryRowCount("string_tokens_removed", dataset_key, search_term, logger)
+
+    def GetIncludedStringTokens(self, dataset_key, search_term, sort_col, sort_ascending, limit=-1, offset=0, after_row=None):
         logger = logging.getLogger(__name__+".GetIncludedStringTokens")
-        #logger.info("Starting")
-        try:
-            c = self.__conn.cursor()
-            sql_select_datasetid = """SELECT id
-                                      FROM datasets 
-                                      WHERE dataset_key = ?
-                                      """
-            c.execute(sql_select_datasetid, (str(dataset_key),))
-            dataset_id = c.fetchone()[0]
+        return self._GetStringTokensSummaryRows("string_tokens_included", dataset_key, search_term, sort_col, sort_ascending, limit, offset, after_row, logger)
 
-            sql_select_includedrow1 = """SELECT words,
-                                                pos,
-                                                num_of_words,
-                                                num_of_docs,
-                                                tfidf_range_min,
-                                                tfidf_range_max,
-                                                document_ids
-                                         FROM string_tokens_included
-                                         WHERE dataset_id = ?
-                                         """
-            sql_select_includedrow2 = "ORDER BY "
+    def GetRemovedStringTokens(self, dataset_key, search_term, sort_col, sort_ascending, limit=-1, offset=0, after_row=None):
+        logger = logging.getLogger(__name__+".GetRemovedStringTokens")
+        return self._GetStringTokensSummaryRows("string_tokens_removed", dataset_key, search_term, sort_col, sort_ascending, limit, offset, after_row, logger)
 
-            sql = sql_select_includedrow1 
-            parameters = [dataset_id]
+    def _GetStringTokensSummaryRowCount(self, summary_table, dataset_key, search_term, logger):
+        count = 0
+        try:
+            c = self.__conn.cursor()
+            sql_select_count = """SELECT COUNT(*)
+                                  FROM """+summary_table+"""
+                                  WHERE dataset_id = (SELECT id
+                                                      FROM datasets
+                                                      WHERE dataset_key = ?)
+                                  """
+            parameters = [str(dataset_key)]
             if search_term != "":
-                sql = sql + "AND (words = ? OR pos = ?)"
-                parameters.append(search_term)
-                parameters.append(search_term)
-            sql = sql + sql_select_includedrow2
-            
-            if sort_col is GUITextFiltering.FILTERS_WORDS:
-                sql = sql + "words "
-            elif sort_col is GUITextFiltering.FILTERS_POS:
-                sql = sql + "pos "
-            elif sort_col is GUITextFiltering.FILTERS_NUM_WORDS:
-                sql = sql + "num_of_words "
-            elif sort_col is GUITextFiltering.FILTERS_NUM_DOCS:
-                sql = sql + "num_of_docs "
-            elif sort_col is GUITextFiltering.FILTERS_TFIDF_MAX:
-                sql = sql + "tfidf_range_max "
-            elif sort_col is GUITextFiltering.FILTERS_TFIDF_MIN:
-                sql = sql + "tfidf_range_min "
-            
-            if sort_ascending:
-                sql = sql + "ASC "
-            else:
-                sql = sql + "DESC "
-
-            c.execute(sql, parameters)
-            data = c.fetchall()
+                sql_search, search_parameters = self._StringTokensSearchSqlCreator(c, search_term)
+                sql_select_count = sql_select_count + sql_search
+                parameters = parameters + search_parameters
+            c.execute(sql_select_count, parameters)
+            count = c.fetchone()[0]
             c.close()
         except sqlite3.Error as e:
             logger.exception("sql failed with error")
-        #logger.info("Finished")
-        return data
+        return count
+
+    def _SearchLikePattern(self, search_term, substring, escaped=True):
+        #* and ? in a search match any number of characters and any single character like % and _ do
+        #searches without them match words containing (substring) or starting with the search
+        #escaped patterns match any %, _ and \ in the search literally and are used with ESCAPE '\'
+        #unescaped patterns leave % and _ as wildcards so they match at least the words the escaped pattern matches
+        if escaped:
+            pattern = search_term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        else:
+            pattern = search_term
+        pattern = pattern.replace('*', '%').replace('?', '_')
+        if '*' not in search_term and '?' not in search_term:
+            if substring:
+                pattern = '%'+pattern
+            pattern = pattern+'%'
+        return pattern
+
+    def _StringTokensSearchSqlCreator(self, c, search_term):
+        #sql condition matching summary rows whose part-of-speech is the search or whose word matches the search pattern
+        #words are matched using the vocabulary's trigram index when it exists
+        if self.__vocabulary_search_exists == None:
+            c.execute("SELECT 1 FROM sqlite_master WHERE name = 'vocabulary_search'")
+            self.__vocabulary_search_exists = c.fetchone() != None
+        pattern = self._SearchLikePattern(search_term, True)
+        if self.__vocabulary_search_exists:
+            #fts5 only uses the trigram index for LIKE without an ESCAPE clause
+            #so the index finds candidates with the unescaped pattern which are then checked with the escaped pattern
+            sql_search = """AND (pos = ? OR words IN (SELECT term
+                                                      FROM vocabulary_search
+                                                      WHERE term LIKE ?
+                                                      AND term LIKE ? ESCAPE '\\'))
+                            """
+            return sql_search, [search_term, self._SearchLikePattern(search_term, True, False), pattern]
+        sql_search = """AND (pos = ? OR words LIKE ? ESCAPE '\\')
+                        """
+        return sql_search, [search_term, pattern]
 
-    def GetRemovedStringTokens(self, dataset_key, search_term, sort_col, sort_ascending):
-        logger = logging.getLogger(__name__+".GetRemovedStringTokens")
-        #logger.info("Starting")
+    def _GetStringTokensSummaryRows(self, summary_table, dataset_key, search_term, sort_col, sort_ascending, limit, offset, after_row, logger):
+        #rows are (words, pos, num_of_words, num_of_docs, tfidf_range_min, tfidf_range_max, id) ordered by the sort column and then id
+        #limit rows are returned starting at offset, or directly after after_row (the last row of the previous page)
+        #which uses the summary table's index on the sort column instead of stepping over every row before offset
+        data = []
         try:
             c = self.__conn.cursor()
             sql_select_datasetid = """SELECT id
@@ -1237,92 +2571,240 @@ class DatabaseConnection():
             c.execute(sql_select_datasetid, (str(dataset_key),))
             dataset_id = c.fetchone()[0]
 
-            sql_select_removedrow1 = """SELECT words,
-                                               pos,
-                                               num_of_words,
-                                               num_of_docs,
-                                               tfidf_range_min,
-                                               tfidf_range_max,
-                                               document_ids
-                                        FROM string_tokens_removed
-                                        WHERE dataset_id = ?
-                                        """
-            sql_select_removedrow2 = "ORDER BY "
-
-            sql = sql_select_removedrow1 
+            sql = """SELECT words,
+                            pos,
+                            num_of_words,
+                            num_of_docs,
+                            tfidf_range_min,
+                            tfidf_range_max,
+                            id
+                     FROM """+summary_table+"""
+                     WHERE dataset_id = ?
+                     """
             parameters = [dataset_id]
             if search_term != "":
-                sql = sql + "AND (words = ? OR pos = ?)"
-                parameters.append(search_term)
-                parameters.append(search_term)
-            sql = sql + sql_select_removedrow2
-            
-            if sort_col is GUITextFiltering.FILTERS_WORDS:
-                sql = sql + "words "
-            elif sort_col is GUITextFiltering.FILTERS_POS:
-                sql = sql + "pos "
-            elif sort_col is GUITextFiltering.FILTERS_NUM_WORDS:
-                sql = sql + "num_of_words "
-            elif sort_col is GUITextFiltering.FILTERS_NUM_DOCS:
-                sql = sql + "num_of_docs "
-            elif sort_col is GUITextFiltering.FILTERS_TFIDF_MIN:
-                sql = sql + "tfidf_range_min "
-            elif sort_col is GUITextFiltering.FILTERS_TFIDF_MAX:
-                sql = sql + "tfidf_range_max "
-
+                sql_search, search_parameters = self._StringTokensSearchSqlCreator(c, search_term)
+                sql = sql + sql_search
+                parameters = parameters + search_parameters
+
+            sort_columns = {GUITextFiltering.FILTERS_WORDS: (0, "words"),
+                            GUITextFiltering.FILTERS_POS: (1, "pos"),
+                            GUITextFiltering.FILTERS_NUM_WORDS: (2, "num_of_words"),
+                            GUITextFiltering.FILTERS_NUM_DOCS: (3, "num_of_docs"),
+                            GUITextFiltering.FILTERS_TFIDF_MIN: (4, "tfidf_range_min"),
+                            GUITextFiltering.FILTERS_TFIDF_MAX: (5, "tfidf_range_max")}
+            sort_idx, sort_sql = sort_columns.get(sort_col, (2, "num_of_words"))
             if sort_ascending:
-                sql = sql + "ASC "
+                direction_sql = "ASC"
             else:
-                sql = sql + "DESC "
-
-            c.execute(sql, parameters)
-            data = c.fetchall()
+                direction_sql = "DESC"
 
+            sql_order = "ORDER BY "+sort_sql+" "+direction_sql+", id "+direction_sql+"\n"
+            if search_term != "":
+                #searches list exact matches first, then words starting with the search and then any other matches
+                sql_order = """ORDER BY CASE
+                                        WHEN words = ? OR pos = ? THEN 0
+                                        WHEN words LIKE ? ESCAPE '\\' THEN 1
+                                        ELSE 2
+                                        END,
+                               """+sql_order[len("ORDER BY "):]
+                parameters = parameters + [search_term, search_term, self._SearchLikePattern(search_term, False)]
+                #pages of ranked searches are not in the sort column's order so the offset is used
+                after_row = None
+            #NULL can not be compared against so pages after a NULL sort value fall back to using the offset
+            if after_row != None and after_row[sort_idx] != None:
+                if sort_ascending:
+                    sql_after = "AND ("+sort_sql+", id) > (?, ?)\n"
+                else:
+                    sql_after = "AND ("+sort_sql+", id) < (?, ?)\n"
+                c.execute(sql+sql_after+sql_order+"LIMIT ?", parameters+[after_row[sort_idx], after_row[6], limit])
+                data = c.fetchall()
+                if not sort_ascending and len(data) < limit:
+                    #NULL sorts before all values so descending pages end with any rows without a value
+                    sql_null = "AND "+sort_sql+" IS NULL\n"
+                    c.execute(sql+sql_null+sql_order+"LIMIT ?", parameters+[limit-len(data)])
+                    data = data + c.fetchall()
+            else:
+                c.execute(sql+sql_order+"LIMIT ? OFFSET ?", parameters+[limit, offset])
+                data = c.fetchall()
             c.close()
         except sqlite3.Error as e:
             logger.exception("sql failed with error")
-        #logger.info("Finished")
         return data
 
-    def GetDocumentsTokensFromStringTokens(self, dataset_key):
-        logger = logging.getLogger(__name__+".GetDocumentsTokensFromStringTokens")
+    def GetStringTokensDocumentSample(self, dataset_key, word, pos, included, sample_size):
+        #random sample of the ids of documents containing a word that is included or removed
+        #sampled from the word's postings through their index so the full list of documents is never read
+        logger = logging.getLogger(__name__+".GetStringTokensDocumentSample")
         logger.info("Starting")
-        tokens_dict = {}
+        document_ids = []
         try:
             c = self.__conn.cursor()
-            sql_select_datasetid = """SELECT id, token_type
-                                      FROM datasets 
-                                      WHERE dataset_key = ?
-                                      """
-            c.execute(sql_select_datasetid, (str(dataset_key),))
+            sql_select_dataset = """SELECT id, token_type
+                                    FROM datasets
+                                    WHERE dataset_key = ?
+                                    """
+            c.execute(sql_select_dataset, (str(dataset_key),))
+            dataset_id, token_type = c.fetchone()
+            c.execute("SELECT id FROM vocabulary WHERE term = ?", (word,))
             result = c.fetchone()
-            dataset_id = result[0]
-            token_type = result[1]
+            word_id = result[0] if result is not None else None
+            c.execute("SELECT id FROM vocabulary WHERE term = ?", (pos,))
+            result = c.fetchone()
+            pos_id = result[0] if result is not None else None
+            #groups are not built here as this is called from the gui, workspaces upgraded from before groups existed have none until rules are applied
+            if not self._StringTokensGroupsExist(c, dataset_id) or self._MixedStringTokensGroupsExist(c, dataset_id):
+                #without groups, or when only some tokens of some groups are included, the documents are sampled from the tokens
+                word_column = token_type if token_type in ('stem', 'lemma') else 'text'
+                sql_select_documents = """SELECT DISTINCT document_id
+                                          FROM string_tokens
+                                          WHERE dataset_id = :dataset_id
+                                          AND """+word_column+"""_id = :word_id
+                                          AND pos_id IS :pos_id
+                                          AND included = :included
+                                          """
+                sources = [{'dataset_id': dataset_id, 'word_id': word_id, 'pos_id': pos_id, 'included': 1 if included else 0}]
+            else:
+                #each of the word's groups, one for each field and stopword value, has its own postings
+                sql_select_documents = """SELECT document_id
+                                          FROM string_tokens_postings
+                                          WHERE group_id = :group_id
+                                          """
+                sql_select_groups = """SELECT id
+                                       FROM string_tokens_groups
+                                       WHERE dataset_id = ?
+                                       AND word_id = ?
+                                       AND pos_id IS ?
+                                       AND included = ?
+                                       """
+                c.execute(sql_select_groups, (dataset_id, word_id, pos_id, 1 if included else 0))
+                sources = [{'group_id': row[0]} for row in c.fetchall()]
+            document_ids = self._SampleDocumentIds(c, sql_select_documents, sources, sample_size)
+            c.close()
+        except sqlite3.Error as e:
+            logger.exception("sql failed with error")
+        logger.info("Finished")
+        return document_ids
+
+    def _SampleDocumentIds(self, c, sql_select_documents, sources, sample_size):
+        #random sample of the distinct document ids selected by sql_select_documents for each source's parameters
+        #sources with more documents than the sample are sampled by seeking their index to the first document at or after a random id
+        #so that only about as many rows as the sample are read instead of every document containing the word
+        #documents that follow gaps in the ids are more likely to be drawn, a dataset's documents mostly have consecutive ids
+        document_ids = set()
+        id_ranges = []
+        all_read = True
+        for parameters in sources:
+            c.execute(sql_select_documents+"ORDER BY document_id LIMIT :limit", dict(parameters, limit=sample_size+1))
+            source_document_ids = [row[0] for row in c.fetchall()]
+            if len(source_document_ids) == 0:
+                continue
+            if len(source_document_ids) <= sample_size:
+                document_ids.update(source_document_ids)
+                max_id = source_document_ids[-1]
+            else:
+                all_read = False
+                c.execute(sql_select_documents+"ORDER BY document_id DESC LIMIT 1", parameters)
+                max_id = c.fetchone()[0]
+            id_ranges.append((parameters, source_document_ids[0], max_id))
+        if all_read:
+            document_ids = list(document_ids)
+            random.shuffle(document_ids)
+            return document_ids[:sample_size]
+
+        #each draw takes the first document at or after the random id that was not drawn yet, wrapping around to the source's first document
+        #a source with more documents than the sample always has one within the next as many documents as were drawn
+        document_ids = set()
+        sampled_document_ids = []
+        weights = [max_id-min_id+1 for parameters, min_id, max_id in id_ranges]
+        sql_select_next = sql_select_documents+"AND document_id >= :start_id ORDER BY document_id LIMIT :limit"
+        while len(sampled_document_ids) < sample_size:
+            parameters, min_id, max_id = random.choices(id_ranges, weights=weights)[0]
+            for start_id in [random.randint(min_id, max_id), min_id]:
+                c.execute(sql_select_next, dict(parameters, start_id=start_id, limit=len(sampled_document_ids)+1))
+                new_document_ids = [row[0] for row in c.fetchall() if row[0] not in document_ids]
+                if len(new_document_ids) > 0:
+                    document_ids.add(new_document_ids[0])
+                    sampled_document_ids.append(new_document_ids[0])
+                    break
+        return sampled_document_ids
+
+    def GetStringTokensVocabulary(self, dataset_key):
+        #terms of the vocabulary ids that IterDocumentsTokensFromStringTokens yields for the dataset's included tokens
+        logger = logging.getLogger(__name__+".GetStringTokensVocabulary")
+        logger.info("Starting")
+        vocabulary = {}
+        try:
+            c = self.__conn.cursor()
+            sql_select_dataset = """SELECT id, token_type
+                                    FROM datasets
+                                    WHERE dataset_key = ?
+                                    """
+            c.execute(sql_select_dataset, (str(dataset_key),))
+            dataset_id, token_type = c.fetchone()
+            word_column = token_type if token_type in ('stem', 'lemma') else 'text'
+            sql_select_vocabulary = """SELECT id, term
+                                       FROM vocabulary
+                                       WHERE id IN (SELECT DISTINCT """+word_column+"""_id
+                                                    FROM string_tokens
+                                                    WHERE dataset_id = ?
+                                                    AND included = 1)
+                                       """
+            c.execute(sql_select_vocabulary, (dataset_id,))
+            for row in c:
+                vocabulary[row[0]] = row[1]
+            c.close()
+        except sqlite3.Error as e:
+            logger.exception("sql failed with error")
+        logger.info("Finished")
+        return vocabulary
 
-            sql_select_documenttokens = """SELECT document_key,
-                                                 GROUP_CONCAT(word, " ") 
-                                           FROM (SELECT document_key,
-                                                        CASE :token_type
-                                                        WHEN 'stem' THEN stem
-                                                        WHEN 'lemma' THEN lemma
-                                                        ELSE text
-                                                        END as word
-                                                 FROM string_tokens
-                                                 LEFT JOIN  documents ON
-                                                    string_tokens.document_id = documents.id
-                                                 WHERE string_tokens.dataset_id = :dataset_id
-                                                 AND string_tokens.included = 1
-                                                 ORDER BY string_tokens.document_id ASC,
-                                                          string_tokens.field_id ASC,
-                                                          string_tokens.position ASC)
-                                           GROUP BY document_key
+    def IterDocumentsTokensFromStringTokens(self, dataset_key):
+        #generator of (document_key, [vocabulary ids]) for the dataset's included tokens in document order
+        #rows are read from the cursor as sqlite produces them so only one document's tokens are held at a time
+        logger = logging.getLogger(__name__+".IterDocumentsTokensFromStringTokens")
+        logger.info("Starting")
+        try:
+            c = self.__conn.cursor()
+            sql_select_dataset = """SELECT id, token_type
+                                    FROM datasets
+                                    WHERE dataset_key = ?
+                                    """
+            c.execute(sql_select_dataset, (str(dataset_key),))
+            dataset_id, token_type = c.fetchone()
+            word_column = token_type if token_type in ('stem', 'lemma') else 'text'
+            #documents are read in id order and each document's tokens are found through the document_id index
+            #so sqlite only sorts one document's tokens at a time instead of all of the dataset's tokens before returning the first row
+            #the unary + keeps sqlite from reading the documents through the (dataset_id, key) index which is not in id order
+            sql_select_documenttokens = """SELECT documents.id,
+                                                  key_source,
+                                                  key_type,
+                                                  key_id,
+                                                  """+word_column+"""_id
+                                           FROM documents
+                                           CROSS JOIN string_tokens ON
+                                              string_tokens.document_id = documents.id
+                                           WHERE +documents.dataset_id = :dataset_id
+                                           AND string_tokens.dataset_id = :dataset_id
+                                           AND string_tokens.included = 1
+                                           ORDER BY documents.id ASC,
+                                                    string_tokens.field_id ASC,
+                                                    string_tokens.position ASC
                                            """
-            tokens_dict = {}
-            c.execute(sql_select_documenttokens, {'dataset_id':dataset_id, 'token_type':token_type})
-            for row in c.fetchall():
-                tokens_dict[eval(row[0])] = row[1].split()
+            c.execute(sql_select_documenttokens, {'dataset_id': dataset_id})
+            document_id = None
+            tokens = []
+            for row in c:
+                if row[0] != document_id:
+                    if document_id is not None:
+                        yield document_key, tokens
+                    document_id = row[0]
+                    document_key = (row[1], row[2], row[3])
+                    tokens = []
+                tokens.append(row[4])
+            if document_id is not None:
+                yield document_key, tokens
             c.close()
         except sqlite3.Error as e:
             logger.exception("sql failed with error")
         logger.info("Finished")
-        return tokens_dict
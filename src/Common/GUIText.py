@@ -314,6 +314,14 @@ class Main(Common):
     MULTIPROCESSING_LABEL = "Multiprocessing Options"
     MAXIMUM_POOL_SIZE_LABEL = "Maximum Pool Size"
 
+    DATABASE_LABEL = "Database Options"
+    DATABASE_PROFILE_LABEL = "Performance Profile"
+    DATABASE_PROFILE_TOOLTIP = "Controls how the workspace's database trades safety against a crash for speed."\
+                               "\nChanges apply to operations started after the change."
+    DATABASE_PROFILES = {'standard': "Standard",
+                         'performance': "Large Cache (WAL)",
+                         'safe': "Crash Resistant"}
+
 class Datasets(Common):
     #common
     DESCRIPTION = "Description"
@@ -774,6 +782,7 @@ class Filtering(Main, Datasets):
     FILTERS_REMOVE_SPACY_AUTO_STOPWORDS_TOOLTIP = "Add a Remove spaCy Auto Stopwords Rule"
 
     FILTERS_WORD_SEARCH = "Word Search"
+    FILTERS_WORD_SEARCH_TOOLTIP = "Finds words containing the search or parts-of-speech matching it. * matches any characters and ? matches a single character."
     FILTERS_POS_SEARCH = "Part of Speach Search"
 
     FILTERS_CREATE_RULE_FIELD = "Field"
@@ -795,6 +804,16 @@ class Filtering(Main, Datasets):
     FILTERS_CREATE_RULE_INVALID_ACTION_ERROR = "Please make sure action has been selected."
     FILTERS_CREATE_RULE_INVALID_ADVANCED_ERROR = "Please make sure a valid advanced choice has been selected."
     FILTERS_CREATE_COUNT_RULE_INCOMPLETE_ADVANCED_ERROR = "Please make sure advanced fields are selected and/or filled out."
+    FILTERS_CREATE_RULE_PREVIEW = "Preview"
+    FILTERS_CREATE_RULE_PREVIEW_TOOLTIP = "Show how many tokens, words and documents the rule would change without creating it"
+    FILTERS_CREATE_RULE_PREVIEW_REMOVE = "Would remove "
+    FILTERS_CREATE_RULE_PREVIEW_INCLUDE = "Would include "
+    FILTERS_CREATE_RULE_PREVIEW_TOKENS = " tokens of "
+    FILTERS_CREATE_RULE_PREVIEW_WORDS = " unique words from "
+    FILTERS_CREATE_RULE_PREVIEW_DOCUMENTS = " documents"
+    FILTERS_CREATE_RULE_PREVIEW_UNAVAILABLE = "Preview is not available for count rules after tf-idf rules have been applied."
+    FILTERS_CREATE_RULE_PREVIEW_NOT_READY = "Preview will be available once the dataset's rules have been applied."
+    FILTERS_CREATE_RULE_PREVIEW_FAILED = "Preview failed. Please check the log for details."
     FILTERS_CREATE_COUNT_RULE = "Create Count Rule"
     FILTERS_CREATE_COUNT_RULE_TOOLTIP = "Create a new count rule using either the # of words or the # of documents"
     FILTERS_CREATE_COUNT_RULE_COLUMN_TOOLTIP = "Choose a numeric column"
@@ -71,7 +71,7 @@ class DatasetsViewModel(dv.PyDataViewModel):
             mapper = { 0 : node.name,
                        1 : node.dataset_source,
                        2 : dataset_type,
-                       3 : len(node.data),
+                       3 : node.data_count,
                        4 : node.created_dt.strftime("%Y-%m-%d, %H:%M:%S")
                        }
             return mapper[col]
@@ -199,7 +199,7 @@ class DatasetsDataGridTable(wx.grid.GridTableBase):
     def __init__(self, dataset):
         wx.grid.GridTableBase.__init__(self)
         self.dataset = dataset
-        self.data_df = pd.DataFrame(self.dataset.data.values())
+        self.data_df = self.CreateDataFrame()
         self.label_column_names = []
         self.label_col_types = []
         self.data_column_names = []
@@ -225,6 +225,12 @@ class DatasetsDataGridTable(wx.grid.GridTableBase):
         self._rows = len(self.data_df)
         self._cols = 1+len(self.label_column_names)+len(self.data_column_names)
 
+    def CreateDataFrame(self):
+        #built column by column from the dataset's columnar data instead of from a dict per document
+        data = self.dataset.data
+        return pd.DataFrame({field_name: data.ColumnValues(field_name, float('nan')) for field_name in data.ColumnNames()},
+                            columns=data.ColumnNames())
+
     def GetColNames(self):
         self.label_column_names = []
         self.label_col_types = []
@@ -398,7 +404,7 @@ class DatasetsDataGridTable(wx.grid.GridTableBase):
             doc_id = (row_data['data_source'], row_data['data_type'], row_data['id'])
             doc = self.dataset.GetDocument(doc_id)
             if doc.key not in self.dataset.selected_documents:
-                self.dataset.selected_documents.append(doc.key)
+                self.dataset.selected_documents.add(doc.key)
                 self.dataset.last_changed_dt = datetime.now()
             else:
                 self.dataset.selected_documents.remove(doc.key)
@@ -572,7 +578,7 @@ class DatasetsDataGrid(wx.grid.Grid):
                     self.SetColSize(col_num, int(split_size))
 
     def Search(self, value):
-        self.gridtable.data_df = pd.DataFrame(self.gridtable.dataset.data.values())
+        self.gridtable.data_df = self.gridtable.CreateDataFrame()
         if not hasattr(self.dataset, 'label_fields'):
             self.data_df['created_utc']= pd.to_datetime(self.gridtable.data_df['created_utc'], unit='s', utc=True).dt.strftime(Constants.DATETIME_FORMAT)
         else:
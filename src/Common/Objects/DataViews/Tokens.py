@@ -1,4 +1,5 @@
 import logging
+from collections import OrderedDict
 from datetime import datetime
 import webbrowser
 
@@ -24,6 +25,8 @@ class TokenListCtrl(wx.ListCtrl):
         self.search_term = ""
         self.sort_col = GUIText.FILTERS_NUM_WORDS
         self.sort_ascending = False
+        #rows are read from the database a page at a time as they are displayed and the most recently used pages are kept
+        self.pages = OrderedDict()
         
         self.col_names = [GUIText.FILTERS_WORDS,
                           GUIText.FILTERS_POS,
@@ -64,13 +67,14 @@ class TokenListCtrl(wx.ListCtrl):
             self.search_term = search_term
         
         main_frame = wx.GetApp().GetTopWindow()
-        db_conn = Database.DatabaseConnection(main_frame.current_workspace.name)
+        db_conn = Database.GetPooledConnection(main_frame.current_workspace.name)
         if self.word_type == "Included":
-            self.data = db_conn.GetIncludedStringTokens(self.dataset.key, self.search_term, self.sort_col, self.sort_ascending)
+            item_count = db_conn.GetIncludedStringTokensRowCount(self.dataset.key, self.search_term)
         else:
-            self.data = db_conn.GetRemovedStringTokens(self.dataset.key, self.search_term, self.sort_col, self.sort_ascending)
+            item_count = db_conn.GetRemovedStringTokensRowCount(self.dataset.key, self.search_term)
         del db_conn
-        self.SetItemCount(len(self.data))
+        self.pages.clear()
+        self.SetItemCount(item_count)
 
         self.SetColumnWidth(0, wx.LIST_AUTOSIZE)
         self.SetColumnWidth(1, wx.LIST_AUTOSIZE_USEHEADER)
@@ -81,8 +85,34 @@ class TokenListCtrl(wx.ListCtrl):
 
         self.Refresh()
 
+    def GetRow(self, item):
+        page_num = item // Constants.FILTERS_LIST_PAGE_SIZE
+        if page_num in self.pages:
+            self.pages.move_to_end(page_num)
+        else:
+            self.LoadPage(page_num)
+        return self.pages[page_num][item % Constants.FILTERS_LIST_PAGE_SIZE]
+
+    def LoadPage(self, page_num):
+        #a page directly after a cached page continues from that page's last row instead of counting rows from the start
+        after_row = None
+        if page_num-1 in self.pages and len(self.pages[page_num-1]) > 0:
+            after_row = self.pages[page_num-1][-1]
+        main_frame = wx.GetApp().GetTopWindow()
+        db_conn = Database.GetPooledConnection(main_frame.current_workspace.name)
+        if self.word_type == "Included":
+            rows = db_conn.GetIncludedStringTokens(self.dataset.key, self.search_term, self.sort_col, self.sort_ascending,
+                                                   Constants.FILTERS_LIST_PAGE_SIZE, page_num*Constants.FILTERS_LIST_PAGE_SIZE, after_row)
+        else:
+            rows = db_conn.GetRemovedStringTokens(self.dataset.key, self.search_term, self.sort_col, self.sort_ascending,
+                                                  Constants.FILTERS_LIST_PAGE_SIZE, page_num*Constants.FILTERS_LIST_PAGE_SIZE, after_row)
+        del db_conn
+        self.pages[page_num] = rows
+        while len(self.pages) > Constants.FILTERS_LIST_CACHED_PAGES:
+            self.pages.popitem(last=False)
+
     def OnGetItemText(self, item, col):
-        row_data = self.data[item]
+        row_data = self.GetRow(item)
         if self.col_names[col] == GUIText.FILTERS_NUM_WORDS:
             return str(row_data[col]) +" (" +str(round((row_data[col]/self.dataset.total_tokens)*100, 4))+"%)"
         elif self.col_names[col] == GUIText.FILTERS_NUM_DOCS:
@@ -96,13 +126,14 @@ class TokenListCtrl(wx.ListCtrl):
         selected_items = []
         row = self.GetFirstSelected()
         while row != -1:
+            row_data = self.GetRow(row)
             line = ''
-            line += str(self.data[row][0]) + '\t'
-            line += str(self.data[row][1]) + '\t'
-            line += str(self.data[row][2]) + '\t'
-            line += str(self.data[row][3]) + '\t'
-            line += str(self.data[row][4]) + '\t'
-            line += str(self.data[row][5]) + '\n'
+            line += str(row_data[0]) + '\t'
+            line += str(row_data[1]) + '\t'
+            line += str(row_data[2]) + '\t'
+            line += str(row_data[3]) + '\t'
+            line += str(row_data[4]) + '\t'
+            line += str(row_data[5]) + '\n'
             selected_items.append(line.strip())
             row = self.GetNextSelected(row)
         clipdata = wx.TextDataObject()
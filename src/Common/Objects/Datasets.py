@@ -1,8 +1,12 @@
 import logging
+import pickle
+import threading
+from array import array
+from collections.abc import Mapping
 from datetime import datetime
 
 import Common.Constants as Constants
-from Common.Objects.Generic import GenericObject
+from Common.Objects.Generic import GenericObject, OrderedSet
 import Common.Objects.Samples as Samples
 
 #Object classes to facilitate controlling datasets
@@ -15,7 +19,8 @@ class Dataset(GenericObject):
         self._dataset_source = dataset_source
         self._dataset_type = dataset_type
         self._retrieval_details = retrieval_details
-        self._data = {}
+        self._data = DatasetData()
+        self._data_count = 0
         self._language = language
         self._tokenization_choice = 2
         self._tokenization_package_versions = None
@@ -40,12 +45,46 @@ class Dataset(GenericObject):
         self.available_fields = {}
         self.label_fields = {}
         self.computational_fields = {}
-        self.selected_documents = []
+        self.selected_documents = OrderedSet()
         self.documents = {}
 
+        #index of the key of each document in documents by its doc_id so GetDocument does not scan every document
+        #not pickled and instead rebuilt when loaded, see __getstate__ and __setstate__
+        self.documents_index = {}
+
+        #file data was last saved to by SaveData, data is left out of the dataset's own pickle while that file
+        #holds it and is only read back from the file when data is first accessed, see LoadData
+        self.data_filename = None
+        self._data_lock = threading.Lock()
+
     def __repr__(self):
         return 'Dataset[%s][%s]' % (self.name, self.key,)
 
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['documents_index'] = None
+        state['_data_lock'] = None
+        if self.data_filename is not None:
+            state['_data'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._data_lock = threading.Lock()
+        if 'data_filename' not in state:
+            self.data_filename = None
+        #workspaces saved before selections were OrderedSets stored them as lists
+        if not isinstance(self.selected_documents, OrderedSet):
+            self.selected_documents = OrderedSet(self.selected_documents)
+        #workspaces saved before data was stored by column stored it as a dict of each document's fields
+        if self._data is not None and not isinstance(self._data, DatasetData):
+            self._data = DatasetData(self._data)
+        if '_data_count' not in state:
+            self._data_count = len(self._data) if self._data is not None else 0
+        #the index is rebuilt by GetDocument when first needed as documents of workspaces saved before 0.8.5
+        #only have a doc_id once they have been upgraded after loading
+        self.documents_index = {}
+
     @property
     def dataset_source(self):
         return self._dataset_source
@@ -72,12 +111,29 @@ class Dataset(GenericObject):
     
     @property
     def data(self):
+        if self._data is None:
+            self.LoadData()
         return self._data
     @data.setter
     def data(self, value):
-        self._data = value
+        if not isinstance(value, DatasetData):
+            value = DatasetData(value)
+        with self._data_lock:
+            self._data = value
+            self._data_count = len(value)
+            #the new data has not been saved yet
+            self.data_filename = None
         self.last_changed_dt = datetime.now()
 
+    #number of documents in data, available without loading data
+    @property
+    def data_count(self):
+        return self._data_count
+
+    @property
+    def data_loaded(self):
+        return self._data is not None
+
     @property
     def language(self):
         return self._language
@@ -195,20 +251,185 @@ class Dataset(GenericObject):
         self.filter_rules.append(new_rule)
         self._last_changed_dt = datetime.now()
 
+    def LoadData(self):
+        logger = logging.getLogger(__name__+"."+repr(self)+".LoadData")
+        #the lock makes a thread that needs data while it is being prefetched wait for the prefetch to finish
+        with self._data_lock:
+            if self._data is None:
+                logger.info("Starting")
+                if self.data_filename is not None:
+                    with open(self.data_filename, 'rb') as infile:
+                        self._data = pickle.load(infile)
+                else:
+                    logger.warning("No data file for dataset")
+                    self._data = DatasetData()
+                logger.info("Finished")
+
+    def SaveData(self, data_filename):
+        with self._data_lock:
+            with open(data_filename, 'wb') as outfile:
+                pickle.dump(self._data, outfile)
+            self.data_filename = data_filename
+
+    def RebuildDocumentsIndex(self):
+        self.documents_index = {}
+        for document_key in self.documents:
+            self.documents_index[self.documents[document_key].doc_id] = document_key
+
     def GetDocument(self, doc_id):
-        if doc_id in self._data:
-            new_doc = None
-            for doc in self.documents.values():
-                if doc.doc_id == doc_id:
-                    new_doc = doc
-                    break
-            if new_doc == None:
-                new_doc = Document(self, doc_id)
-                self.documents[new_doc.key] = new_doc
-            return self.documents[new_doc.key]
+        #documents that already exist are found through the index alone so data is not loaded for them
+        #the index is rebuilt if documents were added, removed or rekeyed without going through GetDocument
+        document_key = self.documents_index.get(doc_id)
+        if document_key is not None:
+            if document_key not in self.documents or self.documents[document_key].doc_id != doc_id:
+                self.RebuildDocumentsIndex()
+                document_key = self.documents_index.get(doc_id)
+        elif len(self.documents_index) != len(self.documents):
+            self.RebuildDocumentsIndex()
+            document_key = self.documents_index.get(doc_id)
+        if document_key is not None:
+            return self.documents[document_key]
+        #data is only needed to check a new document's doc_id exists and to read its url
+        if doc_id in self.data:
+            new_doc = Document(self, doc_id)
+            self.documents[new_doc.key] = new_doc
+            self.documents_index[doc_id] = new_doc.key
+            return new_doc
         else:
             return None
 
+#marks the rows of a DatasetData column for documents that do not have that field
+class _MissingValue(object):
+    def __reduce__(self):
+        return '_MISSING_VALUE'
+_MISSING_VALUE = _MissingValue()
+
+class _StringColumn(object):
+    '''column of strings that are mostly repeated, such as authors, subreddits and sources,
+    stored as a table of its distinct values and the code of each row's value in that table'''
+    __slots__ = ('values', 'codes')
+    def __init__(self, column):
+        code_of_values = {}
+        self.values = []
+        self.codes = array('I')
+        for value in column:
+            code = code_of_values.get(value)
+            if code is None:
+                code = len(self.values)
+                code_of_values[value] = code
+                self.values.append(value)
+            self.codes.append(code)
+
+    def __getitem__(self, row):
+        return self.values[self.codes[row]]
+
+    def __iter__(self):
+        values = self.values
+        return (values[code] for code in self.codes)
+
+    def __len__(self):
+        return len(self.codes)
+
+class DatasetData(Mapping):
+    '''the retrieved fields of a dataset's documents stored as one column per field instead of a dict per document.
+    behaves as a read only dict of doc_id to a dict like DatasetDataRow of the document's fields.
+    columns that only hold integers or only hold floats are stored as arrays, columns of mostly repeated strings
+    are stored as codes into a table of their distinct strings and other repeated strings share a single string object'''
+    def __init__(self, data=None):
+        #row of each document by doc_id and doc_id of each row
+        self._index = {}
+        self._doc_ids = []
+        self._columns = {}
+        if data is not None:
+            strings = {}
+            def Intern(value):
+                if isinstance(value, str):
+                    return strings.setdefault(value, value)
+                elif isinstance(value, list):
+                    return [strings.setdefault(entry, entry) if isinstance(entry, str) else entry for entry in value]
+                return value
+            for doc_id in data:
+                row = len(self._doc_ids)
+                self._index[doc_id] = row
+                self._doc_ids.append(doc_id)
+                for field_name, value in data[doc_id].items():
+                    if field_name not in self._columns:
+                        self._columns[field_name] = [_MISSING_VALUE]*row
+                    self._columns[field_name].append(Intern(value))
+                for field_name in self._columns:
+                    if len(self._columns[field_name]) == row:
+                        self._columns[field_name].append(_MISSING_VALUE)
+            for field_name in self._columns:
+                self._columns[field_name] = self._CompactColumn(self._columns[field_name])
+
+    def _CompactColumn(self, column):
+        value_types = set(type(value) for value in column)
+        try:
+            if value_types == {int}:
+                return array('q', column)
+            elif value_types == {float}:
+                return array('d', column)
+        except OverflowError:
+            pass
+        #a code takes 4 bytes instead of a list's 8 byte reference, columns of mostly unique strings such as texts stay lists
+        if str in value_types and value_types <= {str, _MissingValue} and len(set(column)) <= len(column)//2:
+            return _StringColumn(column)
+        return column
+
+    def __repr__(self):
+        return 'DatasetData[%s documents][%s fields]' % (len(self._doc_ids), len(self._columns),)
+
+    def __getitem__(self, doc_id):
+        return DatasetDataRow(self, self._index[doc_id])
+
+    def __contains__(self, doc_id):
+        return doc_id in self._index
+
+    def __iter__(self):
+        return iter(self._doc_ids)
+
+    def __len__(self):
+        return len(self._doc_ids)
+
+    def ColumnNames(self):
+        return list(self._columns.keys())
+
+    def ColumnValues(self, field_name, missing_value=None):
+        #values of a field in row order with missing_value for documents that do not have the field
+        column = self._columns[field_name]
+        if isinstance(column, array):
+            return column.tolist()
+        return [missing_value if value is _MISSING_VALUE else value for value in column]
+
+    def GetValue(self, row, field_name):
+        #raises KeyError if the document in the row does not have the field
+        value = self._columns[field_name][row]
+        if value is _MISSING_VALUE:
+            raise KeyError(field_name)
+        return value
+
+    def GetFieldNames(self, row):
+        return [field_name for field_name in self._columns if self._columns[field_name][row] is not _MISSING_VALUE]
+
+class DatasetDataRow(Mapping):
+    '''read only dict like view of one document's fields in a DatasetData'''
+    __slots__ = ('_data', '_row')
+    def __init__(self, data, row):
+        self._data = data
+        self._row = row
+
+    def __repr__(self):
+        return 'DatasetDataRow[%s]' % (dict(self),)
+
+    def __getitem__(self, field_name):
+        return self._data.GetValue(self._row, field_name)
+
+    def __iter__(self):
+        return iter(self._data.GetFieldNames(self._row))
+
+    def __len__(self):
+        return len(self._data.GetFieldNames(self._row))
+
 class Field(GenericObject):
     '''instances of Fields.'''
     def __init__(self, parent, name, dataset, desc, fieldtype):
@@ -331,6 +552,8 @@ class Document(GenericObject):
             if self.key in self.parent.documents:
                 if self.parent.documents[self.key] == self:
                     del self.parent.documents[self.key]
+                    if self.parent.documents_index.get(self.doc_id) == self.key:
+                        del self.parent.documents_index[self.doc_id]
             self.parent.last_changed_dt = datetime.now()
             self.parent = None
 
@@ -48,7 +48,7 @@ class DataNotebook(FNB.FlatNotebook):
                 self.dataset_data_tabs[key].Update()
             else:
                 if isinstance(main_frame.datasets[key], Datasets.Dataset):
-                    if len(main_frame.datasets[key].data) > 0:
+                    if main_frame.datasets[key].data_count > 0:
                         self.dataset_data_tabs[key] = DatasetDataPanel(self, main_frame.datasets[key], self.width)
                         self.AddPage(self.dataset_data_tabs[key], str(key))
         self.Thaw()
@@ -234,7 +234,7 @@ class DatasetPanel(wx.Panel):
             document_count_label = wx.StaticText(self, label=GUIText.DOCUMENT_NUM+": ")
             document_count_label.SetFont(main_frame.DETAILS_LABEL_FONT)
             document_count_sizer.Add(document_count_label)
-            document_count_num = wx.StaticText(self, label=str(len(self.dataset.data)))
+            document_count_num = wx.StaticText(self, label=str(self.dataset.data_count))
             document_count_sizer.Add(document_count_num)
             details_sizer3.Add(document_count_sizer, 0, wx.ALL|wx.ALIGN_CENTRE_VERTICAL, 5)
             details_sizer3.AddSpacer(10)
@@ -285,7 +285,7 @@ class DatasetPanel(wx.Panel):
             tweet_count_label = wx.StaticText(self, label=GUIText.TWITTER_TWEETS_NUM+": ")
             tweet_count_label.SetFont(main_frame.DETAILS_LABEL_FONT)
             tweet_count_sizer.Add(tweet_count_label)
-            tweet_count_num = wx.StaticText(self, label=str(len(self.dataset.data)))
+            tweet_count_num = wx.StaticText(self, label=str(self.dataset.data_count))
             tweet_count_sizer.Add(tweet_count_num)
             details_sizer3.Add(tweet_count_sizer, 0, wx.ALL|wx.ALIGN_CENTRE_VERTICAL, 5)
             details_sizer3.AddSpacer(10)
@@ -348,7 +348,7 @@ class DatasetPanel(wx.Panel):
             document_count_label = wx.StaticText(self, label=GUIText.DOCUMENT_NUM+": ")
             document_count_label.SetFont(main_frame.DETAILS_LABEL_FONT)
             document_count_sizer.Add(document_count_label)
-            document_count_num = wx.StaticText(self, label=str(len(self.dataset.data)))
+            document_count_num = wx.StaticText(self, label=str(self.dataset.data_count))
             document_count_sizer.Add(document_count_num)
             details_sizer3.Add(document_count_sizer, 0, wx.ALL|wx.ALIGN_CENTRE_VERTICAL, 5)
             details_sizer3.AddSpacer(10)
@@ -492,16 +492,39 @@ class DatasetDataPanel(wx.Panel):
         controls_sizer.Add(self.search_count_text, 0, wx.ALL|wx.ALIGN_CENTRE_VERTICAL, 5)
         sizer.Add(controls_sizer, 0, wx.ALL, 5)
 
-        self.datasetdata_grid = DatasetsDataViews.DatasetsDataGrid(self, dataset, width)
-        sizer.Add(self.datasetdata_grid, 1, wx.EXPAND)
-
         self.SetSizer(sizer)
+
+        #the grid needs the dataset's data so unless it is already loaded the grid is only created once the tab is first shown
+        self.width = width
+        self.datasetdata_grid = None
+        if dataset.data_loaded:
+            self.CreateGrid()
+        else:
+            self.Bind(wx.EVT_SHOW, self.OnShow)
+
+    def CreateGrid(self):
+        logger = logging.getLogger(__name__+".DatasetDataPanel.CreateGrid")
+        logger.info("Starting")
+        self.datasetdata_grid = DatasetsDataViews.DatasetsDataGrid(self, self.dataset, self.width)
+        self.GetSizer().Add(self.datasetdata_grid, 1, wx.EXPAND)
+        self.Layout()
+        logger.info("Finished")
+
+    def OnShow(self, event):
+        if event.IsShown() and self.datasetdata_grid is None:
+            self.Unbind(wx.EVT_SHOW)
+            if hasattr(self.GetParent(), 'width'):
+                self.width = self.GetParent().width
+            self.CreateGrid()
+        event.Skip()
     
     def OnSearch(self, event):
         logger = logging.getLogger(__name__+".DatasetDataPanel.OnSearch")
         logger.info("Starting")
         search_ctrl = event.GetEventObject()
         search_value = search_ctrl.GetValue()
+        if self.datasetdata_grid is None:
+            self.CreateGrid()
         self.datasetdata_grid.Search(search_value)
         self.search_count_text.SetLabel(str(len(self.datasetdata_grid.gridtable.data_df))+GUIText.SEARCH_RESULTS_LABEL)
         logger.info("Finished")
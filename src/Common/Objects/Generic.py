@@ -133,3 +133,36 @@ class Connection(object):
         else:
             key = (self.obj.key,)
         return key
+
+class OrderedSet(object):
+    '''set of keys that keeps the order keys were added in, used for selections that are checked for membership
+    every time a row is drawn and that may hold every document of a large dataset'''
+    def __init__(self, keys=None):
+        self._keys = {}
+        if keys is not None:
+            for key in keys:
+                self._keys[key] = None
+
+    def __repr__(self):
+        return 'OrderedSet(%s)' % (list(self._keys),)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, key):
+        self._keys[key] = None
+
+    def remove(self, key):
+        del self._keys[key]
+
+    def discard(self, key):
+        self._keys.pop(key, None)
+
+    def clear(self):
+        self._keys.clear()
@@ -11,7 +11,7 @@ import numpy as np
 import gensim
 import bitermplus as btm
 
-from Common.Objects.Generic import GenericObject
+from Common.Objects.Generic import GenericObject, OrderedSet
 import Common.Objects.Threads.Samples as SamplesThreads
 import Common.Objects.Datasets as Datasets
 
@@ -36,11 +36,17 @@ class Sample(GenericObject):
 
         #objects that have their own last_changed_dt and thus need to be checked dynamically
         self.parts_dict = OrderedDict()
-        self.selected_documents = []
+        self.selected_documents = OrderedSet()
 
     def __repr__(self):
         return 'Sample[%s][%s]' % (self.name, self.key,)
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        #workspaces saved before selections were OrderedSets stored them as lists
+        if not isinstance(self.selected_documents, OrderedSet):
+            self.selected_documents = OrderedSet(self.selected_documents)
+
     @property
     def dataset_key(self):
         return self._dataset_key
@@ -41,25 +41,30 @@ class ChangeTokenizationChoiceThread(Thread):
     def run(self):
         logger = logging.getLogger(__name__+"ChangeTokenizationChoiceThread["+str(self.dataset.key)+"].run")
         logger.info("Starting")
-        db_conn = Database.DatabaseConnection(self.main_frame.current_workspace.name)
-        db_conn.UpdateDatasetTokenType(self.dataset.key, self.new_choice)
+        #rules are reapplied to every token of the dataset so the shared string tokens indexes must not be dropped meanwhile
+        Database.StartDatasetOperation(self.main_frame.current_workspace.name)
+        try:
+            db_conn = Database.DatabaseConnection(self.main_frame.current_workspace.name)
+            db_conn.UpdateDatasetTokenType(self.dataset.key, self.new_choice)
 
-        wx.PostEvent(self.main_frame, CustomEvents.ProgressEvent({'step':GUITextFiltering.FILTERS_APPLYING_RULES_STEP}))
-        db_conn.ApplyAllDatasetRules(self.dataset.key, self.dataset.filter_rules)
-        db_conn.RefreshStringTokensIncluded(self.dataset.key)
-        db_conn.RefreshStringTokensRemoved(self.dataset.key)
+            wx.PostEvent(self.main_frame, CustomEvents.ProgressEvent({'step':GUITextFiltering.FILTERS_APPLYING_RULES_STEP}))
+            db_conn.ApplyAllDatasetRules(self.dataset.key, self.dataset.filter_rules)
+            db_conn.RefreshStringTokensIncluded(self.dataset.key)
+            db_conn.RefreshStringTokensRemoved(self.dataset.key)
 
-        wx.PostEvent(self.main_frame, CustomEvents.ProgressEvent({'step':GUITextFiltering.FILTERS_UPDATING_COUNTS_STEP}))
-        counts = db_conn.GetStringTokensCounts(self.dataset.key)
-        self.dataset.total_docs = counts['documents']
-        self.dataset.total_tokens = counts['tokens']
-        self.dataset.total_uniquetokens = counts['unique_tokens']
-        included_counts = db_conn.GetIncludedStringTokensCounts(self.dataset.key)
-        self.dataset.total_docs_remaining = included_counts['documents']
-        self.dataset.total_tokens_remaining = included_counts['tokens']
-        self.dataset.total_uniquetokens_remaining = included_counts['unique_tokens']
+            wx.PostEvent(self.main_frame, CustomEvents.ProgressEvent({'step':GUITextFiltering.FILTERS_UPDATING_COUNTS_STEP}))
+            counts = db_conn.GetStringTokensCounts(self.dataset.key)
+            self.dataset.total_docs = counts['documents']
+            self.dataset.total_tokens = counts['tokens']
+            self.dataset.total_uniquetokens = counts['unique_tokens']
+            included_counts = db_conn.GetIncludedStringTokensCounts(self.dataset.key)
+            self.dataset.total_docs_remaining = included_counts['documents']
+            self.dataset.total_tokens_remaining = included_counts['tokens']
+            self.dataset.total_uniquetokens_remaining = included_counts['unique_tokens']
         
-        del db_conn
+            del db_conn
+        finally:
+            Database.FinishDatasetOperation(self.main_frame.current_workspace.name)
 
         #return event from thread
         result = {}
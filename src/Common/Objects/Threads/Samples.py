@@ -5,16 +5,19 @@ import bz2
 import pickle
 import numpy
 
-import wx
-
 #ML libraries
 import gensim
 import bitermplus as btm
 from sklearn.decomposition import NMF as nmf
 from sklearn.feature_extraction.text import TfidfVectorizer
 
-import Common.CustomEvents as CustomEvents
 import Common.Objects.Utilities.Samples as SamplesUtilities
+#the threads are only run inside the toolkit's gui, samples are also loaded by the tests without it
+try:
+    import wx
+    import Common.CustomEvents as CustomEvents
+except ImportError:
+    wx = None
 
 class CaptureThread(Thread):
     def __init__(self, notify_window, main_frame, model_paramaters, model_type):
@@ -56,14 +59,18 @@ class LDATrainingThread(Thread):
             os.makedirs(self.current_workspace_path+"/Samples/"+self.key)
 
         logger.info("Starting generation of model")
-        tokensets_keys = list(self.tokensets.keys())
-        tokensets_values = list(self.tokensets.values())
-        dictionary = gensim.corpora.Dictionary(tokensets_values)
-        dictionary.compactify()
-        dictionary.save(self.current_workspace_path+"/Samples/"+self.key+'/ldadictionary.dict')
-        logger.info("Dictionary created")
-        raw_corpus = [dictionary.doc2bow(tokenset) for tokenset in tokensets_values]
-        gensim.corpora.MmCorpus.serialize(self.current_workspace_path+"/Samples/"+self.key+'/ldacorpus.mm', raw_corpus)
+        #tokensets is an iterable corpus so each pass streams the documents instead of copying them into lists
+        tokensets_keys = self.tokensets.keys()
+        #the captured corpus file is removed even if generation fails
+        try:
+            dictionary = gensim.corpora.Dictionary(self.tokensets)
+            dictionary.compactify()
+            dictionary.save(self.current_workspace_path+"/Samples/"+self.key+'/ldadictionary.dict')
+            logger.info("Dictionary created")
+            raw_corpus = (dictionary.doc2bow(tokenset) for tokenset in self.tokensets)
+            gensim.corpora.MmCorpus.serialize(self.current_workspace_path+"/Samples/"+self.key+'/ldacorpus.mm', raw_corpus)
+        finally:
+            self.tokensets.Delete()
         corpus = gensim.corpora.MmCorpus(self.current_workspace_path+"/Samples/"+self.key+'/ldacorpus.mm')
         logger.info("Corpus created")
 
@@ -122,22 +129,24 @@ class BitermTrainingThread(Thread):
         if not os.path.exists(self.current_workspace_path+"/Samples/"+self.key):
             os.makedirs(self.current_workspace_path+"/Samples/"+self.key)
 
-        text_keys = []
-        texts = []
-        for key in self.tokensets:
-            text_keys.append(key)
-            text = ' '.join(self.tokensets[key])
-            texts.append(text)
+        text_keys = self.tokensets.keys()
+        def Texts():
+            for tokenset in self.tokensets:
+                yield ' '.join(tokenset)
 
         logger.info("Starting generation of biterm model")
 
-        X, vocab, vocab_dict = btm.get_words_freqs(texts)
-        with bz2.BZ2File(self.current_workspace_path+"/Samples/"+self.key+'/vocab.pk', 'wb') as outfile:
-            pickle.dump(vocab, outfile)
-        logger.info("Vocab created")
-
-        # Vectorizing documents
-        docs_vec = btm.get_vectorized_docs(texts, vocab)
+        #the captured corpus file is removed even if generation fails
+        try:
+            X, vocab, vocab_dict = btm.get_words_freqs(Texts())
+            with bz2.BZ2File(self.current_workspace_path+"/Samples/"+self.key+'/vocab.pk', 'wb') as outfile:
+                pickle.dump(vocab, outfile)
+            logger.info("Vocab created")
+
+            # Vectorizing documents
+            docs_vec = btm.get_vectorized_docs(Texts(), vocab)
+        finally:
+            self.tokensets.Delete()
         with bz2.BZ2File(self.current_workspace_path+"/Samples/"+self.key+'/transformed_texts.pk', 'wb') as outfile:
             pickle.dump(docs_vec, outfile)
         logger.info("Texts transformed")
@@ -184,18 +193,17 @@ class NMFTrainingThread(Thread):
         if not os.path.exists(self.current_workspace_path+"/Samples/"+self.key):
             os.makedirs(self.current_workspace_path+"/Samples/"+self.key)
 
-        text_keys = []
-        texts = []
-        for key in self.tokensets:
-            text_keys.append(key)
-            text = ' '.join(self.tokensets[key])
-            texts.append(text)
+        text_keys = self.tokensets.keys()
 
         logger.info("Starting generation of NMF model")
 
-        tfidf_vectorizer = TfidfVectorizer(max_features=len(self.tokensets.values()), preprocessor=SamplesUtilities.dummy, tokenizer=SamplesUtilities.dummy, token_pattern=None)
+        #the captured corpus file is removed even if generation fails
+        try:
+            tfidf_vectorizer = TfidfVectorizer(max_features=len(self.tokensets), preprocessor=SamplesUtilities.dummy, tokenizer=SamplesUtilities.dummy, token_pattern=None)
         
-        tfidf = tfidf_vectorizer.fit_transform(self.tokensets.values())
+            tfidf = tfidf_vectorizer.fit_transform(self.tokensets)
+        finally:
+            self.tokensets.Delete()
         with bz2.BZ2File(self.current_workspace_path+"/Samples/"+self.key+'/tfidf.pk', 'wb') as outfile:
            pickle.dump(tfidf, outfile)
         
@@ -1,4 +1,7 @@
 import logging
+import itertools
+import functools
+from collections import deque
 from datetime import datetime, timedelta
 
 import spacy
@@ -61,33 +64,25 @@ def TokenizeDataset(dataset, notify_window, main_frame, rerun=False, tfidf_updat
         logger.info("Preparing Processes for %s, %s, for %s documents", repr(dataset), repr(field), str(len(field_data)))
         nonlocal main_frame
         wx.PostEvent(main_frame, CustomEvents.ProgressEvent({'msg':GUIText.TOKENIZING_BUSY_STARTING_FIELD_MSG+str(field.name)}))
-        results = []
-
         total = len(field_data)
-        full_data_list = list(field_data.items())
-        split_data_lists = []
-        if total > main_frame.pool_num*2:
-            increment = int(total/(main_frame.pool_num*2))
-            start = 0
-            end = increment
-            for i in range(main_frame.pool_num*2-1):
-                split_data_lists.append(full_data_list[start:end])
-                start = end
-                end = end+increment
-            split_data_lists.append(full_data_list[start:])
-        else:
-            split_data_lists.append(full_data_list)
-        
+        batch_size = Constants.TOKENIZATION_BATCH_SIZE
+        max_inflight_batches = main_frame.pool_num*Constants.TOKENIZATION_INFLIGHT_BATCHES_PER_PROCESS
+        #documents are handed to the pool in small batches as earlier batches complete so that only a bounded amount of tokens are in memory at once
+        data_iter = iter(field_data.items())
+        results = deque()
         count = 0
-        for data_list in split_data_lists:
-            logger.info("Creating TokenizationWorker for Documents %s - %s", str(count+1), str(count+len(data_list)))
-            res = main_frame.pool.apply_async(TokenizationWorker, (data_list, 
-                                                                   repr(field),
-                                                                   str(count+1)+"-"+str(count+len(data_list)-1),
-                                                                   field.parent.language))
-            results.append(res)
-            count = count+len(data_list)
-        
+        def SubmitBatch():
+            nonlocal count
+            data_list = list(itertools.islice(data_iter, batch_size))
+            if len(data_list) > 0:
+                logger.info("Creating TokenizationWorker for Documents %s - %s", str(count+1), str(count+len(data_list)))
+                res = main_frame.pool.apply_async(TokenizationWorker, (data_list,
+                                                                       repr(field),
+                                                                       str(count+1)+"-"+str(count+len(data_list)),
+                                                                       field.parent.language))
+                results.append(res)
+                count = count+len(data_list)
+
         completed = 0
         start_time = datetime.now()
         wx.PostEvent(main_frame, CustomEvents.ProgressEvent({'msg':GUIText.TOKENIZING_BUSY_COMPLETED_FIELD_MSG1+str(completed)\
@@ -95,32 +90,35 @@ def TokenizeDataset(dataset, notify_window, main_frame, rerun=False, tfidf_updat
                                                                +GUIText.TOKENIZING_BUSY_COMPLETED_FIELD_MSG3+str(field.name)}))
         if not db_conn.CheckIfFieldExists(dataset.key, field.key):
             db_conn.InsertField(dataset.key, field.key)
-        res_count = 0
-        for res in results:
-            res_count += 1
-            new_tokensets = res.get()[0]
-            package_versions = res.get()[1]
+        for i in range(max_inflight_batches):
+            SubmitBatch()
+        if total == 0:
+            #still run an empty batch so that the package versions used for tokenization are recorded
+            results.append(main_frame.pool.apply_async(TokenizationWorker, ([], repr(field), "0-0", field.parent.language)))
+        package_versions = dataset.tokenization_package_versions
+        #results are handed off in submission order so documents' tokens are inserted in the same order as the dataset
+        while len(results) > 0:
+            res = results.popleft()
+            new_tokensets, package_versions = res.get()
+            #keep the pool busy while this batch is written to the database
+            SubmitBatch()
             #insert documents' tokens into database
             db_conn.InsertStringTokens(dataset.key, field.key, new_tokensets)
             completed += len(new_tokensets)
+            del new_tokensets
             logger.info("%s %s", repr(field), completed)
             wx.PostEvent(main_frame, CustomEvents.ProgressEvent({'msg':GUIText.TOKENIZING_BUSY_COMPLETED_FIELD_MSG1+str(completed)\
                                                                    +GUIText.TOKENIZING_BUSY_COMPLETED_FIELD_MSG2+str(total)\
                                                                    +GUIText.TOKENIZING_BUSY_COMPLETED_FIELD_MSG3+str(field.name)}))
 
             current_time = datetime.now()
-            if res_count < len(results)/2:
-                new_estimated_loop_time = (current_time - start_time)*2
-            else:
-                new_estimated_loop_time = (current_time - start_time)
+            completed_fraction = completed/total if total > 0 else 1
+            new_estimated_loop_time = (current_time - start_time)/completed_fraction
             nonlocal estimated_loop_time, field_count, remaining_field_count
             if estimated_loop_time < new_estimated_loop_time:
                 estimated_loop_time = new_estimated_loop_time
                 elapsed_time = current_time - start_time
-                if res_count < len(results)/2:
-                    estimated_remaining_sec = estimated_loop_time.total_seconds() * (remaining_field_count-0.5)
-                else:
-                    estimated_remaining_sec = estimated_loop_time.total_seconds() * (remaining_field_count-1)
+                estimated_remaining_sec = estimated_loop_time.total_seconds() * (remaining_field_count-completed_fraction)
                 estimated_remaining_time = timedelta(seconds=estimated_remaining_sec)
                 wx.PostEvent(main_frame, CustomEvents.ProgressEvent({'estimated_time':elapsed_time + estimated_remaining_time}))
         dataset.tokenization_package_versions = package_versions
@@ -164,73 +162,125 @@ def TokenizeDataset(dataset, notify_window, main_frame, rerun=False, tfidf_updat
     remaining_field_count = field_count
     start_time = datetime.now()
     estimated_loop_time = timedelta()
-    stringfield_count = 0
-    for computational_field_key in dataset.computational_fields:
-        has_data = False
-        if dataset.computational_fields[computational_field_key].fieldtype == 'string':
+    tokenized_field_keys = []
+    workspace_path = main_frame.current_workspace.name
+    Database.StartDatasetOperation(workspace_path)
+    try:
+        #for large datasets the word indexes are rebuilt once after all tokens are loaded instead of being maintained per row
+        indexes_dropped = False
+        try:
+            for computational_field_key in dataset.computational_fields:
+                has_data = False
+                if dataset.computational_fields[computational_field_key].fieldtype == 'string':
+                    if rerun:
+                        db_conn.DeleteField(dataset.key, computational_field_key, update_tfidf=False)
+                    else:
+                        has_data = db_conn.CheckIfFieldExists(dataset.key, computational_field_key)
+                    if not has_data:
+                        #the indexes are shared with the workspace's other datasets so they are kept while any other operation is running
+                        if not indexes_dropped and dataset.data_count >= Constants.TOKENIZATION_INDEX_REBUILD_THRESHOLD \
+                                and Database.AcquireStringTokensIndexesDrop(workspace_path):
+                            db_conn.DropStringTokensIndexes()
+                            indexes_dropped = True
+                        FieldTokenizer(dataset.computational_fields[computational_field_key])
+                        tokenized_field_keys.append(computational_field_key)
+                elif dataset.computational_fields[computational_field_key].tokenset == None or rerun:
+                    FieldTokenizer(dataset.computational_fields[computational_field_key])
+        finally:
+            if indexes_dropped:
+                db_conn.CreateStringTokensIndexes()
+                Database.ReleaseStringTokensIndexesDrop(workspace_path)
+        logger.info("Tokenized %s string fields in %s using database profile[%s]", str(len(tokenized_field_keys)), str(datetime.now() - start_time), Database.connection_profile)
+
+        #calculate tfidf scores for all stored string tokens if any changes occured
+        if len(tokenized_field_keys) > 0 or tfidf_update:
+            wx.PostEvent(main_frame, CustomEvents.ProgressEvent({'step':GUIText.TOKENIZING_BUSY_STEP_TFIDF_STEP}))
+            #fields removed with DeleteField already had their tf-idf changes applied so only newly tokenized fields need to be added
             if rerun:
-                db_conn.DeleteField(dataset.key, computational_field_key)
+                db_conn.UpdateStringTokensTFIDF(dataset.key)
             else:
-                has_data = db_conn.CheckIfFieldExists(dataset.key, computational_field_key)
-            if not has_data:
-                FieldTokenizer(dataset.computational_fields[computational_field_key])
-                stringfield_count += 1
-        elif dataset.computational_fields[computational_field_key].tokenset == None or rerun:
-            FieldTokenizer(dataset.computational_fields[computational_field_key])
-
-    #calculate tfidf scores for all stored string tokens if any changes occured
-    if stringfield_count > 0 or tfidf_update:
-        wx.PostEvent(main_frame, CustomEvents.ProgressEvent({'step':GUIText.TOKENIZING_BUSY_STEP_TFIDF_STEP}))
-        db_conn.UpdateStringTokensTFIDF(dataset.key)
-        counts = db_conn.GetStringTokensCounts(dataset.key)
-        dataset.total_docs = counts['documents']
-        dataset.total_tokens = counts['tokens']
-        dataset.total_uniquetokens = counts['unique_tokens']
-        del db_conn
-        ApplyFilterAllRules(dataset, main_frame)
-            
+                db_conn.UpdateStringTokensTFIDF(dataset.key, new_field_keys=tokenized_field_keys)
+            counts = db_conn.GetStringTokensCounts(dataset.key)
+            dataset.total_docs = counts['documents']
+            dataset.total_tokens = counts['tokens']
+            dataset.total_uniquetokens = counts['unique_tokens']
+            del db_conn
+            ApplyFilterAllRules(dataset, main_frame)
+    finally:
+        Database.FinishDatasetOperation(workspace_path)
     logger.info("Finished")
 
+#per process cache of loaded nlp pipelines and stemmers so that each process of the pool only loads a language model once
+#models are loaded by the first batch a process tokenizes in that language, so processes that never tokenize do not load any
+tokenizer_cache = {}
+
+def GetTokenizer(language):
+    if language not in tokenizer_cache:
+        logger = logging.getLogger(__name__+".GetTokenizer["+str(language)+"]")
+        logger.info("Loading")
+        package_versions = []
+        spacy.prefer_gpu()
+        if language == 'fre-sm':
+            #less accurate but faster model
+            nlp = fr_core_news_sm.load(exclude=Constants.TOKENIZATION_EXCLUDED_COMPONENTS)
+            stemmer = nltk.stem.snowball.FrenchStemmer()
+            package_versions.append(spacy.__name__+" "+spacy.__version__+" "+nlp.meta['lang']+"_"+nlp.meta['name']+" "+nlp.meta['version'])
+            package_versions.append(nltk.__name__ +" "+nltk.__version__+" snowball.FrenchStemmer")
+            package_versions.append(spacy.__name__ +" "+nlp.meta['lang']+"_"+nlp.meta['name']+" "+nlp.meta['version'])
+        elif language == 'eng-sm':
+            #less accurate but faster model
+            nlp = en_core_web_sm.load(exclude=Constants.TOKENIZATION_EXCLUDED_COMPONENTS)
+            stemmer = nltk.stem.snowball.EnglishStemmer()
+            package_versions.append(spacy.__name__+" "+spacy.__version__+" "+nlp.meta['lang']+"_"+nlp.meta['name']+" "+nlp.meta['version'])
+            package_versions.append(nltk.__name__ +" "+nltk.__version__+" snowball.EnglishStemmer")
+            package_versions.append(spacy.__name__ +" "+nlp.meta['lang']+"_"+nlp.meta['name']+" "+nlp.meta['version'])
+        #record which of the model's components are not run as part of tokenization
+        unused_components = list(Constants.TOKENIZATION_EXCLUDED_COMPONENTS) + list(nlp.disabled)
+        package_versions[0] = package_versions[0]+" (disabled: "+", ".join(unused_components)+")"
+        #natural language repeats the same words many times so stems are cached by lowercased word for the life of the process
+        @functools.lru_cache(maxsize=Constants.TOKENIZATION_STEM_CACHE_SIZE)
+        def CachedStem(word):
+            return stemmer.stem(word).strip().lower()
+        tokenizer_cache[language] = (nlp, CachedStem, package_versions)
+        logger.info("Loaded")
+    return tokenizer_cache[language]
+
 def TokenizationWorker(data_list, field_repr, label, language):
     logger = logging.getLogger(__name__+".TokenizationWorker["+field_repr+"]["+str(label)+"]")
     logger.info("Starting")
 
-    package_versions = []
-
-    spacy.prefer_gpu()
-    if language == 'fre-sm':
-        #less accurate but faster model
-        nlp = fr_core_news_sm.load()
-        stemmer = nltk.stem.snowball.FrenchStemmer()
-        package_versions.append(spacy.__name__+" "+spacy.__version__+" "+nlp.meta['lang']+"_"+nlp.meta['name']+" "+nlp.meta['version'])
-        package_versions.append(nltk.__name__ +" "+nltk.__version__+" snowball.FrenchStemmer")
-        package_versions.append(spacy.__name__ +" "+nlp.meta['lang']+"_"+nlp.meta['name']+" "+nlp.meta['version'])
-    elif language == 'eng-sm':
-        #less accurate but faster model
-        nlp = en_core_web_sm.load()
-        stemmer = nltk.stem.snowball.EnglishStemmer()
-        package_versions.append(spacy.__name__+" "+spacy.__version__+" "+nlp.meta['lang']+"_"+nlp.meta['name']+" "+nlp.meta['version'])
-        package_versions.append(nltk.__name__ +" "+nltk.__version__+" snowball.EnglishStemmer")
-        package_versions.append(spacy.__name__ +" "+nlp.meta['lang']+"_"+nlp.meta['name']+" "+nlp.meta['version'])
+    nlp, cached_stem, package_versions = GetTokenizer(language)
+    start_cache_info = cached_stem.cache_info()
     
+    #all texts of all documents in the batch are piped through spacy together so it can batch them efficiently
+    def DocumentTexts():
+        for key, data in data_list:
+            for text in data:
+                yield text, key
+
     tokensets = {}
     for key, data in data_list:
-        tokenset = []
-        position = 0
-        for tmp_tokens in nlp.pipe(data):
-            for token in tmp_tokens:
-                text = token.text.strip().lower()
-                stem = stemmer.stem(token.text).strip().lower()
-                lemma = token.lemma_.strip().lower()
-                tokenset.append((position,
-                                     text,
-                                     stem,
-                                     lemma,
-                                     token.pos_,
-                                     token.is_stop))
-                position = position + 1
-        tokensets[key] = tokenset
+        tokensets[key] = []
+    cur_key = None
+    for tmp_tokens, key in nlp.pipe(DocumentTexts(), as_tuples=True, batch_size=Constants.TOKENIZATION_PIPE_BATCH_SIZE):
+        if key != cur_key:
+            cur_key = key
+            tokenset = tokensets[key]
+            position = 0
+        for token in tmp_tokens:
+            text = token.text.strip().lower()
+            stem = cached_stem(token.lower_)
+            lemma = token.lemma_.strip().lower()
+            tokenset.append((position,
+                                 text,
+                                 stem,
+                                 lemma,
+                                 token.pos_,
+                                 token.is_stop))
+            position = position + 1
 
+    end_cache_info = cached_stem.cache_info()
+    logger.info("Stem cache hits[%s] misses[%s] size[%s]", str(end_cache_info.hits-start_cache_info.hits), str(end_cache_info.misses-start_cache_info.misses), str(end_cache_info.currsize))
     logger.info("Finished")
     #return tokensets, rawtext_tokens_df, stem_tokens_df, lemma_tokens_df, package_versions
     return tokensets, package_versions
@@ -238,39 +288,12 @@ def TokenizationWorker(data_list, field_repr, label, language):
 def ApplyFilterAllRules(dataset, main_frame):
     logger = logging.getLogger(__name__+".ApplyFilterAllRules")
     logger.info("Starting")
-    db_conn = Database.DatabaseConnection(main_frame.current_workspace.name)
-    wx.PostEvent(main_frame, CustomEvents.ProgressEvent({'step':GUITextFiltering.FILTERS_APPLYING_RULES_STEP}))
-    mapped_rules = []
-    for field_name, word, pos, action in dataset.filter_rules:
-        include = False
-        if field_name != Constants.FILTER_RULE_ANY:
-            for field in dataset.computational_fields.values():
-                if field.name == field_name:
-                    field_name = field.key
-                    include = True
-                    break
-        else:
-            include = True
-        if include:
-            mapped_rules.append((field_name, word, pos, action))
-    db_conn.ApplyAllDatasetRules(dataset.key, mapped_rules)
-    wx.PostEvent(main_frame, CustomEvents.ProgressEvent({'step':GUITextFiltering.FILTERS_UPDATING_COUNTS_STEP}))
-    db_conn.RefreshStringTokensIncluded(dataset.key)
-    db_conn.RefreshStringTokensRemoved(dataset.key)
-    included_counts = db_conn.GetIncludedStringTokensCounts(dataset.key)
-    dataset.total_docs_remaining = included_counts['documents']
-    dataset.total_tokens_remaining = included_counts['tokens']
-    dataset.total_uniquetokens_remaining = included_counts['unique_tokens']
-    logger.info("Finished")
-
-def ApplyFilterNewRules(dataset, main_frame, new_rules):
-    logger = logging.getLogger(__name__+".ApplyFilterNewRules")
-    logger.info("Starting")
-    if len(new_rules) > 0:
+    Database.StartDatasetOperation(main_frame.current_workspace.name)
+    try:
         db_conn = Database.DatabaseConnection(main_frame.current_workspace.name)
-        wx.PostEvent(main_frame, CustomEvents.ProgressEvent({'step': GUITextFiltering.FILTERS_APPLYING_RULES_STEP}))
+        wx.PostEvent(main_frame, CustomEvents.ProgressEvent({'step':GUITextFiltering.FILTERS_APPLYING_RULES_STEP}))
         mapped_rules = []
-        for field_name, word, pos, action in new_rules:
+        for field_name, word, pos, action in dataset.filter_rules:
             include = False
             if field_name != Constants.FILTER_RULE_ANY:
                 for field in dataset.computational_fields.values():
@@ -282,14 +305,49 @@ def ApplyFilterNewRules(dataset, main_frame, new_rules):
                 include = True
             if include:
                 mapped_rules.append((field_name, word, pos, action))
-        db_conn.ApplyNewDatasetRules(dataset.key, mapped_rules)
-        wx.PostEvent(main_frame, CustomEvents.ProgressEvent({'step': GUITextFiltering.FILTERS_UPDATING_COUNTS_STEP}))
+        db_conn.ApplyAllDatasetRules(dataset.key, mapped_rules)
+        wx.PostEvent(main_frame, CustomEvents.ProgressEvent({'step':GUITextFiltering.FILTERS_UPDATING_COUNTS_STEP}))
         db_conn.RefreshStringTokensIncluded(dataset.key)
         db_conn.RefreshStringTokensRemoved(dataset.key)
         included_counts = db_conn.GetIncludedStringTokensCounts(dataset.key)
         dataset.total_docs_remaining = included_counts['documents']
         dataset.total_tokens_remaining = included_counts['tokens']
         dataset.total_uniquetokens_remaining = included_counts['unique_tokens']
+    finally:
+        Database.FinishDatasetOperation(main_frame.current_workspace.name)
+    logger.info("Finished")
+
+def ApplyFilterNewRules(dataset, main_frame, new_rules):
+    logger = logging.getLogger(__name__+".ApplyFilterNewRules")
+    logger.info("Starting")
+    if len(new_rules) > 0:
+        Database.StartDatasetOperation(main_frame.current_workspace.name)
+        try:
+            db_conn = Database.DatabaseConnection(main_frame.current_workspace.name)
+            wx.PostEvent(main_frame, CustomEvents.ProgressEvent({'step': GUITextFiltering.FILTERS_APPLYING_RULES_STEP}))
+            mapped_rules = []
+            for field_name, word, pos, action in new_rules:
+                include = False
+                if field_name != Constants.FILTER_RULE_ANY:
+                    for field in dataset.computational_fields.values():
+                        if field.name == field_name:
+                            field_name = field.key
+                            include = True
+                            break
+                else:
+                    include = True
+                if include:
+                    mapped_rules.append((field_name, word, pos, action))
+            db_conn.ApplyNewDatasetRules(dataset.key, mapped_rules)
+            wx.PostEvent(main_frame, CustomEvents.ProgressEvent({'step': GUITextFiltering.FILTERS_UPDATING_COUNTS_STEP}))
+            db_conn.RefreshStringTokensIncluded(dataset.key)
+            db_conn.RefreshStringTokensRemoved(dataset.key)
+            included_counts = db_conn.GetIncludedStringTokensCounts(dataset.key)
+            dataset.total_docs_remaining = included_counts['documents']
+            dataset.total_tokens_remaining = included_counts['tokens']
+            dataset.total_uniquetokens_remaining = included_counts['unique_tokens']
+        finally:
+            Database.FinishDatasetOperation(main_frame.current_workspace.name)
     logger.info("Finished")
 
 def DatasetTypeLabel(dataset):
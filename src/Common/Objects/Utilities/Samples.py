@@ -1,7 +1,14 @@
 import logging
+import os
+import pickle
+import tempfile
 from datetime import datetime
 
-import wx
+#the utilities are only run inside the toolkit's gui, samples are also loaded by the tests without it
+try:
+    import wx
+except ImportError:
+    wx = None
 
 import Common.Objects.Samples as Samples
 import Common.Objects.Datasets as Datasets
@@ -10,40 +17,94 @@ import Common.Database as Database
 import Common.Constants as Constants
 
 
+#iterable corpus of a captured token set, usable wherever gensim or sklearn accept an iterable of documents
+#documents are pickled one after another to a temporary file and read back one at a time on each pass
+#so training never needs every document's tokens held in memory at once
+#the file is kept in the workspace directory so it is removed with the workspace if training never finishes
+class TokensetsCorpus(object):
+    def __init__(self, directory):
+        file_handle, self.filename = tempfile.mkstemp(suffix='.tokensets', dir=directory)
+        os.close(file_handle)
+        self.document_keys = []
+
+    def __len__(self):
+        return len(self.document_keys)
+
+    def __iter__(self):
+        for doc_key, tokens in self.items():
+            yield tokens
+
+    def Write(self, outfile, doc_key, tokens):
+        pickle.dump((doc_key, tokens), outfile, protocol=pickle.HIGHEST_PROTOCOL)
+        self.document_keys.append(doc_key)
+
+    def keys(self):
+        return self.document_keys
+
+    def items(self):
+        with open(self.filename, 'rb') as infile:
+            while True:
+                try:
+                    yield pickle.load(infile)
+                except EOFError:
+                    break
+
+    def Delete(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
 #get a moment in time snap shot of the token set that includes each specified field
 #snapshot is needed to generate ml samples
 def CaptureTokens(dataset_key, main_frame):
     logger = logging.getLogger(__name__+".CaptureTokens")
     logger.info("Starting")
-    token_dict = {}
     main_frame.StepProgressDialog(GUIText.GENERATING_PREPARING_MSG)
     
     dataset = main_frame.datasets[dataset_key]
 
-    #strings are from database table due to needing to handle memory constraints caused by number of NLP variables
-    token_dict = Database.DatabaseConnection(main_frame.current_workspace.name).GetDocumentsTokensFromStringTokens(dataset.key)
-
     #Non-strings are stored in field objects
-    field_list = list(main_frame.datasets[dataset_key].computational_fields.keys())
-    for field_key in main_frame.datasets[dataset_key].computational_fields:
-        if main_frame.datasets[dataset_key].computational_fields[field_key].fieldtype != 'string':
-            for doc_key in main_frame.datasets[dataset_key].computational_fields[field_key].tokenset:
-                if isinstance(main_frame.datasets[dataset_key].computational_fields[field_key].tokenset[doc_key], list) and not isinstance(main_frame.datasets[dataset_key].computational_fields[field_key].tokenset[doc_key], str):
-                    for token in main_frame.datasets[dataset_key].computational_fields[field_key].tokenset[doc_key]:
-                        if main_frame.datasets[dataset_key].computational_fields[field_key].fieldtype == 'UTC-timestamp' and token != '':
-                            token_dict[doc_key].append(str(field_key) + "-" + str(datetime.utcfromtimestamp(token).strftime(Constants.DATETIME_FORMAT))+'UTC')
-                        else:
-                            token_dict[doc_key].append(str(field_key) + "-" + str(token))
-                else:
-                    if main_frame.datasets[dataset_key].computational_fields[field_key].fieldtype == 'UTC-timestamp':
-                            token_dict[doc_key].append(str(field_key) + "-" + str(datetime.utcfromtimestamp(main_frame.datasets[dataset_key].computational_fields[field_key].tokenset[doc_key]).strftime(Constants.DATETIME_FORMAT))+'UTC')
+    field_list = list(dataset.computational_fields.keys())
+    nonstring_fields = [(field_key, dataset.computational_fields[field_key]) for field_key in field_list
+                        if dataset.computational_fields[field_key].fieldtype != 'string']
+    def NonStringTokens(doc_key):
+        tokens = []
+        for field_key, field in nonstring_fields:
+            if doc_key not in field.tokenset:
+                continue
+            if isinstance(field.tokenset[doc_key], list) and not isinstance(field.tokenset[doc_key], str):
+                for token in field.tokenset[doc_key]:
+                    if field.fieldtype == 'UTC-timestamp' and token != '':
+                        tokens.append(str(field_key) + "-" + str(datetime.utcfromtimestamp(token).strftime(Constants.DATETIME_FORMAT))+'UTC')
                     else:
-                        token_dict[doc_key].append(str(field_key) + "-" + str(main_frame.datasets[dataset_key].computational_fields[field_key].tokenset[doc_key]))
+                        tokens.append(str(field_key) + "-" + str(token))
+            else:
+                if field.fieldtype == 'UTC-timestamp':
+                    tokens.append(str(field_key) + "-" + str(datetime.utcfromtimestamp(field.tokenset[doc_key]).strftime(Constants.DATETIME_FORMAT))+'UTC')
+                else:
+                    tokens.append(str(field_key) + "-" + str(field.tokenset[doc_key]))
+        return tokens
 
+    #strings are streamed from database table due to needing to handle memory constraints caused by number of NLP variables
+    db_conn = Database.DatabaseConnection(main_frame.current_workspace.name)
+    #tokens containing spaces, such as merged phrases, are split into their words as models were always trained on single words
+    vocabulary = {token_id: term.split() for token_id, term in db_conn.GetStringTokensVocabulary(dataset.key).items()}
+    tokensets = TokensetsCorpus(main_frame.current_workspace.name)
+    with open(tokensets.filename, 'wb') as outfile:
+        for doc_key, token_ids in db_conn.IterDocumentsTokensFromStringTokens(dataset.key):
+            tokens = [word for token_id in token_ids for word in vocabulary[token_id]]
+            tokens.extend(NonStringTokens(doc_key))
+            tokensets.Write(outfile, doc_key, tokens)
+        #documents whose string tokens were all removed are still represented by their non-string fields
+        written_keys = set(tokensets.keys())
+        for field_key, field in nonstring_fields:
+            for doc_key in field.tokenset:
+                if doc_key not in written_keys:
+                    tokensets.Write(outfile, doc_key, NonStringTokens(doc_key))
+                    written_keys.add(doc_key)
 
     main_frame.PulseProgressDialog(GUIText.AFTERFILTERING_LABEL1+str(dataset.total_docs_remaining)+GUIText.AFTERFILTERING_LABEL2+str(dataset.total_docs)+GUIText.AFTERFILTERING_LABEL3)
     logger.info("Finished")
-    return token_dict, field_list
+    return tokensets, field_list
 
 def SamplesSelected(sample, dataset, obj, value):
     if isinstance(obj, Samples.Sample):
@@ -60,7 +121,7 @@ def SamplesSelected(sample, dataset, obj, value):
         obj.selected = value
     elif isinstance(obj, Datasets.Document):
         if value:
-            sample.selected_documents.append(obj.key)
+            sample.selected_documents.add(obj.key)
             sample.last_changed_dt = datetime.now()
             main_frame = wx.GetApp().GetTopWindow()
             main_frame.SamplesUpdated()
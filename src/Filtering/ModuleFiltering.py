@@ -2,7 +2,6 @@
 import logging
 import json
 from datetime import datetime
-import random
 
 import jsonpickle
 import nltk
@@ -191,8 +190,8 @@ class FilterPanel(wx.Panel):
         if len(selection) > 0:
             new_rules = []
             for row in selection:
-                word = self.included_words_panel.words_list.data[row][0]
-                pos = self.included_words_panel.words_list.data[row][1]
+                word = self.included_words_panel.words_list.GetRow(row)[0]
+                pos = self.included_words_panel.words_list.GetRow(row)[1]
                 new_rule = (Constants.FILTER_RULE_ANY, word, pos, Constants.FILTER_RULE_REMOVE)
                 if new_rule not in new_rules:
                     new_rules.append(new_rule)
@@ -216,8 +215,8 @@ class FilterPanel(wx.Panel):
         if len(selection) > 0:
             new_rules = []
             for row in selection:
-                word = self.removed_words_panel.words_list.data[row][0]
-                pos = self.removed_words_panel.words_list.data[row][1]
+                word = self.removed_words_panel.words_list.GetRow(row)[0]
+                pos = self.removed_words_panel.words_list.GetRow(row)[1]
                 new_rule = (Constants.FILTER_RULE_ANY, word, pos, Constants.FILTER_RULE_INCLUDE)
                 if new_rule not in new_rules:
                     new_rules.append(new_rule)
@@ -241,7 +240,7 @@ class FilterPanel(wx.Panel):
         if len(selection) > 0:
             new_rules = []
             for row in selection:
-                word = self.included_words_panel.words_list.data[row][0]
+                word = self.included_words_panel.words_list.GetRow(row)[0]
                 new_rule = (Constants.FILTER_RULE_ANY, word, Constants.FILTER_RULE_ANY, Constants.FILTER_RULE_REMOVE)
                 if new_rule not in new_rules:
                     new_rules.append(new_rule)
@@ -265,7 +264,7 @@ class FilterPanel(wx.Panel):
         if len(selection) > 0:
             new_rules = []
             for row in selection:
-                word = self.removed_words_panel.words_list.data[row][0]
+                word = self.removed_words_panel.words_list.GetRow(row)[0]
                 new_rule = (Constants.FILTER_RULE_ANY, word, Constants.FILTER_RULE_ANY, Constants.FILTER_RULE_INCLUDE)
                 if new_rule not in new_rules:
                     new_rules.append(new_rule)
@@ -289,7 +288,7 @@ class FilterPanel(wx.Panel):
         if len(selection) > 0:
             new_rules = []
             for row in selection:
-                pos = self.included_words_panel.words_list.data[row][1]
+                pos = self.included_words_panel.words_list.GetRow(row)[1]
                 new_rule = (Constants.FILTER_RULE_ANY, Constants.FILTER_RULE_ANY, pos, Constants.FILTER_RULE_REMOVE)
                 if new_rule not in new_rules:
                     new_rules.append(new_rule)
@@ -313,7 +312,7 @@ class FilterPanel(wx.Panel):
         if len(selection) > 0:
             new_rules = []
             for row in selection:
-                pos = self.removed_words_panel.words_list.data[row][1]
+                pos = self.removed_words_panel.words_list.GetRow(row)[1]
                 new_rule = (Constants.FILTER_RULE_ANY, Constants.FILTER_RULE_ANY, pos, Constants.FILTER_RULE_INCLUDE)
                 if new_rule not in new_rules:
                     new_rules.append(new_rule)
@@ -649,7 +648,10 @@ class WordsPanel(wx.Panel):
         self.searchctrl = wx.SearchCtrl(self)
         self.searchctrl.Bind(wx.EVT_SEARCH, self.OnSearch)
         self.searchctrl.Bind(wx.EVT_SEARCH_CANCEL, self.OnSearchCancel)
+        self.searchctrl.Bind(wx.EVT_TEXT, self.OnSearchText)
+        self.search_timer = None
         self.searchctrl.SetDescriptiveText(GUIText.SEARCH)
+        self.searchctrl.SetToolTip(GUIText.FILTERS_WORD_SEARCH_TOOLTIP)
         self.searchctrl.ShowCancelButton(True)
         extent = self.searchctrl.GetTextExtent(GUIText.FILTERS_WORD_SEARCH)
         size = self.searchctrl.GetSizeFromTextSize(extent.GetWidth()*2, -1)
@@ -672,7 +674,30 @@ class WordsPanel(wx.Panel):
         logger = logging.getLogger(__name__+".WordsPanel["+self.word_type+"]["+str(self.parent_frame.name)+"].OnSearch")
         logger.info("Starting")
         self.DisplayWordsList()
-        self.search_count_text.SetLabel(str(len(self.words_list.data))+GUIText.SEARCH_RESULTS_LABEL)
+        self.search_count_text.SetLabel(str(self.words_list.GetItemCount())+GUIText.SEARCH_RESULTS_LABEL)
+        self.Layout()
+        logger.info("Finished")
+
+    def OnSearchText(self, event):
+        #the list is searched once typing pauses instead of for every key pressed
+        if self.search_timer is not None:
+            self.search_timer.Stop()
+        self.search_timer = wx.CallLater(Constants.FILTERS_SEARCH_DELAY, self.SearchWordsList)
+
+    def SearchWordsList(self):
+        logger = logging.getLogger(__name__+".WordsPanel["+self.word_type+"]["+str(self.parent_frame.name)+"].SearchWordsList")
+        logger.info("Starting")
+        self.search_timer = None
+        search_term = self.searchctrl.GetValue()
+        self.Freeze()
+        try:
+            self.words_list.ResetData(search_term)
+        finally:
+            self.Thaw()
+        if search_term == "":
+            self.search_count_text.SetLabel("")
+        else:
+            self.search_count_text.SetLabel(str(self.words_list.GetItemCount())+GUIText.SEARCH_RESULTS_LABEL)
         self.Layout()
         logger.info("Finished")
 
@@ -685,25 +710,21 @@ class WordsPanel(wx.Panel):
         if self.searchctrl.GetValue() == "":
             self.search_count_text.SetLabel("")
         else:
-            self.search_count_text.SetLabel(str(len(self.words_list.data))+GUIText.SEARCH_RESULTS_LABEL)
+            self.search_count_text.SetLabel(str(self.words_list.GetItemCount())+GUIText.SEARCH_RESULTS_LABEL)
         self.Layout()
         logger.info("Finished")
     
     def OnShowDocumentList(self, event):    
         row = event.GetIndex()
-        document_ids = list(set(self.words_list.data[row][-1].split(',')))
         main_frame = wx.GetApp().GetTopWindow()
-        random.seed(0)
-        sample_size = 20
-        if len(document_ids) < 20:
-            sample_size = len(document_ids)
-        sampled_document_ids = random.sample(document_ids, k=sample_size)
-        document_keys = Database.DatabaseConnection(main_frame.current_workspace.name).GetDocumentKeys(sampled_document_ids)
+        word = self.words_list.GetRow(row)[0]
+        pos = self.words_list.GetRow(row)[1]
+        db_conn = Database.GetPooledConnection(main_frame.current_workspace.name)
+        sampled_document_ids = db_conn.GetStringTokensDocumentSample(self.dataset.key, word, pos, self.word_type == "Included", 20)
+        document_keys = db_conn.GetDocumentKeys(sampled_document_ids)
         documents = []
         for document_key in document_keys[:20]:
             documents.append(self.dataset.GetDocument(document_key))
-        word = self.words_list.GetItemText(row, 0)
-        pos = self.words_list.GetItemText(row, 1)
         title = self.word_type + " " + str((word, pos))
         dialog = DocumentListDialog(main_frame, title, self.dataset, documents, size=wx.Size(800,400))
         dialog.Show()
@@ -1149,6 +1170,7 @@ class CreateRuleDialog(wx.Dialog):
         logger.info("Starting")
         wx.Dialog.__init__(self, parent, title=GUIText.FILTERS_CREATE_RULE)
 
+        self.dataset = dataset
         self.field = None
         self.word = None
         self.pos = None
@@ -1247,6 +1269,15 @@ class CreateRuleDialog(wx.Dialog):
         self.tfidf_rank_ctrl.Hide()
         sizer.Add(advanced_sizer, 0, wx.ALL, 5)
 
+        preview_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        preview_button = wx.Button(self, label=GUIText.FILTERS_CREATE_RULE_PREVIEW)
+        preview_button.SetToolTip(GUIText.FILTERS_CREATE_RULE_PREVIEW_TOOLTIP)
+        preview_button.Bind(wx.EVT_BUTTON, self.OnPreview)
+        preview_sizer.Add(preview_button)
+        self.preview_label = wx.StaticText(self, label="")
+        preview_sizer.Add(self.preview_label, 0, wx.LEFT|wx.ALIGN_CENTER_VERTICAL, 5)
+        sizer.Add(preview_sizer, 0, wx.ALL, 5)
+
         controls_sizer = self.CreateButtonSizer(wx.OK|wx.CANCEL)
         ok_button = wx.FindWindowById(wx.ID_OK, self)
         ok_button.SetLabel(GUIText.FILTERS_CREATE_RULE)
@@ -1280,11 +1311,61 @@ class CreateRuleDialog(wx.Dialog):
         self.Fit()
 
 
+    def OnPreview(self, event):
+        logger = logging.getLogger(__name__+".CreateRuleDialog.OnPreview")
+        logger.info("Starting")
+        error_list = self.ReadRule()
+        if len(error_list) == 0:
+            self.error_label.Hide()
+            field_key = self.field
+            if field_key != Constants.FILTER_RULE_ANY:
+                for field in self.dataset.computational_fields.values():
+                    if field.name == field_key:
+                        field_key = field.key
+                        break
+            main_frame = wx.GetApp().GetTopWindow()
+            db_conn = Database.GetPooledConnection(main_frame.current_workspace.name)
+            counts = db_conn.EstimateNewDatasetRule(self.dataset.key, (field_key, self.word, self.pos, self.rule))
+            if 'unavailable' in counts:
+                self.preview_label.SetLabel(counts['unavailable'])
+            else:
+                if self.action_options[self.action_ctrl.GetStringSelection()] == Constants.FILTER_RULE_REMOVE:
+                    preview_str = GUIText.FILTERS_CREATE_RULE_PREVIEW_REMOVE
+                else:
+                    preview_str = GUIText.FILTERS_CREATE_RULE_PREVIEW_INCLUDE
+                preview_str = preview_str + str(counts['tokens']) + GUIText.FILTERS_CREATE_RULE_PREVIEW_TOKENS \
+                              + str(counts['unique_tokens']) + GUIText.FILTERS_CREATE_RULE_PREVIEW_WORDS \
+                              + str(counts['documents']) + GUIText.FILTERS_CREATE_RULE_PREVIEW_DOCUMENTS
+                self.preview_label.SetLabel(preview_str)
+        else:
+            self.preview_label.SetLabel("")
+            error_str = "-" + "\n-".join(error_list)
+            self.error_label.SetLabel(error_str)
+            self.error_label.Show()
+        self.Layout()
+        self.Fit()
+        logger.info("Finished")
+
     def OnOK(self, event):
-        logger = logging.getLogger(__name__+".CreateCountFilterDialog.OnOK")
+        logger = logging.getLogger(__name__+".CreateRuleDialog.OnOK")
         logger.info("Starting")
-        #check that name exists and is unique
+        error_list = self.ReadRule()
+        if len(error_list) == 0:
+            logger.info("Finished")
+            self.EndModal(wx.ID_OK)
+        else:
+            error_str = "-" + "\n-".join(error_list)
+            self.error_label.SetLabel(error_str)
+            self.error_label.Show()
+            self.Layout()
+            self.Fit()
+            logger.info("Finished")
+
+    def ReadRule(self):
+        #reads the rule from the dialog's controls and returns any errors found
+        logger = logging.getLogger(__name__+".CreateRuleDialog.ReadRule")
         error_list = []
+        self.rule = None
 
         self.field = self.field_ctrl.GetStringSelection()
         if self.field not in self.field_options:
@@ -1347,17 +1428,7 @@ class CreateRuleDialog(wx.Dialog):
                 self.rule = Constants.FILTER_RULE_REMOVE_SPACY_AUTO_STOPWORDS
         elif len(error_list) == 0:
             self.rule = action
-
-        if len(error_list) == 0:
-            logger.info("Finished")
-            self.EndModal(wx.ID_OK)
-        else:
-            error_str = "-" + "\n-".join(error_list)
-            self.error_label.SetLabel(error_str)
-            self.error_label.Show()
-            self.Layout()
-            self.Fit()
-            logger.info("Finished")
+        return error_list
 
 class DocumentListDialog(wx.Dialog):
     def __init__(self, parent, title, dataset, documents, size):
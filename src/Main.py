@@ -66,6 +66,7 @@ class MainFrame(wx.Frame):
         
         self.last_load_dt = datetime.now()
         self.load_thread = None
+        self.prefetch_thread = None
         self.progress_dialog = None
         self.progress_dialog_references = 0
         self.closing = False
@@ -84,7 +85,8 @@ class MainFrame(wx.Frame):
         #Workspace's Options
         self.options_dict = {'multipledatasets_mode': False,
                              'adjustable_label_fields_mode': False,
-                             'adjustable_computation_fields_mode': False}
+                             'adjustable_computation_fields_mode': False,
+                             'database_profile': Constants.DATABASE_PROFILE_DEFAULT}
         #used to control order of modules. not currently used but needed in future customization options to support other thematic analysis approaches
         self.module_order = ['collection',
                              'filtering',
@@ -310,6 +312,8 @@ class MainFrame(wx.Frame):
 
                 self.Freeze()
 
+                self.StopPrefetchThread()
+
                 #reset objects
                 for key in self.theme_dialogs:
                     self.theme_dialogs[key].Destroy()    
@@ -335,6 +339,7 @@ class MainFrame(wx.Frame):
                 
 
                 self.save_path = ''
+                Database.ClosePooledConnections()
                 self.current_workspace.cleanup()
                 self.current_workspace = tempfile.TemporaryDirectory(dir=Constants.CURRENT_WORKSPACE_PATH)
                 Database.DatabaseConnection(self.current_workspace.name).Create()
@@ -467,6 +472,8 @@ class MainFrame(wx.Frame):
             self.StepProgressDialog(GUIText.LOAD_BUSY_MSG_MEMORY_STEP)
             saved_data = event.data['config']
 
+            self.StopPrefetchThread()
+
             #reset objects
             if self.options_dialog != None:
                 self.options_dialog.Destroy()
@@ -501,6 +508,7 @@ class MainFrame(wx.Frame):
             self.DocumentsUpdated(self)
             self.CodesUpdated()
 
+            Database.ClosePooledConnections()
             self.current_workspace.cleanup()
             self.current_workspace = self.load_workspace
             self.load_workspace = None
@@ -511,6 +519,7 @@ class MainFrame(wx.Frame):
             self.themes.update(event.data['themes'])
             self.model_iter = saved_data['model_iter']
             self.options_dict = saved_data['options']
+            Database.SetConnectionProfile(self.options_dict.get('database_profile', Constants.DATABASE_PROFILE_DEFAULT))
             
             if self.max_pool_num < saved_data['pool_num']:
                 saved_data['pool_num'] = self.max_pool_num
@@ -543,6 +552,7 @@ class MainFrame(wx.Frame):
 
             self.load_thread.join()
             self.load_thread = None
+            self.prefetch_thread = MainThreads.DatasetsPrefetchThread(list(self.datasets.values()))
             self.CloseProgressDialog(thaw=True)
 
             wx.CallAfter(self.AutoSize)
@@ -558,7 +568,8 @@ class MainFrame(wx.Frame):
             width = self.main_notebook.GetCurrentPage().GetSize().GetWidth()
         self.collection_module.datasetsdata_notebook.width = width
         for dataset_key in self.collection_module.datasetsdata_notebook.dataset_data_tabs:
-            self.collection_module.datasetsdata_notebook.dataset_data_tabs[dataset_key].datasetdata_grid.AutoSize(width)
+            if self.collection_module.datasetsdata_notebook.dataset_data_tabs[dataset_key].datasetdata_grid is not None:
+                self.collection_module.datasetsdata_notebook.dataset_data_tabs[dataset_key].datasetdata_grid.AutoSize(width)
         for sample_key in self.sampling_module.sample_panels:
             self.sampling_module.sample_panels[sample_key].parts_panel.parts_ctrl.AutoSize(width)
         for dataset_key in self.coding_module.coding_datasets_panels:
@@ -887,6 +898,8 @@ class MainFrame(wx.Frame):
         logger = logging.getLogger(__name__+".MainFrame.OnCloseEnd")
         logger.info("Starting")
 
+        self.StopPrefetchThread()
+
         #reset objects
         for key in list(self.theme_dialogs.keys()):
             self.theme_dialogs[key].Destroy()    
@@ -918,6 +931,8 @@ class MainFrame(wx.Frame):
         self.DocumentsUpdated(self)
         self.CodesUpdated()
 
+        Database.ClosePooledConnections()
+
         self.StepProgressDialog(GUIText.SHUTDOWN_BUSY_POOL_MSG)
         logger.info("Starting to shut down of process pool")
         self.pool.close()
@@ -930,6 +945,12 @@ class MainFrame(wx.Frame):
         for window in windows:
             window.Destroy()
 
+    def StopPrefetchThread(self):
+        #the prefetch thread reads the current workspace's files so it has to finish before the workspace is closed or replaced
+        if self.prefetch_thread is not None:
+            self.prefetch_thread.Stop()
+            self.prefetch_thread = None
+
     #Functions called by other modules
     def CreateProgressDialog(self, title, warning="", freeze=False):
         if freeze:
@@ -1242,6 +1263,21 @@ class OptionsDialog(wx.Dialog):
         multiprocessing_sizer.Add(multiprocessing_poolsize_sizer, 0, wx.EXPAND | wx.ALL, 5)
         sizer.Add(multiprocessing_sizer, 0, wx.EXPAND | wx.ALL, 5)
 
+        database_box = wx.StaticBox(self, label=GUIText.DATABASE_LABEL)
+        database_box.SetFont(main_frame.GROUP_LABEL_FONT)
+        database_sizer = wx.StaticBoxSizer(database_box, wx.VERTICAL)
+
+        database_profile_label = wx.StaticText(self, label=GUIText.DATABASE_PROFILE_LABEL + ": ")
+        self.database_profile_ctrl = wx.Choice(self, choices=[GUIText.DATABASE_PROFILES[profile] for profile in Constants.DATABASE_PROFILES_LIST])
+        self.database_profile_ctrl.SetToolTip(GUIText.DATABASE_PROFILE_TOOLTIP)
+        self.database_profile_ctrl.SetSelection(Constants.DATABASE_PROFILES_LIST.index(Database.connection_profile))
+        self.Bind(wx.EVT_CHOICE, self.ChangeDatabaseProfile, self.database_profile_ctrl)
+        database_profile_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        database_profile_sizer.Add(database_profile_label, 0, wx.ALIGN_CENTRE_VERTICAL)
+        database_profile_sizer.Add(self.database_profile_ctrl)
+        database_sizer.Add(database_profile_sizer, 0, wx.EXPAND | wx.ALL, 5)
+        sizer.Add(database_sizer, 0, wx.EXPAND | wx.ALL, 5)
+
         self.Fit()
 
     def ChangeMultipleDatasetMode(self, event):
@@ -1287,6 +1323,12 @@ class OptionsDialog(wx.Dialog):
             wx.MessageBox(GUIText.MULTIPROCESSING_WARNING_MSG)
             self.multiprocessing_poolsize_ctrl.SetValue(main_frame.pool_num)
 
+    def ChangeDatabaseProfile(self, event):
+        main_frame = wx.GetApp().GetTopWindow()
+        new_profile = Constants.DATABASE_PROFILES_LIST[self.database_profile_ctrl.GetSelection()]
+        main_frame.options_dict['database_profile'] = new_profile
+        Database.SetConnectionProfile(new_profile)
+
 class AboutDialog(wx.Dialog):
     def __init__(self, parent):
         wx.Dialog.__init__(self, parent, title=GUIText.ABOUT_LABEL, style=wx.DEFAULT_DIALOG_STYLE)
@@ -3,7 +3,7 @@ import os
 import re
 import psutil
 import tarfile
-from threading import Thread
+from threading import Thread, Event
 import shutil
 from datetime import datetime
 from packaging import version
@@ -19,6 +19,7 @@ import Common.Objects.Datasets as Datasets
 import Common.Objects.Samples as Samples
 import Common.Database as Database
 import Common.Objects.Codes as Codes
+from Common.Objects.Generic import OrderedSet
 
 # Thread class that executes processing
 class SaveThread(Thread):
@@ -56,10 +57,18 @@ class SaveThread(Thread):
             for key in self.datasets:
                 if isinstance(self.datasets[key], Datasets.Dataset):
                     dataset_filename = str(key)+".pk"
+                    data_filename = str(key)+"_data.pk"
                 existing_datasets.append(dataset_filename)
-                if self.datasets[key].last_changed_dt > self.last_load_dt:
+                existing_datasets.append(data_filename)
+                #data is saved to its own file, which is only rewritten when the data has changed,
+                #so that it can be loaded separately from the dataset when first accessed
+                data_changed = self.datasets[key].data_filename != self.current_workspace_path+"/Datasets/"+data_filename
+                if self.datasets[key].last_changed_dt > self.last_load_dt or data_changed:
                     if not self.autosave:
                         wx.PostEvent(self._notify_window, CustomEvents.ProgressEvent({'msg':GUIText.SAVE_BUSY_MSG_DATASETS+str(self.datasets[key].name)}))
+                    if data_changed:
+                        self.datasets[key].LoadData()
+                        self.datasets[key].SaveData(self.current_workspace_path+"/Datasets/"+data_filename)
                     with open(self.current_workspace_path+"/Datasets/"+dataset_filename, 'wb') as outfile:
                         pickle.dump(self.datasets[key], outfile)
             #remove any datasets that no longer exist
@@ -99,18 +108,24 @@ class SaveThread(Thread):
             with open(self.current_workspace_path+"/themes.pk", 'wb') as outfile:
                 pickle.dump(self.themes, outfile)
 
+            #make sure all database changes are in the database file before it is copied
+            Database.DatabaseConnection(self.current_workspace_path).Checkpoint()
+
             if not self.autosave:
                 wx.PostEvent(self._notify_window, CustomEvents.ProgressEvent({'msg':GUIText.SAVE_BUSY_MSG_COMPRESSING}))
                 logger.info("Archiving Files to tar")
+                #token sets captured for samples that are still generating are temporary and not part of the workspace
                 with tarfile.open(self.save_path, 'w') as tar_file:
-                    tar_file.add(self.current_workspace_path, arcname='.')
+                    tar_file.add(self.current_workspace_path, arcname='.',
+                                 filter=lambda tarinfo: None if tarinfo.name.endswith('.tokensets') else tarinfo)
                 with open(self.save_path + "_notes.txt", 'w') as text_file:
                     text_file.write(self.notes_text)
             else:
                 logger.info("Moving Files to autsave folder")
                 if os.path.exists(self.save_path):
                     shutil.rmtree(self.save_path)
-                shutil.copytree(self.current_workspace_path, self.save_path, dirs_exist_ok=True)
+                shutil.copytree(self.current_workspace_path, self.save_path, dirs_exist_ok=True,
+                                ignore=shutil.ignore_patterns('*.tokensets'))
 
         except (FileExistsError):
             wx.LogError(GUIText.SAVE_FAILURE + self.save_path)
@@ -183,10 +198,16 @@ class LoadThread(Thread):
                             dataset_filename = '_'.join(key)
                         else:
                             dataset_filename = key
+                        data_filename = dataset_filename + "_data.pk"
                         dataset_filename = dataset_filename + ".pk"
                         if os.path.isfile(self.current_workspace_path+"/Datasets/"+dataset_filename):
                             with open(self.current_workspace_path+"/Datasets/"+dataset_filename, 'rb') as infile:
                                 result['datasets'][key] = pickle.load(infile)
+                            #data saved in its own file is left to be loaded when first accessed or by DatasetsPrefetchThread
+                            if os.path.isfile(self.current_workspace_path+"/Datasets/"+data_filename):
+                                result['datasets'][key].data_filename = self.current_workspace_path+"/Datasets/"+data_filename
+                            else:
+                                result['datasets'][key].data_filename = None
                             wx.PostEvent(self._notify_window, CustomEvents.ProgressEvent({'msg':GUIText.LOAD_BUSY_MSG_DATASET_MSG+str(result['datasets'][key].name)}))
                         
 
@@ -216,6 +237,13 @@ class LoadThread(Thread):
                     with open(self.current_workspace_path+"/themes.pk", 'rb') as infile:
                         result['themes'] = pickle.load(infile)
             
+                #string_tokens saved before the vocabulary table existed and documents saved before their keys were stored by part
+                #need converting, and tables introduced since the workspace was saved need adding, before any other database upgrades use them
+                if os.path.isfile(os.path.join(self.current_workspace_path, "workspace_sqlite3.db")):
+                    db_conn = Database.DatabaseConnection(self.current_workspace_path)
+                    db_conn.UpgradeTables()
+                    del db_conn
+
                 if ver < version.parse('0.8.5'):
                     self.Upgrade0_8_5(result, ver)
                     ver = version.parse('0.8.5')
@@ -570,9 +598,9 @@ class LoadThread(Thread):
             result['samples'][new_key] = sample
             del result['samples'][old_key]
             #Update Selected Documents
-            new_selected_documents = []
+            new_selected_documents = OrderedSet()
             for doc_key in sample.selected_documents:
-                new_selected_documents.append(dataset.documents[doc_key]._uuid)
+                new_selected_documents.add(dataset.documents[doc_key]._uuid)
             sample.selected_documents = new_selected_documents
             #Update Field List
             if sample.fields_list != None:
@@ -621,9 +649,9 @@ class LoadThread(Thread):
                 field.key = field._uuid
                 dataset.available_fields[field.key] = field
             #Update Selected Documents
-            new_selected_documents = []
+            new_selected_documents = OrderedSet()
             for doc_key in dataset.selected_documents:
-                new_selected_documents.append(dataset.documents[doc_key]._uuid)
+                new_selected_documents.add(dataset.documents[doc_key]._uuid)
             dataset.selected_documents = new_selected_documents
             #Update Documents
             for old_doc_key in list(dataset.documents.keys()):
@@ -671,7 +699,6 @@ class LoadThread(Thread):
         def UpgradeDatabase(result, ver):
             wx.PostEvent(self._notify_window, CustomEvents.ProgressEvent({'msg':GUIText.UPGRADE_BUSY_MSG_DATABASE_MSG}))
             db_conn = Database.DatabaseConnection(self.current_workspace_path)
-            db_conn.Upgrade0_8_7()
             for dataset_key in result['datasets']:
                 db_conn.RefreshStringTokensIncluded(dataset_key)
                 db_conn.RefreshStringTokensRemoved(dataset_key)
@@ -685,4 +712,42 @@ class LoadThread(Thread):
             pool_num = 1
         else:
             pool_num = cpus-1
-        result['config']['pool_num'] = pool_num
\ No newline at end of file
+        result['config']['pool_num'] = pool_num
+
+class DatasetsPrefetchThread(Thread):
+    """Loads the data of a workspace's datasets in the background once the workspace is open
+    so that their data is usually already in memory when first viewed"""
+    def __init__(self, datasets):
+        Thread.__init__(self)
+        self.daemon = True
+        self.datasets = datasets
+        #set by Stop so that the thread finishes once the dataset it is loading is loaded
+        self.stop_event = Event()
+        self.start()
+
+    def Stop(self):
+        self.stop_event.set()
+        self.join()
+
+    def run(self):
+        logger = logging.getLogger(__name__+".DatasetsPrefetchThread.run")
+        logger.info("Starting")
+        #smallest datasets first so that as many as possible fit within the limit
+        data_sizes = []
+        for dataset in self.datasets:
+            if isinstance(dataset, Datasets.Dataset) and not dataset.data_loaded and dataset.data_filename is not None:
+                data_sizes.append((os.path.getsize(dataset.data_filename), dataset))
+        data_sizes.sort(key=lambda data_size: data_size[0])
+        total_size = 0
+        for data_size, dataset in data_sizes:
+            if self.stop_event.is_set():
+                logger.info("Stopped")
+                break
+            total_size = total_size + data_size
+            if total_size > Constants.DATASETS_PREFETCH_MAX_SIZE:
+                break
+            try:
+                dataset.LoadData()
+            except (OSError, pickle.UnpicklingError):
+                logger.exception("Failed to prefetch data of %s", repr(dataset))
+        logger.info("Finished")
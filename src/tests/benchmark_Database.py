@@ -0,0 +1,167 @@
+#benchmarks of the database's bulk operations on synthetic corpora, not collected by pytest
+#run from the src directory, for example:
+#   python tests/benchmark_Database.py tfidf --documents 10000 100000 1000000
+#   python tests/benchmark_Database.py insert --documents 10000 50000 100000 --existing-documents 200000
+#the database is prepared and each measured operation runs in processes of their own
+#so the reported peak memory is that of the operation and not of generating the corpus
+#peak memory is the process' maximum resident set size and is not available on Windows
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Common.Constants as Constants
+import Common.Database as Database
+
+POS = ["NOUN", "VERB", "ADJ", "ADV", "PROPN"]
+
+def PeakMemoryMB():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak/1024/1024
+    return peak/1024
+
+def CorpusTokens(document_keys, tokens_per_document, vocabulary_size, seed, word_prefix="word"):
+    #word frequencies roughly follow zipf's law like natural language
+    random.seed(seed)
+    words = [word_prefix+str(word_num) for word_num in range(vocabulary_size)]
+    weights = [1/(word_num+1) for word_num in range(vocabulary_size)]
+    tokens = {}
+    for document_key in document_keys:
+        document_words = random.choices(words, weights=weights, k=tokens_per_document)
+        tokens[document_key] = [(position, word, word[:-1], word[:-2], random.choice(POS), False)
+                                for position, word in enumerate(document_words)]
+    return tokens
+
+def CreateCorpus(workspace_path, num_of_documents, tokens_per_document, vocabulary_size, fields):
+    db_conn = Database.DatabaseConnection(workspace_path)
+    db_conn.Create()
+    db_conn.InsertDataset("dataset", "stem")
+    document_keys = [("CSV", "document", doc_num) for doc_num in range(num_of_documents)]
+    db_conn.InsertDocuments("dataset", document_keys)
+    for field_num, field_key in enumerate(fields):
+        db_conn.InsertField("dataset", field_key)
+        db_conn.InsertStringTokens("dataset", field_key, CorpusTokens(document_keys, tokens_per_document, vocabulary_size, field_num))
+    del db_conn
+
+def AddField(workspace_path, num_of_documents, tokens_per_document, vocabulary_size, field_key, word_prefix="word"):
+    db_conn = Database.DatabaseConnection(workspace_path)
+    document_keys = [("CSV", "document", doc_num) for doc_num in range(num_of_documents)]
+    db_conn.InsertField("dataset", field_key)
+    db_conn.InsertStringTokens("dataset", field_key, CorpusTokens(document_keys, tokens_per_document, vocabulary_size, 100, word_prefix))
+    del db_conn
+
+def MeasureTFIDF(workspace_path, new_field_keys, results):
+    db_conn = Database.DatabaseConnection(workspace_path)
+    start_time = time.perf_counter()
+    db_conn.UpdateStringTokensTFIDF("dataset", new_field_keys=new_field_keys)
+    results.put((time.perf_counter() - start_time, PeakMemoryMB()))
+
+def CreateEmptyField(workspace_path, num_of_documents, field_key, num_of_existing_documents, tokens_per_document, vocabulary_size):
+    #rebuilding the indexes also reindexes the tokens of the workspace's other datasets
+    if num_of_existing_documents > 0:
+        CreateCorpus(workspace_path, num_of_existing_documents, tokens_per_document, vocabulary_size, ["existing"])
+        db_conn = Database.DatabaseConnection(workspace_path)
+        db_conn.UpdateDatasetKey("dataset", "existing_dataset")
+    else:
+        db_conn = Database.DatabaseConnection(workspace_path)
+        db_conn.Create()
+    db_conn.InsertDataset("dataset", "stem")
+    db_conn.InsertDocuments("dataset", [("CSV", "document", doc_num) for doc_num in range(num_of_documents)])
+    db_conn.InsertField("dataset", field_key)
+    del db_conn
+
+def MeasureInsert(workspace_path, num_of_documents, tokens_per_document, vocabulary_size, field_key, rebuild_indexes, results):
+    #inserts the field's tokens a batch at a time the way tokenization writes them
+    document_keys = [("CSV", "document", doc_num) for doc_num in range(num_of_documents)]
+    tokens = CorpusTokens(document_keys, tokens_per_document, vocabulary_size, 0)
+    db_conn = Database.DatabaseConnection(workspace_path)
+    start_time = time.perf_counter()
+    if rebuild_indexes:
+        db_conn.DropStringTokensIndexes()
+    for batch_start in range(0, num_of_documents, Constants.TOKENIZATION_BATCH_SIZE):
+        batch_keys = document_keys[batch_start:batch_start+Constants.TOKENIZATION_BATCH_SIZE]
+        db_conn.InsertStringTokens("dataset", field_key, {document_key: tokens[document_key] for document_key in batch_keys})
+    if rebuild_indexes:
+        db_conn.CreateStringTokensIndexes()
+    results.put((time.perf_counter() - start_time, PeakMemoryMB()))
+
+def RunSetup(target, *args):
+    #a spawned process inherits its parent's peak memory so the parent must not generate corpora itself
+    process = multiprocessing.get_context('spawn').Process(target=target, args=args)
+    process.start()
+    process.join()
+
+def RunMeasurement(target, *args):
+    #the measured operation gets a fresh process so its peak memory is not mixed with the setup's
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=target, args=args+(results,))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+def PrintResult(label, num_of_documents, result):
+    elapsed_seconds, peak_memory = result
+    if peak_memory is None:
+        peak_str = "n/a"
+    else:
+        peak_str = str(round(peak_memory, 1))+" MB"
+    print(label.ljust(32)+str(num_of_documents).rjust(10)+" documents "+str(round(elapsed_seconds, 2)).rjust(10)+" s   peak "+peak_str)
+
+def BenchmarkTFIDF(args):
+    for num_of_documents in args.documents:
+        with tempfile.TemporaryDirectory() as workspace_path:
+            RunSetup(CreateCorpus, workspace_path, num_of_documents, args.tokens_per_document, args.vocabulary_size, ["f1"])
+            PrintResult("tf-idf full rebuild", num_of_documents,
+                        RunMeasurement(MeasureTFIDF, workspace_path, None))
+            RunSetup(AddField, workspace_path, num_of_documents, args.tokens_per_document//5, args.vocabulary_size, "f2")
+            PrintResult("tf-idf incremental new field", num_of_documents,
+                        RunMeasurement(MeasureTFIDF, workspace_path, ["f2"]))
+            #a field of a fixed number of documents with words of its own only changes the tf-idf of its own tokens
+            #while a field sharing the corpus' words changes every token of the words whose document frequency changed
+            RunSetup(AddField, workspace_path, min(num_of_documents, args.small_field_documents), args.tokens_per_document//5, args.vocabulary_size, "f3", "tag")
+            PrintResult("tf-idf incremental small field", num_of_documents,
+                        RunMeasurement(MeasureTFIDF, workspace_path, ["f3"]))
+
+def BenchmarkInsert(args):
+    for num_of_documents in args.documents:
+        for label, rebuild_indexes in [("insert keeping indexes", False), ("insert rebuilding indexes", True)]:
+            with tempfile.TemporaryDirectory() as workspace_path:
+                RunSetup(CreateEmptyField, workspace_path, num_of_documents, "f1", args.existing_documents, args.tokens_per_document, args.vocabulary_size)
+                PrintResult(label, num_of_documents,
+                            RunMeasurement(MeasureInsert, workspace_path, num_of_documents, args.tokens_per_document, args.vocabulary_size, "f1", rebuild_indexes))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the workspace database on synthetic corpora")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    tfidf_parser = subparsers.add_parser('tfidf', help="UpdateStringTokensTFIDF full rebuild and incremental update after adding a field")
+    tfidf_parser.add_argument('--documents', type=int, nargs='+', default=[10000, 100000])
+    tfidf_parser.add_argument('--tokens-per-document', type=int, default=50)
+    tfidf_parser.add_argument('--vocabulary-size', type=int, default=20000)
+    tfidf_parser.add_argument('--small-field-documents', type=int, default=1000, help="documents with tokens in the field added with words of its own")
+    tfidf_parser.set_defaults(function=BenchmarkTFIDF)
+
+    insert_parser = subparsers.add_parser('insert', help="InsertStringTokens of a new field with the word indexes kept or dropped and rebuilt afterwards")
+    insert_parser.add_argument('--documents', type=int, nargs='+', default=[10000, 50000, 100000])
+    insert_parser.add_argument('--existing-documents', type=int, default=0, help="documents of another dataset already in the workspace")
+    insert_parser.add_argument('--tokens-per-document', type=int, default=50)
+    insert_parser.add_argument('--vocabulary-size', type=int, default=20000)
+    insert_parser.set_defaults(function=BenchmarkInsert)
+
+    args = parser.parse_args()
+    args.function(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#benchmarks of Dataset's document lookups on synthetic datasets, not collected by pytest
+#run from the src directory, for example:
+#   python tests/benchmark_Datasets.py getdocument --documents 10000 100000
+#   python tests/benchmark_Datasets.py memory --documents 100000
+#the dataset is saved and loaded back without its data the way a workspace is opened
+#so the lookups show whether they wait for the data to be read from its file
+import argparse
+import gc
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Common.Objects.Datasets as Datasets
+
+def CreateDataset(num_of_documents, words_per_document):
+    dataset = Datasets.Dataset("dataset", "CSV", "document", "eng", {})
+    dataset.data = {("CSV", "document", doc_num): {"id": doc_num,
+                                                   "url": "https://example.com/"+str(doc_num),
+                                                   "text": " ".join("word"+str((doc_num+word_num)%1000) for word_num in range(words_per_document))}
+                    for doc_num in range(num_of_documents)}
+    return dataset
+
+def PrintResult(label, num_of_documents, elapsed_seconds, dataset):
+    print(label.ljust(34)+str(num_of_documents).rjust(10)+" documents "+str(round(elapsed_seconds, 3)).rjust(10)+" s   data loaded "+str(dataset.data_loaded))
+
+def BenchmarkGetDocument(args):
+    for num_of_documents in args.documents:
+        dataset = CreateDataset(num_of_documents, args.words_per_document)
+        doc_ids = list(dataset.data.keys())
+        start_time = time.perf_counter()
+        for doc_id in doc_ids:
+            dataset.GetDocument(doc_id)
+        PrintResult("GetDocument creating documents", num_of_documents, time.perf_counter() - start_time, dataset)
+
+        with tempfile.TemporaryDirectory() as data_path:
+            dataset.SaveData(os.path.join(data_path, "dataset.data"))
+            dataset = pickle.loads(pickle.dumps(dataset))
+            start_time = time.perf_counter()
+            for doc_id in doc_ids:
+                dataset.GetDocument(doc_id)
+            PrintResult("GetDocument existing documents", num_of_documents, time.perf_counter() - start_time, dataset)
+            start_time = time.perf_counter()
+            for doc_id in doc_ids:
+                dataset.GetDocument(doc_id)
+            PrintResult("GetDocument existing, data loaded" if dataset.data_loaded else "GetDocument existing, again", num_of_documents, time.perf_counter() - start_time, dataset)
+
+def CreateRedditData(num_of_documents):
+    #submissions with unique ids, urls and texts and authors, subreddits and flairs repeated across documents
+    random.seed(0)
+    authors = ["author"+str(author_num) for author_num in range(num_of_documents//20+1)]
+    subreddits = ["subreddit"+str(subreddit_num) for subreddit_num in range(20)]
+    flairs = ["flair"+str(flair_num) for flair_num in range(50)]
+    data = {}
+    for doc_num in range(num_of_documents):
+        document = {"id": "t3_"+str(doc_num),
+                    "url": "https://www.reddit.com/comments/"+str(doc_num),
+                    "title": "title "+str(doc_num),
+                    "selftext": "text of submission "+str(doc_num),
+                    "author": random.choice(authors),
+                    "subreddit": random.choice(subreddits),
+                    "created_utc": 1600000000.0+doc_num,
+                    "score": random.randint(0, 1000),
+                    "num_comments": random.randint(0, 100),
+                    "data_source": "Reddit",
+                    "data_type": "submission"}
+        if random.random() < 0.7:
+            document["link_flair_text"] = random.choice(flairs)
+        data[("Reddit", "submission", "t3_"+str(doc_num))] = document
+    return data
+
+def MeasureLoadedMemory(data):
+    #memory held by the data once it is loaded back from its pickle, including its strings, the way a workspace's data is read
+    pickled_data = pickle.dumps(data)
+    gc.collect()
+    tracemalloc.start()
+    loaded_data = pickle.loads(pickled_data)
+    gc.collect()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del loaded_data
+    return memory/1024/1024
+
+def BenchmarkMemory(args):
+    for num_of_documents in args.documents:
+        data = CreateRedditData(num_of_documents)
+        print("dicts of documents".ljust(34)+str(num_of_documents).rjust(10)+" documents "+str(round(MeasureLoadedMemory(data), 1)).rjust(10)+" MB")
+        print("DatasetData".ljust(34)+str(num_of_documents).rjust(10)+" documents "+str(round(MeasureLoadedMemory(Datasets.DatasetData(data)), 1)).rjust(10)+" MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of datasets' document lookups on synthetic datasets")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    getdocument_parser = subparsers.add_parser('getdocument', help="GetDocument for every document of a dataset whose data has not been loaded")
+    getdocument_parser.add_argument('--documents', type=int, nargs='+', default=[10000, 100000])
+    getdocument_parser.add_argument('--words-per-document', type=int, default=50)
+    getdocument_parser.set_defaults(function=BenchmarkGetDocument)
+
+    memory_parser = subparsers.add_parser('memory', help="memory of a Reddit dataset's data loaded as dicts of documents and as DatasetData")
+    memory_parser.add_argument('--documents', type=int, nargs='+', default=[100000])
+    memory_parser.set_defaults(function=BenchmarkMemory)
+
+    args = parser.parse_args()
+    args.function(args)
+
+if __name__ == '__main__':
+    main()
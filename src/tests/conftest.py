@@ -0,0 +1,5 @@
+import os
+import sys
+
+#modules are imported relative to src, the same way the toolkit runs
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
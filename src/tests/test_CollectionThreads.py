@@ -0,0 +1,31 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("dateparser")
+pytest.importorskip("wx")
+pytest.importorskip("tweepy")
+
+import Common.Constants as Constants
+import Collection.CollectionThreads as CollectionThreads
+
+def CreateCSVThread():
+    #the thread starts itself when constructed so set up only what parsing needs
+    thread = CollectionThreads.RetrieveCSVDatasetThread.__new__(CollectionThreads.RetrieveCSVDatasetThread)
+    thread.datetime_field = "created"
+    thread.datetime_tz = "UTC"
+    thread.datetime_cache = {}
+    return thread
+
+def test_ParseDatetimeColumn():
+    thread = CreateCSVThread()
+    chunk = pd.DataFrame({"created": ["2020-01-01 10:00:00", "", "March 3, 2019 4:05 PM", "2020-01-01 10:00:00"]})
+    assert thread.ParseDatetimeColumn(chunk) == [1577872800.0, 0, 1551629100.0, 1577872800.0]
+
+def test_ParseDatetimeColumn_after_cache_eviction(monkeypatch):
+    monkeypatch.setattr(Constants, "CSV_DATETIME_CACHE_SIZE", 3)
+    thread = CreateCSVThread()
+    first_chunk = pd.DataFrame({"created": ["2020-01-01 10:00:00", "2020-01-02 10:00:00"]})
+    second_chunk = pd.DataFrame({"created": ["2020-01-01 10:00:00", "2020-01-03 10:00:00", "2020-01-04 10:00:00"]})
+    assert thread.ParseDatetimeColumn(first_chunk) == [1577872800.0, 1577959200.0]
+    assert thread.ParseDatetimeColumn(second_chunk) == [1577872800.0, 1578045600.0, 1578132000.0]
+    assert len(thread.datetime_cache) <= 3
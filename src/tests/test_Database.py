@@ -0,0 +1,645 @@
+import math
+import os
+import random
+import sqlite3
+import threading
+
+import pytest
+
+import Common.Constants as Constants
+import Common.Database as Database
+from Common.GUIText import Filtering as GUITextFiltering
+
+ANY = Constants.FILTER_RULE_ANY
+
+#text, stem, lemma, spacy_stopword
+WORDS = [("run", "run", "run", False),
+         ("running", "run", "run", False),
+         ("runs", "run", "run", False),
+         ("ran", "ran", "run", False),
+         ("cat", "cat", "cat", False),
+         ("cats", "cat", "cat", False),
+         ("blue", "blue", "blue", False),
+         ("the", "the", "the", True),
+         ("a", "a", "a", True),
+         ("of", "of", "of", True)]
+POS = ["NOUN", "VERB", "ADJ"]
+FIELDS = ["f1", "f2"]
+
+def CreateDatabase(workspace_path, token_type, seed, num_of_docs=40, fields=FIELDS):
+    random.seed(seed)
+    db_conn = Database.DatabaseConnection(str(workspace_path))
+    db_conn.Create()
+    db_conn.InsertDataset("dataset", token_type)
+    document_keys = [("CSV", "document", doc_num) for doc_num in range(num_of_docs)]
+    db_conn.InsertDocuments("dataset", document_keys)
+    for field_key in fields:
+        InsertFieldTokens(db_conn, field_key, document_keys)
+    db_conn.UpdateStringTokensTFIDF("dataset")
+    return db_conn
+
+def InsertFieldTokens(db_conn, field_key, document_keys):
+    db_conn.InsertField("dataset", field_key)
+    tokens = {}
+    for document_key in document_keys:
+        tokens[document_key] = []
+        for position in range(random.randint(0, 12)):
+            text, stem, lemma, stopword = random.choice(WORDS)
+            tokens[document_key].append((position, text, stem, lemma, random.choice(POS), stopword))
+    db_conn.InsertStringTokens("dataset", field_key, tokens)
+
+def ReadTokens(workspace_path, token_type):
+    conn = sqlite3.connect(os.path.join(str(workspace_path), "workspace_sqlite3.db"))
+    word_column = token_type if token_type in ('stem', 'lemma') else 'text'
+    sql_select_tokens = """SELECT string_tokens.id,
+                                  fields.field_key,
+                                  string_tokens.document_id,
+                                  words.term,
+                                  pos.term,
+                                  string_tokens.spacy_stopword,
+                                  string_tokens."""+word_column+"""_tfidf,
+                                  string_tokens.included
+                           FROM string_tokens
+                           JOIN fields ON fields.id = string_tokens.field_id
+                           JOIN vocabulary AS words ON words.id = string_tokens."""+word_column+"""_id
+                           JOIN vocabulary AS pos ON pos.id = string_tokens.pos_id
+                           ORDER BY string_tokens.id
+                           """
+    tokens = [{'id': row[0], 'field': row[1], 'document': row[2], 'word': row[3], 'pos': row[4],
+               'stopword': row[5], 'tfidf': row[6], 'included': row[7]}
+              for row in conn.execute(sql_select_tokens)]
+    conn.close()
+    return tokens
+
+def ReadSummary(workspace_path, summary_table):
+    conn = sqlite3.connect(os.path.join(str(workspace_path), "workspace_sqlite3.db"))
+    rows = conn.execute("SELECT words, pos, num_of_words, num_of_docs, tfidf_range_min, tfidf_range_max FROM "+summary_table).fetchall()
+    conn.close()
+    return sorted(rows)
+
+#reference implementation of how rule lists were applied before they were compiled into combined updates
+#consecutive rules with the same action are applied together, each group only changes tokens with the opposite included value
+def BaselineApplyRules(tokens, rules, reset):
+    if reset:
+        for token in tokens:
+            token['included'] = 1
+
+    def Matches(rule, token):
+        field, word, pos, action = rule
+        if word != ANY and token['word'] != word:
+            return False
+        if pos != ANY and token['pos'] != pos:
+            return False
+        if field != ANY and token['field'] != field:
+            return False
+        if action in (Constants.FILTER_RULE_REMOVE_SPACY_AUTO_STOPWORDS, Constants.FILTER_RULE_INCLUDE_SPACY_AUTO_STOPWORDS) and not token['stopword']:
+            return False
+        return True
+
+    def PercentRanks(descending):
+        #PERCENT_RANK() over all tokens ordered by tf-idf, NULL is first when ascending and last when descending
+        def SortKey(token):
+            if token['tfidf'] is None:
+                return (1,) if descending else (0,)
+            return (0, -token['tfidf']) if descending else (1, token['tfidf'])
+        keys = sorted(SortKey(token) for token in tokens)
+        first_positions = {}
+        for position, key in enumerate(keys):
+            first_positions.setdefault(key, position)
+        if len(tokens) > 1:
+            return {token['id']: first_positions[SortKey(token)]/(len(tokens)-1) for token in tokens}
+        return {token['id']: 0 for token in tokens}
+
+    def ApplyGroup(action, group):
+        if action in (Constants.FILTER_RULE_REMOVE, Constants.FILTER_RULE_INCLUDE):
+            apply_to_included = 1 if action == Constants.FILTER_RULE_REMOVE else 0
+            for token in tokens:
+                if token['included'] == apply_to_included and any(Matches(rule, token) for rule in group):
+                    token['included'] = 1 - apply_to_included
+        elif action[0] in (Constants.FILTER_TFIDF_REMOVE, Constants.FILTER_TFIDF_INCLUDE):
+            apply_to_included = 1 if action[0] == Constants.FILTER_TFIDF_REMOVE else 0
+            ranks = PercentRanks(action[1] == Constants.FILTER_TFIDF_UPPER)
+            for token in tokens:
+                if token['included'] == apply_to_included and ranks[token['id']] < action[2]/100 \
+                   and any(Matches(rule, token) for rule in group):
+                    token['included'] = 1 - apply_to_included
+        else:
+            apply_to_included = 1 if action[0] == Constants.FILTER_RULE_REMOVE else 0
+            candidates = [token for token in tokens
+                          if token['included'] == apply_to_included and any(Matches(rule, token) for rule in group)]
+            counts = {}
+            for token in candidates:
+                counts.setdefault((token['word'], token['pos']), []).append(token)
+            if action[1] in (Constants.TOKEN_NUM_WORDS, Constants.TOKEN_PER_WORDS):
+                counts = {key: len(key_tokens) for key, key_tokens in counts.items()}
+            else:
+                counts = {key: len(set(token['document'] for token in key_tokens)) for key, key_tokens in counts.items()}
+            if action[1] == Constants.TOKEN_PER_WORDS:
+                threshold = action[3]/100*len(tokens)
+            elif action[1] == Constants.TOKEN_PER_DOCS:
+                threshold = action[3]/100*len(set(token['document'] for token in tokens))
+            else:
+                threshold = action[3]
+            compare = {">": lambda a, b: a > b, ">=": lambda a, b: a >= b, "=": lambda a, b: a == b,
+                       "<=": lambda a, b: a <= b, "<": lambda a, b: a < b}[action[2]]
+            for token in candidates:
+                if compare(counts[(token['word'], token['pos'])], threshold):
+                    token['included'] = 1 - apply_to_included
+
+    group_action = None
+    group = []
+    for rule in rules:
+        action = rule[3]
+        if action == Constants.FILTER_RULE_REMOVE_SPACY_AUTO_STOPWORDS:
+            action = Constants.FILTER_RULE_REMOVE
+        elif action == Constants.FILTER_RULE_INCLUDE_SPACY_AUTO_STOPWORDS:
+            action = Constants.FILTER_RULE_INCLUDE
+        if action != group_action and len(group) > 0:
+            ApplyGroup(group_action, group)
+            group = []
+        group_action = action
+        group.append(rule)
+    if len(group) > 0:
+        ApplyGroup(group_action, group)
+
+def BaselineSummary(tokens, included):
+    summary = {}
+    for token in tokens:
+        if token['included'] == included:
+            summary.setdefault((token['word'], token['pos']), []).append(token)
+    rows = []
+    for (word, pos), word_tokens in summary.items():
+        tfidfs = [token['tfidf'] for token in word_tokens if token['tfidf'] is not None]
+        rows.append((word, pos, len(word_tokens), len(set(token['document'] for token in word_tokens)),
+                     round(min(tfidfs), 4) if tfidfs else None, round(max(tfidfs), 4) if tfidfs else None))
+    return sorted(rows)
+
+def RandomRule(words, allow_tfidf):
+    field = random.choice(FIELDS + [ANY, ANY])
+    word = random.choice(words + [ANY, ANY, ANY])
+    pos = random.choice(POS + [ANY, ANY])
+    kind = random.choice(["static", "static", "stopword", "count"] + (["tfidf"] if allow_tfidf else []))
+    remove = random.random() < 0.6
+    if kind == "static":
+        action = Constants.FILTER_RULE_REMOVE if remove else Constants.FILTER_RULE_INCLUDE
+    elif kind == "stopword":
+        action = Constants.FILTER_RULE_REMOVE_SPACY_AUTO_STOPWORDS if remove else Constants.FILTER_RULE_INCLUDE_SPACY_AUTO_STOPWORDS
+    elif kind == "count":
+        count_type = random.choice([Constants.TOKEN_NUM_WORDS, Constants.TOKEN_PER_WORDS, Constants.TOKEN_NUM_DOCS, Constants.TOKEN_PER_DOCS])
+        if count_type in (Constants.TOKEN_PER_WORDS, Constants.TOKEN_PER_DOCS):
+            number = random.choice([1, 5, 10, 25])
+        else:
+            number = random.choice([1, 3, 5, 10, 20])
+        action = (Constants.FILTER_RULE_REMOVE if remove else Constants.FILTER_RULE_INCLUDE,
+                  count_type, random.choice([">", ">=", "=", "<=", "<"]), number)
+    else:
+        action = (Constants.FILTER_TFIDF_REMOVE if remove else Constants.FILTER_TFIDF_INCLUDE,
+                  random.choice([Constants.FILTER_TFIDF_LOWER, Constants.FILTER_TFIDF_UPPER]),
+                  random.choice([5, 10, 25, 50, 90]))
+        field, word, pos = ANY, ANY, ANY
+    return (field, word, pos, action)
+
+def AssertMatchesBaseline(workspace_path, token_type, db_conn, tokens):
+    assert [(token['id'], token['included']) for token in ReadTokens(workspace_path, token_type)] \
+           == [(token['id'], token['included']) for token in tokens]
+    db_conn.RefreshStringTokensIncluded("dataset")
+    db_conn.RefreshStringTokensRemoved("dataset")
+    assert ReadSummary(workspace_path, "string_tokens_included") == BaselineSummary(tokens, 1)
+    assert ReadSummary(workspace_path, "string_tokens_removed") == BaselineSummary(tokens, 0)
+
+@pytest.mark.parametrize("token_type", ["text", "stem", "lemma"])
+@pytest.mark.parametrize("allow_tfidf", [False, True])
+def test_ApplyAllDatasetRules_matches_baseline(tmp_path, token_type, allow_tfidf):
+    db_conn = CreateDatabase(tmp_path, token_type, seed=1)
+    tokens = ReadTokens(tmp_path, token_type)
+    words = sorted(set(token['word'] for token in tokens))
+    for seed in range(15):
+        random.seed(seed)
+        rules = [RandomRule(words, allow_tfidf) for rule_num in range(random.randint(1, 10))]
+        db_conn.ApplyAllDatasetRules("dataset", rules)
+        BaselineApplyRules(tokens, rules, True)
+        AssertMatchesBaseline(tmp_path, token_type, db_conn, tokens)
+
+@pytest.mark.parametrize("token_type", ["text", "stem"])
+@pytest.mark.parametrize("allow_tfidf", [False, True])
+def test_ApplyNewDatasetRules_matches_baseline(tmp_path, token_type, allow_tfidf):
+    db_conn = CreateDatabase(tmp_path, token_type, seed=2)
+    tokens = ReadTokens(tmp_path, token_type)
+    words = sorted(set(token['word'] for token in tokens))
+    random.seed(100)
+    rules = [RandomRule(words, False) for rule_num in range(4)]
+    db_conn.ApplyAllDatasetRules("dataset", rules)
+    BaselineApplyRules(tokens, rules, True)
+    for seed in range(10):
+        random.seed(seed)
+        new_rules = [RandomRule(words, allow_tfidf) for rule_num in range(random.randint(1, 4))]
+        db_conn.ApplyNewDatasetRules("dataset", new_rules)
+        BaselineApplyRules(tokens, new_rules, False)
+        AssertMatchesBaseline(tmp_path, token_type, db_conn, tokens)
+
+@pytest.mark.parametrize("token_type", ["text", "lemma"])
+@pytest.mark.parametrize("allow_tfidf", [False, True])
+def test_EstimateNewDatasetRule_matches_baseline(tmp_path, token_type, allow_tfidf):
+    db_conn = CreateDatabase(tmp_path, token_type, seed=3)
+    tokens = ReadTokens(tmp_path, token_type)
+    words = sorted(set(token['word'] for token in tokens))
+    random.seed(200)
+    rules = [RandomRule(words, allow_tfidf) for rule_num in range(4)]
+    db_conn.ApplyAllDatasetRules("dataset", rules)
+    BaselineApplyRules(tokens, rules, True)
+    conn = db_conn._DatabaseConnection__conn
+    for seed in range(20):
+        random.seed(seed)
+        new_rule = RandomRule(words, True)
+        total_changes = conn.total_changes
+        counts = db_conn.EstimateNewDatasetRule("dataset", new_rule)
+        #estimating only reads so nothing is written and no transaction is left open
+        assert conn.total_changes == total_changes
+        assert not conn.in_transaction
+        estimated_tokens = [dict(token) for token in tokens]
+        BaselineApplyRules(estimated_tokens, [new_rule], False)
+        changed = [token for token, estimated_token in zip(tokens, estimated_tokens) if token['included'] != estimated_token['included']]
+        if 'unavailable' in counts:
+            assert counts['unavailable'] == GUITextFiltering.FILTERS_CREATE_RULE_PREVIEW_UNAVAILABLE
+            assert isinstance(new_rule[3], tuple) and new_rule[3][0] in (Constants.FILTER_RULE_REMOVE, Constants.FILTER_RULE_INCLUDE)
+            continue
+        assert counts == {'tokens': len(changed),
+                          'unique_tokens': len(set((token['word'], token['pos']) for token in changed)),
+                          'documents': len(set(token['document'] for token in changed))}
+
+def test_EstimateNewDatasetRule_unavailable_reasons(tmp_path):
+    db_conn = CreateDatabase(tmp_path, "text", seed=4)
+    rule = (ANY, "cat", ANY, Constants.FILTER_RULE_REMOVE)
+    count_rule = (ANY, ANY, ANY, (Constants.FILTER_RULE_REMOVE, Constants.TOKEN_NUM_WORDS, ">", 5))
+    #groups are only built when rules are applied
+    assert db_conn.EstimateNewDatasetRule("dataset", rule) == {'unavailable': GUITextFiltering.FILTERS_CREATE_RULE_PREVIEW_NOT_READY}
+    conn = sqlite3.connect(os.path.join(str(tmp_path), "workspace_sqlite3.db"))
+    assert conn.execute("SELECT COUNT(*) FROM string_tokens_groups").fetchone()[0] == 0
+    #tf-idf rules leave groups only partly included which count rules can not be estimated from
+    db_conn.ApplyAllDatasetRules("dataset", [(ANY, ANY, ANY, (Constants.FILTER_TFIDF_REMOVE, Constants.FILTER_TFIDF_LOWER, 50))])
+    assert 'unavailable' not in db_conn.EstimateNewDatasetRule("dataset", rule)
+    assert db_conn.EstimateNewDatasetRule("dataset", count_rule) == {'unavailable': GUITextFiltering.FILTERS_CREATE_RULE_PREVIEW_UNAVAILABLE}
+    conn.execute("DROP TABLE string_tokens_postings")
+    conn.commit()
+    conn.close()
+    db_conn.ApplyAllDatasetRules("dataset", [])
+    assert db_conn.EstimateNewDatasetRule("dataset", rule) == {'unavailable': GUITextFiltering.FILTERS_CREATE_RULE_PREVIEW_FAILED}
+
+def test_ApplyAllDatasetRules_last_rule_wins(tmp_path):
+    db_conn = CreateDatabase(tmp_path, "text", seed=3)
+    rules = [(ANY, ANY, ANY, Constants.FILTER_RULE_REMOVE),
+             (ANY, "cat", ANY, Constants.FILTER_RULE_INCLUDE),
+             ("f1", "cat", "NOUN", Constants.FILTER_RULE_REMOVE),
+             (ANY, "cats", ANY, Constants.FILTER_RULE_INCLUDE),
+             (ANY, ANY, ANY, Constants.FILTER_RULE_REMOVE_SPACY_AUTO_STOPWORDS),
+             (ANY, ANY, ANY, (Constants.FILTER_RULE_INCLUDE, Constants.TOKEN_NUM_DOCS, ">=", 5))]
+    tokens = ReadTokens(tmp_path, "text")
+    db_conn.ApplyAllDatasetRules("dataset", rules)
+    BaselineApplyRules(tokens, rules, True)
+    AssertMatchesBaseline(tmp_path, "text", db_conn, tokens)
+
+def test_UpdateStringTokensTFIDF_matches_reference(tmp_path):
+    #the tf-idf of a term in a document is its number of tokens in the document times log(documents/documents containing the term)
+    random.seed(6)
+    db_conn = Database.DatabaseConnection(str(tmp_path))
+    db_conn.Create()
+    db_conn.InsertDataset("dataset", "text")
+    document_keys = [("CSV", "document", doc_num) for doc_num in range(30)]
+    db_conn.InsertDocuments("dataset", document_keys)
+    tokens = {}
+    for field_key in FIELDS:
+        db_conn.InsertField("dataset", field_key)
+        field_tokens = {}
+        for document_key in document_keys:
+            field_tokens[document_key] = []
+            for position in range(random.randint(0, 12)):
+                text, stem, lemma, stopword = random.choice(WORDS)
+                field_tokens[document_key].append((position, text, stem, lemma, random.choice(POS), stopword))
+                tokens[(field_key, document_key[2], position)] = (document_key[2], (text, stem, lemma))
+        db_conn.InsertStringTokens("dataset", field_key, field_tokens)
+    db_conn.UpdateStringTokensTFIDF("dataset")
+
+    expected = {}
+    for type_num in range(3):
+        term_counts = {}
+        for document_num, terms in tokens.values():
+            term_counts.setdefault(terms[type_num], {}).setdefault(document_num, 0)
+            term_counts[terms[type_num]][document_num] += 1
+        for key, (document_num, terms) in tokens.items():
+            document_counts = term_counts[terms[type_num]]
+            expected.setdefault(key, []).append(document_counts[document_num]*math.log(len(document_keys)/len(document_counts)))
+
+    conn = sqlite3.connect(os.path.join(str(tmp_path), "workspace_sqlite3.db"))
+    document_nums = {row[0]: document_num for document_num, row in enumerate(conn.execute("SELECT id FROM documents ORDER BY id"))}
+    sql_select_tfidf = """SELECT fields.field_key,
+                                 string_tokens.document_id,
+                                 string_tokens.position,
+                                 string_tokens.text_tfidf,
+                                 string_tokens.stem_tfidf,
+                                 string_tokens.lemma_tfidf
+                          FROM string_tokens
+                          JOIN fields ON fields.id = string_tokens.field_id
+                          """
+    stored = {(row[0], document_nums[row[1]], row[2]): list(row[3:]) for row in conn.execute(sql_select_tfidf)}
+    conn.close()
+    assert stored.keys() == expected.keys()
+    for key in expected:
+        assert stored[key] == pytest.approx(expected[key])
+
+def ReadTFIDF(workspace_path):
+    conn = sqlite3.connect(os.path.join(str(workspace_path), "workspace_sqlite3.db"))
+    sql_select_tfidf = """SELECT fields.field_key,
+                                 string_tokens.document_id,
+                                 string_tokens.position,
+                                 string_tokens.text_tfidf,
+                                 string_tokens.stem_tfidf,
+                                 string_tokens.lemma_tfidf
+                          FROM string_tokens
+                          JOIN fields ON fields.id = string_tokens.field_id
+                          """
+    tfidf = {row[:3]: row[3:] for row in conn.execute(sql_select_tfidf)}
+    counts = conn.execute("SELECT token_type, tfidf, token_count FROM string_tokens_tfidf_counts").fetchall()
+    conn.close()
+    return tfidf, sorted(counts, key=lambda row: (row[0], row[1] is not None, row[1]))
+
+def AssertTFIDFEqual(incremental, rebuilt):
+    incremental_tfidf, incremental_counts = incremental
+    rebuilt_tfidf, rebuilt_counts = rebuilt
+    assert incremental_tfidf.keys() == rebuilt_tfidf.keys()
+    for key in rebuilt_tfidf:
+        assert incremental_tfidf[key] == pytest.approx(rebuilt_tfidf[key])
+    assert len(incremental_counts) == len(rebuilt_counts)
+    for incremental_row, rebuilt_row in zip(incremental_counts, rebuilt_counts):
+        assert incremental_row[0] == rebuilt_row[0]
+        assert incremental_row[1] == pytest.approx(rebuilt_row[1])
+        assert incremental_row[2] == rebuilt_row[2]
+
+#tf-idf is updated for only the changed tokens (1) or rewritten for all tokens from the persisted term counts (0)
+@pytest.mark.parametrize("max_changed", [0, 1])
+def test_UpdateStringTokensTFIDF_new_fields_match_rebuild(tmp_path, monkeypatch, max_changed):
+    monkeypatch.setattr(Constants, "TFIDF_INCREMENTAL_MAX_CHANGED", max_changed)
+    incremental_path = tmp_path / "incremental"
+    rebuilt_path = tmp_path / "rebuilt"
+    incremental_path.mkdir()
+    rebuilt_path.mkdir()
+    document_keys = [("CSV", "document", doc_num) for doc_num in range(40)]
+
+    db_conn = CreateDatabase(incremental_path, "stem", seed=4, fields=["f1"])
+    InsertFieldTokens(db_conn, "f2", document_keys)
+    InsertFieldTokens(db_conn, "f3", document_keys)
+    db_conn.UpdateStringTokensTFIDF("dataset", new_field_keys=["f2", "f3"])
+
+    CreateDatabase(rebuilt_path, "stem", seed=4, fields=["f1", "f2", "f3"])
+    AssertTFIDFEqual(ReadTFIDF(incremental_path), ReadTFIDF(rebuilt_path))
+
+@pytest.mark.parametrize("max_changed", [0, 1])
+def test_DeleteField_tfidf_matches_rebuild(tmp_path, monkeypatch, max_changed):
+    monkeypatch.setattr(Constants, "TFIDF_INCREMENTAL_MAX_CHANGED", max_changed)
+    incremental_path = tmp_path / "incremental"
+    rebuilt_path = tmp_path / "rebuilt"
+    incremental_path.mkdir()
+    rebuilt_path.mkdir()
+
+    db_conn = CreateDatabase(incremental_path, "lemma", seed=5)
+    db_conn.DeleteField("dataset", "f2")
+    #removing a field retokenizes the dataset's remaining fields with no new fields
+    db_conn.UpdateStringTokensTFIDF("dataset", new_field_keys=[])
+
+    db_conn = CreateDatabase(rebuilt_path, "lemma", seed=5)
+    db_conn.DeleteField("dataset", "f2", update_tfidf=False)
+    db_conn.UpdateStringTokensTFIDF("dataset")
+    AssertTFIDFEqual(ReadTFIDF(incremental_path), ReadTFIDF(rebuilt_path))
+
+def CreateDatabase0_8_6(workspace_path, seed, num_of_docs=30):
+    #tables as saved by version 0.8.6, before the vocabulary, document key parts and token groups existed
+    random.seed(seed)
+    conn = sqlite3.connect(os.path.join(str(workspace_path), "workspace_sqlite3.db"))
+    conn.execute("CREATE TABLE datasets (id INTEGER PRIMARY KEY, dataset_key TEXT UNIQUE, token_type TEXT)")
+    conn.execute("""CREATE TABLE fields (id INTEGER PRIMARY KEY, dataset_id, INTEGER, field_key TEXT, position INT,
+                                         FOREIGN KEY(dataset_id) REFERENCES datasets(id) ON UPDATE CASCADE ON DELETE CASCADE,
+                                         UNIQUE(dataset_id, field_key))""")
+    conn.execute("""CREATE TABLE documents (id INTEGER PRIMARY KEY, dataset_id, INTEGER, document_key TEXT,
+                                            FOREIGN KEY(dataset_id) REFERENCES datasets(id) ON UPDATE CASCADE ON DELETE CASCADE,
+                                            UNIQUE(dataset_id, document_key))""")
+    conn.execute("""CREATE TABLE string_tokens (id integer PRIMARY KEY, dataset_id INTEGER, field_id INTEGER, document_id INTEGER, position INT,
+                                                text TEXT, stem TEXT, lemma TEXT, pos TEXT, spacy_stopword BOOLEAN,
+                                                text_tfidf FLOAT, stem_tfidf FLOAT, lemma_tfidf FLOAT, included BOOLEAN DEFAULT 1,
+                                                FOREIGN KEY(dataset_id) REFERENCES datasets(id) ON UPDATE CASCADE ON DELETE CASCADE,
+                                                FOREIGN KEY(field_id) REFERENCES fields(id) ON UPDATE CASCADE ON DELETE CASCADE,
+                                                FOREIGN KEY(document_id) REFERENCES documents(id) ON UPDATE CASCADE ON DELETE CASCADE)""")
+    conn.execute("CREATE INDEX string_tokens_text_index ON string_tokens(dataset_id, text, document_id)")
+    conn.execute("CREATE INDEX string_tokens_included_index ON string_tokens(dataset_id, included)")
+    for summary_table in ["string_tokens_included", "string_tokens_removed"]:
+        conn.execute("""CREATE TABLE """+summary_table+""" (id INTEGER PRIMARY KEY, dataset_id INTEGER, words TEXT, pos TEXT,
+                                                            num_of_words, INTEGER, num_of_docs INTEGER, spacy_stopword BOOLEAN,
+                                                            tfidf_range_min FLOAT, tfidf_range_max FLOAT,
+                                                            FOREIGN KEY(dataset_id) REFERENCES datasets(id) ON UPDATE CASCADE ON DELETE CASCADE)""")
+        #summaries were left from before the workspace was saved
+        conn.execute("INSERT INTO "+summary_table+" (dataset_id, words, pos, num_of_words, num_of_docs) VALUES (1, 'stale', 'NOUN', 1, 1)")
+    conn.execute("INSERT INTO datasets (id, dataset_key, token_type) VALUES (1, 'dataset', 'text')")
+    for field_num, field_key in enumerate(FIELDS):
+        conn.execute("INSERT INTO fields (id, dataset_id, field_key) VALUES (?, 1, ?)", (field_num+1, field_key))
+    for doc_num in range(num_of_docs):
+        conn.execute("INSERT INTO documents (id, dataset_id, document_key) VALUES (?, 1, ?)", (doc_num+1, str(("CSV", "document", doc_num))))
+        for field_num in range(len(FIELDS)):
+            for position in range(random.randint(0, 10)):
+                text, stem, lemma, stopword = random.choice(WORDS)
+                tfidf = round(random.random(), 3)
+                conn.execute("""INSERT INTO string_tokens (dataset_id, field_id, document_id, position, text, stem, lemma, pos, spacy_stopword,
+                                                           text_tfidf, stem_tfidf, lemma_tfidf, included)
+                                VALUES (1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                             (field_num+1, doc_num+1, position, text, stem, lemma, random.choice(POS), stopword,
+                              tfidf, tfidf, tfidf, int(random.random() < 0.7)))
+    conn.commit()
+    conn.close()
+
+def test_Upgrade0_8_7_refreshes_summaries_of_0_8_6_workspace(tmp_path):
+    CreateDatabase0_8_6(tmp_path, seed=6)
+    #the same database steps as loading a workspace saved by 0.8.6
+    db_conn = Database.DatabaseConnection(str(tmp_path))
+    db_conn.UpgradeTables()
+    db_conn.RefreshStringTokensIncluded("dataset")
+    db_conn.RefreshStringTokensRemoved("dataset")
+    tokens = ReadTokens(tmp_path, "text")
+    assert len(tokens) > 0
+    assert ReadSummary(tmp_path, "string_tokens_included") == BaselineSummary(tokens, 1)
+    assert ReadSummary(tmp_path, "string_tokens_removed") == BaselineSummary(tokens, 0)
+
+def test_UpgradeTables_drops_summary_document_ids(tmp_path):
+    #summaries of workspaces saved by versions from 0.8.7 stored every document of each word as text
+    CreateDatabase(tmp_path, "text", seed=7)
+    conn = sqlite3.connect(os.path.join(str(tmp_path), "workspace_sqlite3.db"))
+    for summary_table in ["string_tokens_included", "string_tokens_removed"]:
+        conn.execute("ALTER TABLE "+summary_table+" ADD COLUMN document_ids text")
+        conn.execute("INSERT INTO "+summary_table+" (dataset_id, words, pos, document_ids) VALUES (1, 'stale', 'NOUN', '1,2,3')")
+    conn.commit()
+    conn.close()
+    db_conn = Database.DatabaseConnection(str(tmp_path))
+    db_conn.UpgradeTables()
+    conn = sqlite3.connect(os.path.join(str(tmp_path), "workspace_sqlite3.db"))
+    for summary_table in ["string_tokens_included", "string_tokens_removed"]:
+        columns = [row[1] for row in conn.execute("PRAGMA table_info("+summary_table+")")]
+        if 'document_ids' in columns:
+            assert conn.execute("SELECT COUNT(*) FROM "+summary_table+" WHERE document_ids IS NOT NULL").fetchone()[0] == 0
+    conn.close()
+
+@pytest.mark.parametrize("groups", ["built", "mixed", "missing"])
+def test_GetStringTokensDocumentSample(tmp_path, groups):
+    db_conn = CreateDatabase(tmp_path, "text", seed=8, num_of_docs=200)
+    if groups == "mixed":
+        #tf-idf rules include or remove some tokens of a group
+        db_conn.ApplyAllDatasetRules("dataset", [(ANY, ANY, ANY, (Constants.FILTER_TFIDF_REMOVE, Constants.FILTER_TFIDF_LOWER, 50))])
+    elif groups == "missing":
+        #workspaces upgraded from before token groups existed have none until rules are next applied
+        db_conn.ApplyAllDatasetRules("dataset", [(ANY, "cat", ANY, Constants.FILTER_RULE_REMOVE)])
+        conn = sqlite3.connect(os.path.join(str(tmp_path), "workspace_sqlite3.db"))
+        conn.execute("DELETE FROM string_tokens_groups")
+        conn.commit()
+        conn.close()
+    tokens = ReadTokens(tmp_path, "text")
+    for included in [True, False]:
+        documents = {}
+        for token in tokens:
+            if token['included'] == (1 if included else 0):
+                documents.setdefault((token['word'], token['pos']), set()).add(token['document'])
+        for (word, pos), word_documents in documents.items():
+            sample = db_conn.GetStringTokensDocumentSample("dataset", word, pos, included, 20)
+            assert len(sample) == len(set(sample)) == min(20, len(word_documents))
+            assert set(sample) <= word_documents
+    assert db_conn.GetStringTokensDocumentSample("dataset", "missing", "NOUN", True, 20) == []
+    if groups == "missing":
+        #sampling is a read from the gui so it must not build the groups
+        conn = sqlite3.connect(os.path.join(str(tmp_path), "workspace_sqlite3.db"))
+        assert conn.execute("SELECT COUNT(*) FROM string_tokens_groups").fetchone()[0] == 0
+        conn.close()
+
+def test_DatabaseConnection_opens_locked_wal_workspace(tmp_path):
+    #a workspace saved in WAL mode can not be switched back to another journal mode while other connections have it open
+    db_conn = CreateDatabase(tmp_path, "text", seed=9)
+    conn = sqlite3.connect(os.path.join(str(tmp_path), "workspace_sqlite3.db"))
+    conn.execute("PRAGMA journal_mode = WAL")
+    reader_conn = sqlite3.connect(os.path.join(str(tmp_path), "workspace_sqlite3.db"))
+    reader_conn.execute("SELECT COUNT(*) FROM string_tokens").fetchone()
+    new_db_conn = Database.DatabaseConnection(str(tmp_path))
+    assert new_db_conn.GetStringTokensCounts("dataset") == db_conn.GetStringTokensCounts("dataset")
+    reader_conn.close()
+    conn.close()
+
+@pytest.mark.parametrize("profile, journal_mode", [(Constants.DATABASE_PROFILE_STANDARD, "memory"),
+                                                    (Constants.DATABASE_PROFILE_PERFORMANCE, "wal"),
+                                                    (Constants.DATABASE_PROFILE_SAFE, "wal")])
+def test_SetConnectionProfile_applies_profile_to_new_connections(tmp_path, profile, journal_mode):
+    CreateDatabase(tmp_path, "text", seed=11)
+    pooled_conn = Database.GetPooledConnection(str(tmp_path))
+    try:
+        Database.SetConnectionProfile(profile)
+        if profile != Constants.DATABASE_PROFILE_DEFAULT:
+            #pooled connections are reopened with the new profile
+            assert Database.GetPooledConnection(str(tmp_path)) is not pooled_conn
+        db_conn = Database.DatabaseConnection(str(tmp_path))
+        assert db_conn._DatabaseConnection__conn.execute("PRAGMA journal_mode").fetchone()[0] == journal_mode
+        assert db_conn.GetStringTokensCounts("dataset")['tokens'] > 0
+        del db_conn
+    finally:
+        Database.SetConnectionProfile(Constants.DATABASE_PROFILE_DEFAULT)
+        Database.ClosePooledConnections()
+
+def test_ClosePooledConnections_closes_other_threads_connections(tmp_path):
+    CreateDatabase(tmp_path, "text", seed=10)
+    thread_connections = []
+    thread = threading.Thread(target=lambda: thread_connections.append(Database.GetPooledConnection(str(tmp_path))))
+    thread.start()
+    thread.join()
+    db_conn = Database.GetPooledConnection(str(tmp_path))
+    assert Database.GetPooledConnection(str(tmp_path)) is db_conn
+    assert thread_connections[0] is not db_conn
+    Database.ClosePooledConnections()
+    for closed_conn in [db_conn, thread_connections[0]]:
+        with pytest.raises(sqlite3.ProgrammingError):
+            closed_conn._DatabaseConnection__conn.execute("SELECT 1")
+    assert Database.GetPooledConnection(str(tmp_path)) is not db_conn
+    Database.ClosePooledConnections()
+
+def test_StringTokensIndexesDrop_only_while_operation_runs_alone(tmp_path):
+    workspace_path = str(tmp_path)
+    Database.StartDatasetOperation(workspace_path)
+    Database.StartDatasetOperation(workspace_path)
+    assert not Database.AcquireStringTokensIndexesDrop(workspace_path)
+    Database.FinishDatasetOperation(workspace_path)
+    assert Database.AcquireStringTokensIndexesDrop(workspace_path)
+    assert not Database.AcquireStringTokensIndexesDrop(workspace_path)
+    #an operation starting while the indexes are dropped waits until they are rebuilt
+    started = threading.Event()
+    def Operation():
+        Database.StartDatasetOperation(workspace_path)
+        started.set()
+        Database.FinishDatasetOperation(workspace_path)
+    thread = threading.Thread(target=Operation)
+    thread.start()
+    assert not started.wait(0.2)
+    Database.ReleaseStringTokensIndexesDrop(workspace_path)
+    assert started.wait(5)
+    thread.join()
+    Database.FinishDatasetOperation(workspace_path)
+    assert workspace_path not in Database.dataset_operations
+
+def test_InsertStringTokens_document_ids_cache_miss(tmp_path):
+    db_conn = CreateDatabase(tmp_path, "text", seed=12, fields=["f1"])
+    conn = db_conn._DatabaseConnection__conn
+    num_of_tokens = db_conn.GetStringTokensCounts("dataset")['tokens']
+    #documents inserted by another connection are not in this connection's cached ids until they are reloaded
+    other_conn = Database.DatabaseConnection(str(tmp_path))
+    other_conn.InsertDocuments("dataset", [("CSV", "document", "new")])
+    db_conn.InsertStringTokens("dataset", "f1", {("CSV", "document", "new"): [(0, "cat", "cat", "cat", "NOUN", False)]})
+    assert db_conn.GetStringTokensCounts("dataset")['tokens'] == num_of_tokens + 1
+    #tokens of a document that does not exist are not inserted and the transaction is not left open
+    db_conn.InsertStringTokens("dataset", "f1", {("CSV", "document", 0): [(20, "cat", "cat", "cat", "NOUN", False)],
+                                                 ("CSV", "document", "missing"): [(0, "cat", "cat", "cat", "NOUN", False)]})
+    assert not conn.in_transaction
+    assert db_conn.GetStringTokensCounts("dataset")['tokens'] == num_of_tokens + 1
+    db_conn.InsertStringTokens("dataset", "f1", {("CSV", "document", 0): [(20, "cat", "cat", "cat", "NOUN", False)]})
+    assert db_conn.GetStringTokensCounts("dataset")['tokens'] == num_of_tokens + 2
+
+def test_IterDocumentsTokensFromStringTokens_in_document_field_position_order(tmp_path):
+    db_conn = CreateDatabase(tmp_path, "lemma", seed=11)
+    db_conn.ApplyAllDatasetRules("dataset", [(ANY, "the", ANY, Constants.FILTER_RULE_REMOVE)])
+    conn = sqlite3.connect(os.path.join(str(tmp_path), "workspace_sqlite3.db"))
+    expected = {}
+    for row in conn.execute("""SELECT key_source, key_type, key_id, lemma_id
+                               FROM string_tokens
+                               JOIN documents ON documents.id = string_tokens.document_id
+                               WHERE included = 1
+                               ORDER BY document_id, field_id, position"""):
+        expected.setdefault((row[0], row[1], row[2]), []).append(row[3])
+    conn.close()
+    documents = list(db_conn.IterDocumentsTokensFromStringTokens("dataset"))
+    assert documents == list(expected.items())
+    vocabulary = db_conn.GetStringTokensVocabulary("dataset")
+    assert "the" not in [vocabulary[token_id] for document_key, token_ids in documents for token_id in token_ids]
+
+@pytest.mark.parametrize("indexed", [True, False])
+@pytest.mark.parametrize("search_term, expected_words", [("a_b", ["a_b"]),
+                                                         ("a?b", ["a_b", "axb"]),
+                                                         ("50%", ["50%"]),
+                                                         ("c\\d", ["c\\d"]),
+                                                         ("un", ["run", "running"]),
+                                                         ("run*", ["run", "running"]),
+                                                         ("r?n", ["ran", "run"]),
+                                                         ("*_*", ["a_b"])])
+def test_GetIncludedStringTokens_search(tmp_path, indexed, search_term, expected_words):
+    db_conn = Database.DatabaseConnection(str(tmp_path))
+    db_conn.Create()
+    db_conn.InsertDataset("dataset", "text")
+    document_keys = [("CSV", "document", doc_num) for doc_num in range(2)]
+    db_conn.InsertDocuments("dataset", document_keys)
+    db_conn.InsertField("dataset", "f1")
+    words = ["a_b", "axb", "50%", "500", "c\\d", "cd", "run", "running", "ran"]
+    db_conn.InsertStringTokens("dataset", "f1", {document_key: [(position, word, word, word, "NOUN", False) for position, word in enumerate(words)]
+                                                 for document_key in document_keys})
+    db_conn.RefreshStringTokensIncluded("dataset")
+    if not indexed:
+        #sqlite builds without fts5's trigram tokenizer match the summary's words directly
+        db_conn._DatabaseConnection__vocabulary_search_exists = False
+    rows = db_conn.GetIncludedStringTokens("dataset", search_term, GUITextFiltering.FILTERS_WORDS, True)
+    assert sorted(row[0] for row in rows) == expected_words
+    assert db_conn.GetIncludedStringTokensRowCount("dataset", search_term) == len(expected_words)
@@ -0,0 +1,75 @@
+import pickle
+
+import pytest
+
+pytest.importorskip("gensim")
+pytest.importorskip("bitermplus")
+pytest.importorskip("sklearn")
+
+import Common.Objects.Datasets as Datasets
+
+def CreateDataset(num_of_docs):
+    dataset = Datasets.Dataset("dataset", "CSV", "document", "eng", {})
+    dataset.data = {("CSV", "document", doc_num): {"id": doc_num, "url": "https://example.com/"+str(doc_num), "text": "text "+str(doc_num)}
+                    for doc_num in range(num_of_docs)}
+    return dataset
+
+def UnloadData(dataset, tmp_path):
+    #a saved dataset is loaded back without its data the same way a workspace is opened
+    dataset.SaveData(str(tmp_path / "dataset.data"))
+    return pickle.loads(pickle.dumps(dataset))
+
+def test_GetDocument_existing_documents_do_not_load_data(tmp_path):
+    dataset = CreateDataset(10)
+    documents = {doc_id: dataset.GetDocument(doc_id) for doc_id in dataset.data}
+    dataset = UnloadData(dataset, tmp_path)
+    assert not dataset.data_loaded
+    for doc_id in documents:
+        document = dataset.GetDocument(doc_id)
+        assert document.key == documents[doc_id].key
+        assert document.doc_id == doc_id
+    assert not dataset.data_loaded
+
+def test_GetDocument_new_document_loads_data(tmp_path):
+    dataset = UnloadData(CreateDataset(10), tmp_path)
+    document = dataset.GetDocument(("CSV", "document", 3))
+    assert dataset.data_loaded
+    assert document.url == "https://example.com/3"
+    assert dataset.GetDocument(("CSV", "document", 3)) is document
+    assert dataset.GetDocument(("CSV", "document", 10)) is None
+
+def test_GetDocument_rebuilds_index_after_rekeyed_documents():
+    dataset = CreateDataset(10)
+    document = dataset.GetDocument(("CSV", "document", 3))
+    #documents rekeyed outside GetDocument, as when upgrading a workspace
+    del dataset.documents[document.key]
+    document.key = "rekeyed"
+    dataset.documents[document.key] = document
+    assert dataset.GetDocument(("CSV", "document", 3)) is document
+    other_document = dataset.GetDocument(("CSV", "document", 4))
+    del dataset.documents[other_document.key]
+    assert dataset.GetDocument(("CSV", "document", 4)) is not other_document
+
+def test_GetDocument_documents_without_doc_id_before_upgrade():
+    dataset = CreateDataset(10)
+    document = dataset.GetDocument(("CSV", "document", 3))
+    #documents of workspaces saved before 0.8.5 are given their doc_id by the upgrade after they are loaded
+    del document._doc_id
+    dataset = pickle.loads(pickle.dumps(dataset))
+    document = dataset.documents[document.key]
+    assert not hasattr(document, "_doc_id")
+    document.doc_id = ("CSV", "document", 3)
+    assert dataset.GetDocument(("CSV", "document", 3)) is document
+
+def test_DatasetData_repeated_strings_columns():
+    authors = ["alice", "bob", "carol"]
+    data = {("CSV", "document", doc_num): {"text": "text "+str(doc_num), "author": authors[doc_num%3]} for doc_num in range(30)}
+    for doc_num in range(0, 30, 4):
+        del data[("CSV", "document", doc_num)]["author"]
+    dataset_data = Datasets.DatasetData(data)
+    assert isinstance(dataset_data._columns["author"], Datasets._StringColumn)
+    assert isinstance(dataset_data._columns["text"], list)
+    for dataset_data in [dataset_data, pickle.loads(pickle.dumps(dataset_data))]:
+        assert {doc_id: dict(row) for doc_id, row in dataset_data.items()} == data
+        assert "author" not in dataset_data[("CSV", "document", 0)]
+        assert dataset_data.ColumnValues("author")[:3] == [None, "bob", "carol"]
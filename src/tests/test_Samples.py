@@ -0,0 +1,33 @@
+import pickle
+
+import pytest
+
+pytest.importorskip("gensim")
+pytest.importorskip("bitermplus")
+pytest.importorskip("sklearn")
+
+import Common.Objects.Datasets as Datasets
+import Common.Objects.Samples as Samples
+
+DOCUMENT_KEYS = [("CSV", "document", doc_num) for doc_num in [5, 2, 9, 0, 7]]
+TOPIC_PARAMETERS = {'tokensets': {}, 'num_topics': 3, 'num_passes': 1, 'alpha': None, 'eta': None}
+
+@pytest.mark.parametrize("create", [lambda: Datasets.Dataset("dataset", "CSV", "document", "eng", {}),
+                                    lambda: Samples.RandomSample("sample", "dataset", {'doc_ids': []}),
+                                    lambda: Samples.LDASample("sample", "dataset", TOPIC_PARAMETERS),
+                                    lambda: Samples.BitermSample("sample", "dataset", TOPIC_PARAMETERS),
+                                    lambda: Samples.NMFSample("sample", "dataset", TOPIC_PARAMETERS)],
+                         ids=["Dataset", "RandomSample", "LDASample", "BitermSample", "NMFSample"])
+def test_selected_documents_list_loaded_as_OrderedSet(create):
+    obj = create()
+    #workspaces saved before selections were OrderedSets stored them as lists
+    obj.selected_documents = list(DOCUMENT_KEYS)
+    obj = pickle.loads(pickle.dumps(obj))
+    assert list(obj.selected_documents) == DOCUMENT_KEYS
+    assert ("CSV", "document", 9) in obj.selected_documents
+    assert ("CSV", "document", 1) not in obj.selected_documents
+    obj.selected_documents.remove(("CSV", "document", 9))
+    assert ("CSV", "document", 9) not in obj.selected_documents
+    assert list(obj.selected_documents) == [key for key in DOCUMENT_KEYS if key != ("CSV", "document", 9)]
+    obj.selected_documents.add(("CSV", "document", 1))
+    assert list(obj.selected_documents)[-1] == ("CSV", "document", 1)